@@ -11,7 +11,9 @@ import time
 import xml.etree.ElementTree as ET
 from bs4 import BeautifulSoup
 import re
-from app.data.database import Paper, get_session
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.data.database import Paper, session_scope, record_changes, parse_arxiv_id
 
 class ArxivCrawler:
     """arXiv爬虫类"""
@@ -19,7 +21,6 @@ class ArxivCrawler:
     def __init__(self):
         """初始化爬虫"""
         self.base_url = "http://export.arxiv.org/api/query"
-        self.session = get_session()
         self.is_running = False
         self.progress_callback = None
     
@@ -105,6 +106,10 @@ class ArxivCrawler:
                     except ValueError:
                         pass
                 
+                # 获取arXiv编号和版本号
+                id_elem = entry.find("atom:id", ns)
+                arxiv_id, arxiv_version = parse_arxiv_id(id_elem.text.strip() if id_elem is not None else url)
+                
                 # 创建论文对象
                 paper = Paper(
                     title=title,
@@ -112,7 +117,9 @@ class ArxivCrawler:
                     abstract=abstract,
                     url=url,
                     source="arXiv",
-                    published_date=published_date
+                    published_date=published_date,
+                    arxiv_id=arxiv_id,
+                    arxiv_version=arxiv_version
                 )
                 
                 # 添加到列表
@@ -126,11 +133,10 @@ class ArxivCrawler:
                 # 防止请求过快
                 time.sleep(0.5)
             
-            # 保存到数据库
+            # 保存到数据库，在本线程中开启独立的短事务，不占用其他线程的会话
             if papers and self.is_running:
-                self.session.add_all(papers)
-                self.session.commit()
-            
+                papers = self._save_papers(papers)
+        
         except Exception as e:
             print(f"爬取arXiv论文时出错: {str(e)}")
         finally:
@@ -138,10 +144,41 @@ class ArxivCrawler:
         
         return papers
     
+    def _save_papers(self, papers):
+        """保存论文，已爬取过的同一arXiv版本只更新不重复插入
+        
+        Args:
+            papers (list): 未保存的论文对象列表
+            
+        Returns:
+            list: 保存后的论文对象列表，顺序与papers一致
+        """
+        fields = ("title", "authors", "abstract", "url", "source", "published_date", "arxiv_id", "arxiv_version")
+        # 同一批次中重复的版本只保留最后一条，一条INSERT ... ON CONFLICT不能两次更新同一行
+        keyed = list({(paper.arxiv_id, paper.arxiv_version): paper for paper in papers if paper.arxiv_id}.values())
+        
+        with session_scope() as session:
+            # 无法解析arXiv编号的论文没有外部键，按普通记录插入
+            session.add_all([paper for paper in papers if not paper.arxiv_id])
+            
+            saved = {}
+            if keyed:
+                statement = sqlite_insert(Paper).values([
+                    {field: getattr(paper, field) for field in fields} for paper in keyed
+                ])
+                statement = statement.on_conflict_do_update(
+                    index_elements=[Paper.arxiv_id, Paper.arxiv_version],
+                    set_={field: statement.excluded[field] for field in fields[:-2]}
+                )
+                session.execute(statement)
+                
+                keys = [(paper.arxiv_id, paper.arxiv_version) for paper in keyed]
+                rows = session.query(Paper).filter(tuple_(Paper.arxiv_id, Paper.arxiv_version).in_(keys))
+                saved = {(row.arxiv_id, row.arxiv_version): row for row in rows.execution_options(populate_existing=True)}
+                record_changes(session, Paper.__tablename__, [row.id for row in saved.values()])
+        
+        return [saved.get((paper.arxiv_id, paper.arxiv_version), paper) for paper in papers]
+    
     def stop(self):
         """停止爬取"""
         self.is_running = False
-    
-    def __del__(self):
-        """析构函数"""
-        self.session.close() 
\ No newline at end of file
@@ -6,17 +6,20 @@
 """
 
 from app.core.crawler.arxiv_crawler import ArxivCrawler
-from app.data.database import Paper, get_session
+from sqlalchemy.orm import load_only
+from app.data.database import Paper, session_scope, split_keywords, fulltext_filter, keyset_page
 import datetime
 import threading
 
+# 论文列表需要的字段，摘要在打开单篇论文时才加载
+PAPER_LIST_COLUMNS = ("id", "title", "authors", "url", "source", "published_date", "crawled_date", "arxiv_id", "arxiv_version")
+
 class CrawlerManager:
     """爬虫管理器类"""
     
     def __init__(self):
         """初始化爬虫管理器"""
         self.arxiv_crawler = ArxivCrawler()
-        self.session = get_session()
         self.current_crawler = None
         self.crawl_thread = None
     
@@ -83,41 +86,73 @@ class CrawlerManager:
         
         Args:
             source (str, optional): 论文源
-            keywords (str, optional): 关键词
+            keywords (str, optional): 关键词，多个关键词用逗号分隔，论文需包含全部关键词
             date (datetime.date, optional): 发布日期
             limit (int, optional): 最大结果数
             
         Returns:
             list: 论文列表
         """
-        query = self.session.query(Paper)
-        
-        # 筛选条件
-        if source:
-            query = query.filter(Paper.source == source)
-        
-        if keywords:
-            # 分割关键词
-            for keyword in keywords.split(","):
-                keyword = keyword.strip()
-                query = query.filter(
-                    (Paper.title.like(f"%{keyword}%")) | 
-                    (Paper.abstract.like(f"%{keyword}%"))
-                )
-        
-        if date:
-            # 转换为datetime
-            start_date = datetime.datetime.combine(date, datetime.time.min)
-            end_date = datetime.datetime.combine(date, datetime.time.max)
-            query = query.filter(Paper.published_date.between(start_date, end_date))
-        
-        # 按爬取日期降序排序
-        query = query.order_by(Paper.crawled_date.desc())
+        with session_scope() as session:
+            query = session.query(Paper)
+            
+            # 筛选条件
+            if source:
+                query = query.filter(Paper.source == source)
+            
+            # 关键词通过全文索引匹配，有相关度时按相关度排序
+            rank = None
+            if keywords:
+                query, rank = fulltext_filter(query, Paper, "papers_fts", split_keywords(keywords))
+            
+            if date:
+                # 转换为datetime
+                start_date = datetime.datetime.combine(date, datetime.time.min)
+                end_date = datetime.datetime.combine(date, datetime.time.max)
+                query = query.filter(Paper.published_date.between(start_date, end_date))
+            
+            # 按相关度和爬取日期降序排序
+            if rank is not None:
+                query = query.order_by(rank, Paper.crawled_date.desc())
+            else:
+                query = query.order_by(Paper.crawled_date.desc())
+            
+            # 限制结果数
+            query = query.limit(limit)
+            
+            return query.all()
+    
+    def list_papers(self, source=None, keywords=None, date=None, cursor=None, limit=50):
+        """按爬取时间从新到旧分页列出论文，只加载列表需要的字段
         
-        # 限制结果数
-        query = query.limit(limit)
+        返回对象的abstract字段未加载，需要摘要时用get_paper_by_id获取完整记录。
+        与get_papers不同，有关键词时也按爬取时间排序，以保证游标翻页的结果稳定。
         
-        return query.all()
+        Args:
+            source (str, optional): 论文源
+            keywords (str, optional): 关键词，多个关键词用逗号分隔，论文需包含全部关键词
+            date (datetime.date, optional): 发布日期
+            cursor (tuple, optional): 上一页返回的游标
+            limit (int, optional): 每页记录数
+            
+        Returns:
+            tuple: (论文列表, 下一页的游标，没有下一页时为None)
+        """
+        with session_scope() as session:
+            query = session.query(Paper).options(load_only(*[getattr(Paper, name) for name in PAPER_LIST_COLUMNS]))
+            
+            if source:
+                query = query.filter(Paper.source == source)
+            
+            if keywords:
+                query, _ = fulltext_filter(query, Paper, "papers_fts", split_keywords(keywords))
+            
+            if date:
+                start_date = datetime.datetime.combine(date, datetime.time.min)
+                end_date = datetime.datetime.combine(date, datetime.time.max)
+                query = query.filter(Paper.published_date.between(start_date, end_date))
+            
+            return keyset_page(query, [Paper.crawled_date, Paper.id], cursor, limit, descending=True)
     
     def get_paper_by_id(self, paper_id):
         """根据ID获取论文
@@ -128,7 +163,8 @@ class CrawlerManager:
         Returns:
             Paper: 论文对象
         """
-        return self.session.query(Paper).filter(Paper.id == paper_id).first()
+        with session_scope() as session:
+            return session.query(Paper).filter(Paper.id == paper_id).first()
     
     def get_paper_by_title(self, title):
         """根据标题获取论文
@@ -139,8 +175,5 @@ class CrawlerManager:
         Returns:
             Paper: 论文对象
         """
-        return self.session.query(Paper).filter(Paper.title == title).first()
-    
-    def __del__(self):
-        """析构函数"""
-        self.session.close() 
\ No newline at end of file
+        with session_scope() as session:
+            return session.query(Paper).filter(Paper.title == title).first()
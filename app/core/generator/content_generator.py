@@ -12,15 +12,15 @@ import threading
 from openai import OpenAI
 from app.core.rag.embedding_manager import EmbeddingManager
 from app.core.knowledge.knowledge_manager import KnowledgeManager
-from app.data.database import Paper, HistoryContent, get_session
+from app.data.database import Paper, HistoryContent, session_scope
 
 class ContentGenerator:
     """内容生成类"""
     
     def __init__(self):
         """初始化内容生成器"""
-        self.session = get_session()
-        self.embedding_manager = EmbeddingManager()
+        self.embedding_manager = EmbeddingManager(warm_up=True)
+        self.embedding_manager.start_index_sync()
         self.knowledge_manager = KnowledgeManager()
         self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
         self.is_generating = False
@@ -66,18 +66,18 @@ class ContentGenerator:
             if self.progress_callback:
                 self.progress_callback(10)
             
-            # 获取相关的PPT制作方法
-            ppt_methods = []
+            # 一次检索相关的制作方法和历史内容，历史内容做MMR重排，避免提示词中出现几份相近的内容
+            specs = {"history_contents": {"top_k": 3, "passages": True, "mmr_lambda": 0.7}}
             if settings["generate_ppt"]:
-                ppt_methods = self.embedding_manager.search_ppt_methods(paper_info["title"], top_k=2)
-            
-            # 获取相关的演讲稿制作方法
-            speech_methods = []
+                specs["ppt_methods"] = {"top_k": 2}
             if settings["generate_speech"]:
-                speech_methods = self.embedding_manager.search_speech_methods(paper_info["title"], top_k=2)
+                specs["speech_methods"] = {"top_k": 2}
             
-            # 获取相关的历史内容
-            history_contents = self.embedding_manager.search_history_contents(paper_info["title"], top_k=3)
+            context = self.embedding_manager.retrieve(paper_info["title"], specs)
+            ppt_methods = context.get("ppt_methods", [])
+            speech_methods = context.get("speech_methods", [])
+            history_contents = context["history_contents"]
+            history_passages = context.get("history_contents_passages", {})
             
             # 更新进度
             if self.progress_callback:
@@ -85,7 +85,7 @@ class ContentGenerator:
             
             # 生成PPT内容
             if settings["generate_ppt"]:
-                ppt_content = self._generate_ppt(paper_info, settings, ppt_methods, history_contents)
+                ppt_content = self._generate_ppt(paper_info, settings, ppt_methods, history_contents, history_passages)
                 results["ppt"] = ppt_content
             
             # 更新进度
@@ -94,7 +94,7 @@ class ContentGenerator:
             
             # 生成演讲稿内容
             if settings["generate_speech"]:
-                speech_content = self._generate_speech(paper_info, settings, speech_methods, history_contents)
+                speech_content = self._generate_speech(paper_info, settings, speech_methods, history_contents, history_passages)
                 results["speech"] = speech_content
             
             # 更新进度
@@ -113,7 +113,7 @@ class ContentGenerator:
         if callback:
             callback(results)
     
-    def _generate_ppt(self, paper_info, settings, ppt_methods, history_contents):
+    def _generate_ppt(self, paper_info, settings, ppt_methods, history_contents, history_passages=None):
         """生成PPT内容
         
         Args:
@@ -121,19 +121,20 @@ class ContentGenerator:
             settings (dict): 生成设置
             ppt_methods (list): PPT制作方法列表
             history_contents (list): 历史内容列表
+            history_passages (dict, optional): 历史内容ID到最相关段落的映射
             
         Returns:
             str: 生成的PPT内容
         """
         # 构建提示词
-        prompt = self._build_ppt_prompt(paper_info, settings, ppt_methods, history_contents)
+        prompt = self._build_ppt_prompt(paper_info, settings, ppt_methods, history_contents, history_passages)
         
         # 调用大模型API
         response = self._call_llm_api(prompt, settings)
         
         return response
     
-    def _generate_speech(self, paper_info, settings, speech_methods, history_contents):
+    def _generate_speech(self, paper_info, settings, speech_methods, history_contents, history_passages=None):
         """生成演讲稿内容
         
         Args:
@@ -141,19 +142,20 @@ class ContentGenerator:
             settings (dict): 生成设置
             speech_methods (list): 演讲稿制作方法列表
             history_contents (list): 历史内容列表
+            history_passages (dict, optional): 历史内容ID到最相关段落的映射
             
         Returns:
             str: 生成的演讲稿内容
         """
         # 构建提示词
-        prompt = self._build_speech_prompt(paper_info, settings, speech_methods, history_contents)
+        prompt = self._build_speech_prompt(paper_info, settings, speech_methods, history_contents, history_passages)
         
         # 调用大模型API
         response = self._call_llm_api(prompt, settings)
         
         return response
     
-    def _build_ppt_prompt(self, paper_info, settings, ppt_methods, history_contents):
+    def _build_ppt_prompt(self, paper_info, settings, ppt_methods, history_contents, history_passages=None):
         """构建PPT生成提示词
         
         Args:
@@ -161,6 +163,7 @@ class ContentGenerator:
             settings (dict): 生成设置
             ppt_methods (list): PPT制作方法列表
             history_contents (list): 历史内容列表
+            history_passages (dict, optional): 历史内容ID到最相关段落的映射
             
         Returns:
             str: 提示词
@@ -183,7 +186,7 @@ class ContentGenerator:
         if ppt_history:
             prompt += "参考以下历史PPT内容风格：\n\n"
             for content in ppt_history[:1]:  # 只取一个最相关的
-                prompt += f"标题：{content.title}\n{content.content}\n\n"
+                prompt += f"标题：{content.title}\n{self._history_excerpt(content, history_passages)}\n\n"
         
         # 添加风格要求
         prompt += f"风格要求：{settings['style']}\n"
@@ -213,7 +216,7 @@ class ContentGenerator:
         
         return prompt
     
-    def _build_speech_prompt(self, paper_info, settings, speech_methods, history_contents):
+    def _build_speech_prompt(self, paper_info, settings, speech_methods, history_contents, history_passages=None):
         """构建演讲稿生成提示词
         
         Args:
@@ -221,6 +224,7 @@ class ContentGenerator:
             settings (dict): 生成设置
             speech_methods (list): 演讲稿制作方法列表
             history_contents (list): 历史内容列表
+            history_passages (dict, optional): 历史内容ID到最相关段落的映射
             
         Returns:
             str: 提示词
@@ -243,7 +247,7 @@ class ContentGenerator:
         if speech_history:
             prompt += "参考以下历史演讲稿内容风格：\n\n"
             for content in speech_history[:1]:  # 只取一个最相关的
-                prompt += f"标题：{content.title}\n{content.content}\n\n"
+                prompt += f"标题：{content.title}\n{self._history_excerpt(content, history_passages)}\n\n"
         
         # 添加风格要求
         prompt += f"风格要求：{settings['style']}\n"
@@ -258,6 +262,22 @@ class ContentGenerator:
         
         return prompt
     
+    def _history_excerpt(self, content, history_passages=None):
+        """获取历史内容中用于提示词的部分
+        
+        有段落检索结果时只使用最相关的段落，否则使用全文
+        
+        Args:
+            content (HistoryContent): 历史内容
+            history_passages (dict, optional): 历史内容ID到最相关段落的映射
+            
+        Returns:
+            str: 内容文本
+        """
+        if history_passages and content.id in history_passages:
+            return history_passages[content.id]
+        return content.content
+    
     def _call_llm_api(self, prompt, settings):
         """调用大模型API
         
@@ -345,37 +365,35 @@ class ContentGenerator:
             paper_info (dict): 论文信息
             results (dict): 生成结果
         """
-        # 获取论文ID
-        paper = None
-        if "id" in paper_info:
-            paper = self.session.query(Paper).filter(Paper.id == paper_info["id"]).first()
-        else:
-            paper = self.session.query(Paper).filter(Paper.title == paper_info["title"]).first()
-        
-        paper_id = paper.id if paper else None
-        
-        # 保存PPT内容
-        if results["ppt"]:
-            self.knowledge_manager.add_history_content(
-                title=f"{paper_info['title']} - PPT",
-                content_type="PPT",
-                content=results["ppt"],
-                paper_id=paper_id
-            )
-        
-        # 保存演讲稿内容
-        if results["speech"]:
-            self.knowledge_manager.add_history_content(
-                title=f"{paper_info['title']} - 演讲稿",
-                content_type="演讲稿",
-                content=results["speech"],
-                paper_id=paper_id
-            )
+        # 查找论文和写入历史内容在同一个事务中完成
+        with session_scope() as session:
+            # 获取论文ID
+            paper = None
+            if "id" in paper_info:
+                paper = session.query(Paper).filter(Paper.id == paper_info["id"]).first()
+            else:
+                paper = session.query(Paper).filter(Paper.title == paper_info["title"]).first()
+            
+            paper_id = paper.id if paper else None
+            
+            # 保存PPT内容
+            if results["ppt"]:
+                self.knowledge_manager.add_history_content(
+                    title=f"{paper_info['title']} - PPT",
+                    content_type="PPT",
+                    content=results["ppt"],
+                    paper_id=paper_id
+                )
+            
+            # 保存演讲稿内容
+            if results["speech"]:
+                self.knowledge_manager.add_history_content(
+                    title=f"{paper_info['title']} - 演讲稿",
+                    content_type="演讲稿",
+                    content=results["speech"],
+                    paper_id=paper_id
+                )
     
     def cancel_generation(self):
         """取消生成"""
         self.is_generating = False
-    
-    def __del__(self):
-        """析构函数"""
-        self.session.close() 
\ No newline at end of file
@@ -5,14 +5,77 @@
 自媒体博主自动化辅助平台 - 知识库管理模块
 """
 
-from app.data.database import PPTMethod, SpeechMethod, HistoryContent, get_session
+import datetime
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import load_only
+from app.data.database import PPTMethod, SpeechMethod, HistoryContent, session_scope, record_changes, split_keywords, fulltext_filter, keyset_page
+
+# 列表视图需要的字段，大文本字段在打开单条记录时才加载
+LIST_COLUMNS = {
+    "methods": ("id", "title", "created_date", "updated_date"),
+    "history_contents": ("id", "title", "content_type", "paper_id", "created_date")
+}
 
 class KnowledgeManager:
     """知识库管理类"""
     
     def __init__(self):
-        """初始化知识库管理器"""
-        self.session = get_session()
+        """初始化知识库管理器
+        
+        管理器本身不持有数据库会话，每个方法在session_scope中完成一次操作，
+        可以被多个线程同时调用
+        """
+    
+    def _upsert_by_title(self, model, title, **values):
+        """按标题插入记录，同名记录已存在时更新给定字段
+        
+        使用单条INSERT ... ON CONFLICT语句完成，并发保存同一标题时不会产生重复记录
+        
+        Args:
+            model (class): 数据模型类，title列带有唯一索引
+            title (str): 标题
+            **values: 要写入的其他字段
+            
+        Returns:
+            添加或更新后的对象
+        """
+        with session_scope() as session:
+            statement = sqlite_insert(model).values(title=title, **values)
+            statement = statement.on_conflict_do_update(
+                index_elements=[model.title],
+                set_={field: statement.excluded[field] for field in values}
+            )
+            session.execute(statement)
+            
+            # 会话中可能已有该记录的旧状态，重新加载
+            record = session.query(model).filter(model.title == title).execution_options(populate_existing=True).one()
+            record_changes(session, model.__tablename__, [record.id])
+            return record
+    
+    def _list_page(self, model, columns, cursor, limit, order_columns=None, descending=False, filters=()):
+        """分页查询列表，只加载指定字段
+        
+        Args:
+            model (class): 数据模型类
+            columns (tuple): 要加载的字段名称
+            cursor (tuple): 上一页返回的游标
+            limit (int): 每页记录数
+            order_columns (list, optional): 排序列，默认按标题和ID排序
+            descending (bool, optional): 是否降序
+            filters (list, optional): 筛选条件
+            
+        Returns:
+            tuple: (记录列表, 下一页的游标)
+        """
+        if order_columns is None:
+            order_columns = [model.title, model.id]
+        
+        with session_scope() as session:
+            query = session.query(model).options(load_only(*[getattr(model, name) for name in columns]))
+            for condition in filters:
+                query = query.filter(condition)
+            return keyset_page(query, order_columns, cursor, limit, descending)
     
     # PPT制作方法管理
     
@@ -22,7 +85,22 @@ class KnowledgeManager:
         Returns:
             list: PPT制作方法列表
         """
-        return self.session.query(PPTMethod).order_by(PPTMethod.title).all()
+        with session_scope() as session:
+            return session.query(PPTMethod).order_by(PPTMethod.title).all()
+    
+    def list_ppt_methods(self, cursor=None, limit=50):
+        """按标题分页列出PPT制作方法，只加载列表需要的字段
+        
+        返回对象的content字段未加载，需要内容时用get_ppt_method_by_id获取完整记录
+        
+        Args:
+            cursor (tuple, optional): 上一页返回的游标
+            limit (int, optional): 每页记录数
+            
+        Returns:
+            tuple: (PPT制作方法列表, 下一页的游标，没有下一页时为None)
+        """
+        return self._list_page(PPTMethod, LIST_COLUMNS["methods"], cursor, limit)
     
     def get_ppt_method_by_id(self, method_id):
         """根据ID获取PPT制作方法
@@ -33,7 +111,8 @@ class KnowledgeManager:
         Returns:
             PPTMethod: PPT制作方法对象
         """
-        return self.session.query(PPTMethod).filter(PPTMethod.id == method_id).first()
+        with session_scope() as session:
+            return session.query(PPTMethod).filter(PPTMethod.id == method_id).first()
     
     def get_ppt_method_by_title(self, title):
         """根据标题获取PPT制作方法
@@ -44,7 +123,8 @@ class KnowledgeManager:
         Returns:
             PPTMethod: PPT制作方法对象
         """
-        return self.session.query(PPTMethod).filter(PPTMethod.title == title).first()
+        with session_scope() as session:
+            return session.query(PPTMethod).filter(PPTMethod.title == title).first()
     
     def add_ppt_method(self, title, content):
         """添加PPT制作方法
@@ -56,19 +136,7 @@ class KnowledgeManager:
         Returns:
             PPTMethod: 添加的PPT制作方法对象
         """
-        # 检查是否已存在
-        existing = self.get_ppt_method_by_title(title)
-        if existing:
-            # 更新内容
-            existing.content = content
-            self.session.commit()
-            return existing
-        
-        # 创建新方法
-        method = PPTMethod(title=title, content=content)
-        self.session.add(method)
-        self.session.commit()
-        return method
+        return self._upsert_by_title(PPTMethod, title, content=content, updated_date=datetime.datetime.now())
     
     def update_ppt_method(self, method_id, title, content):
         """更新PPT制作方法
@@ -79,16 +147,20 @@ class KnowledgeManager:
             content (str): 方法内容
             
         Returns:
-            PPTMethod: 更新的PPT制作方法对象
+            PPTMethod: 更新的PPT制作方法对象，方法不存在或新标题与其他方法重复时返回None
         """
-        method = self.get_ppt_method_by_id(method_id)
-        if not method:
+        # 标题带有唯一索引，改为其他记录已使用的标题时提交失败，修改被回滚
+        try:
+            with session_scope():
+                method = self.get_ppt_method_by_id(method_id)
+                if not method:
+                    return None
+                
+                method.title = title
+                method.content = content
+                return method
+        except IntegrityError:
             return None
-        
-        method.title = title
-        method.content = content
-        self.session.commit()
-        return method
     
     def delete_ppt_method(self, method_id):
         """删除PPT制作方法
@@ -99,13 +171,13 @@ class KnowledgeManager:
         Returns:
             bool: 是否成功删除
         """
-        method = self.get_ppt_method_by_id(method_id)
-        if not method:
-            return False
-        
-        self.session.delete(method)
-        self.session.commit()
-        return True
+        with session_scope() as session:
+            method = self.get_ppt_method_by_id(method_id)
+            if not method:
+                return False
+            
+            session.delete(method)
+            return True
     
     # 演讲稿制作方法管理
     
@@ -115,7 +187,22 @@ class KnowledgeManager:
         Returns:
             list: 演讲稿制作方法列表
         """
-        return self.session.query(SpeechMethod).order_by(SpeechMethod.title).all()
+        with session_scope() as session:
+            return session.query(SpeechMethod).order_by(SpeechMethod.title).all()
+    
+    def list_speech_methods(self, cursor=None, limit=50):
+        """按标题分页列出演讲稿制作方法，只加载列表需要的字段
+        
+        返回对象的content字段未加载，需要内容时用get_speech_method_by_id获取完整记录
+        
+        Args:
+            cursor (tuple, optional): 上一页返回的游标
+            limit (int, optional): 每页记录数
+            
+        Returns:
+            tuple: (演讲稿制作方法列表, 下一页的游标，没有下一页时为None)
+        """
+        return self._list_page(SpeechMethod, LIST_COLUMNS["methods"], cursor, limit)
     
     def get_speech_method_by_id(self, method_id):
         """根据ID获取演讲稿制作方法
@@ -126,7 +213,8 @@ class KnowledgeManager:
         Returns:
             SpeechMethod: 演讲稿制作方法对象
         """
-        return self.session.query(SpeechMethod).filter(SpeechMethod.id == method_id).first()
+        with session_scope() as session:
+            return session.query(SpeechMethod).filter(SpeechMethod.id == method_id).first()
     
     def get_speech_method_by_title(self, title):
         """根据标题获取演讲稿制作方法
@@ -137,7 +225,8 @@ class KnowledgeManager:
         Returns:
             SpeechMethod: 演讲稿制作方法对象
         """
-        return self.session.query(SpeechMethod).filter(SpeechMethod.title == title).first()
+        with session_scope() as session:
+            return session.query(SpeechMethod).filter(SpeechMethod.title == title).first()
     
     def add_speech_method(self, title, content):
         """添加演讲稿制作方法
@@ -149,19 +238,7 @@ class KnowledgeManager:
         Returns:
             SpeechMethod: 添加的演讲稿制作方法对象
         """
-        # 检查是否已存在
-        existing = self.get_speech_method_by_title(title)
-        if existing:
-            # 更新内容
-            existing.content = content
-            self.session.commit()
-            return existing
-        
-        # 创建新方法
-        method = SpeechMethod(title=title, content=content)
-        self.session.add(method)
-        self.session.commit()
-        return method
+        return self._upsert_by_title(SpeechMethod, title, content=content, updated_date=datetime.datetime.now())
     
     def update_speech_method(self, method_id, title, content):
         """更新演讲稿制作方法
@@ -172,16 +249,20 @@ class KnowledgeManager:
             content (str): 方法内容
             
         Returns:
-            SpeechMethod: 更新的演讲稿制作方法对象
+            SpeechMethod: 更新的演讲稿制作方法对象，方法不存在或新标题与其他方法重复时返回None
         """
-        method = self.get_speech_method_by_id(method_id)
-        if not method:
+        # 标题带有唯一索引，改为其他记录已使用的标题时提交失败，修改被回滚
+        try:
+            with session_scope():
+                method = self.get_speech_method_by_id(method_id)
+                if not method:
+                    return None
+                
+                method.title = title
+                method.content = content
+                return method
+        except IntegrityError:
             return None
-        
-        method.title = title
-        method.content = content
-        self.session.commit()
-        return method
     
     def delete_speech_method(self, method_id):
         """删除演讲稿制作方法
@@ -192,13 +273,13 @@ class KnowledgeManager:
         Returns:
             bool: 是否成功删除
         """
-        method = self.get_speech_method_by_id(method_id)
-        if not method:
-            return False
-        
-        self.session.delete(method)
-        self.session.commit()
-        return True
+        with session_scope() as session:
+            method = self.get_speech_method_by_id(method_id)
+            if not method:
+                return False
+            
+            session.delete(method)
+            return True
     
     # 历史内容管理
     
@@ -208,7 +289,51 @@ class KnowledgeManager:
         Returns:
             list: 历史内容列表
         """
-        return self.session.query(HistoryContent).order_by(HistoryContent.created_date.desc()).all()
+        with session_scope() as session:
+            return session.query(HistoryContent).order_by(HistoryContent.created_date.desc()).all()
+    
+    def list_history_contents(self, cursor=None, limit=50, content_type=None):
+        """按创建时间从新到旧分页列出历史内容，只加载列表需要的字段
+        
+        返回对象的content字段未加载，需要内容时用get_history_content_by_id获取完整记录
+        
+        Args:
+            cursor (tuple, optional): 上一页返回的游标
+            limit (int, optional): 每页记录数
+            content_type (str, optional): 内容类型，如"PPT"或"演讲稿"
+            
+        Returns:
+            tuple: (历史内容列表, 下一页的游标，没有下一页时为None)
+        """
+        filters = [HistoryContent.content_type == content_type] if content_type else []
+        return self._list_page(
+            HistoryContent, LIST_COLUMNS["history_contents"], cursor, limit,
+            order_columns=[HistoryContent.created_date, HistoryContent.id], descending=True, filters=filters
+        )
+    
+    def search_history_contents_by_keywords(self, keywords, content_type=None, limit=20):
+        """按关键词全文检索历史内容
+        
+        Args:
+            keywords (str): 关键词，多个关键词用逗号分隔，内容需包含全部关键词
+            content_type (str, optional): 内容类型，如"PPT"或"演讲稿"
+            limit (int, optional): 最大结果数
+            
+        Returns:
+            list: 按相关度排序的历史内容列表
+        """
+        with session_scope() as session:
+            query = session.query(HistoryContent)
+            if content_type:
+                query = query.filter(HistoryContent.content_type == content_type)
+            
+            query, rank = fulltext_filter(query, HistoryContent, "history_contents_fts", split_keywords(keywords))
+            if rank is not None:
+                query = query.order_by(rank, HistoryContent.created_date.desc())
+            else:
+                query = query.order_by(HistoryContent.created_date.desc())
+            
+            return query.limit(limit).all()
     
     def get_history_content_by_id(self, content_id):
         """根据ID获取历史内容
@@ -219,7 +344,8 @@ class KnowledgeManager:
         Returns:
             HistoryContent: 历史内容对象
         """
-        return self.session.query(HistoryContent).filter(HistoryContent.id == content_id).first()
+        with session_scope() as session:
+            return session.query(HistoryContent).filter(HistoryContent.id == content_id).first()
     
     def get_history_content_by_title(self, title):
         """根据标题获取历史内容
@@ -230,7 +356,8 @@ class KnowledgeManager:
         Returns:
             HistoryContent: 历史内容对象
         """
-        return self.session.query(HistoryContent).filter(HistoryContent.title == title).first()
+        with session_scope() as session:
+            return session.query(HistoryContent).filter(HistoryContent.title == title).first()
     
     def add_history_content(self, title, content_type, content, paper_id=None):
         """添加历史内容
@@ -244,26 +371,12 @@ class KnowledgeManager:
         Returns:
             HistoryContent: 添加的历史内容对象
         """
-        # 检查是否已存在
-        existing = self.get_history_content_by_title(title)
-        if existing:
-            # 更新内容
-            existing.content_type = content_type
-            existing.content = content
-            existing.paper_id = paper_id
-            self.session.commit()
-            return existing
-        
-        # 创建新内容
-        history = HistoryContent(
-            title=title,
+        return self._upsert_by_title(
+            HistoryContent, title,
             content_type=content_type,
             content=content,
             paper_id=paper_id
         )
-        self.session.add(history)
-        self.session.commit()
-        return history
     
     def update_history_content(self, content_id, title, content_type, content, paper_id=None):
         """更新历史内容
@@ -276,18 +389,22 @@ class KnowledgeManager:
             paper_id (int, optional): 关联的论文ID
             
         Returns:
-            HistoryContent: 更新的历史内容对象
+            HistoryContent: 更新的历史内容对象，内容不存在或新标题与其他内容重复时返回None
         """
-        history = self.get_history_content_by_id(content_id)
-        if not history:
+        # 标题带有唯一索引，改为其他记录已使用的标题时提交失败，修改被回滚
+        try:
+            with session_scope():
+                history = self.get_history_content_by_id(content_id)
+                if not history:
+                    return None
+                
+                history.title = title
+                history.content_type = content_type
+                history.content = content
+                history.paper_id = paper_id
+                return history
+        except IntegrityError:
             return None
-        
-        history.title = title
-        history.content_type = content_type
-        history.content = content
-        history.paper_id = paper_id
-        self.session.commit()
-        return history
     
     def delete_history_content(self, content_id):
         """删除历史内容
@@ -298,14 +415,10 @@ class KnowledgeManager:
         Returns:
             bool: 是否成功删除
         """
-        history = self.get_history_content_by_id(content_id)
-        if not history:
-            return False
-        
-        self.session.delete(history)
-        self.session.commit()
-        return True
-    
-    def __del__(self):
-        """析构函数"""
-        self.session.close()
\ No newline at end of file
+        with session_scope() as session:
+            history = self.get_history_content_by_id(content_id)
+            if not history:
+                return False
+            
+            session.delete(history)
+            return True
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+自媒体博主自动化辅助平台 - 近似最近邻索引模块
+"""
+
+import os
+import numpy as np
+from app.core.rag.vector_search import normalize_rows
+
+class IVFIndex:
+    """倒排文件(IVF)近似最近邻索引类
+    
+    用球面k-means把归一化向量划分为n_lists个簇，查询时只扫描与查询向量
+    最接近的n_probe个簇。索引只保存记录ID和所属簇，向量本身仍由
+    VectorCollection保存，因此几乎不占额外内存。
+    
+    n_probe越大召回率越高、速度越慢；n_probe等于n_lists时等价于精确检索。
+    """
+    
+    def __init__(self, n_lists=None, n_probe=8, n_iter=10, seed=0):
+        """初始化索引
+        
+        Args:
+            n_lists (int, optional): 簇的数量，默认取sqrt(记录数)
+            n_probe (int, optional): 查询时扫描的簇数量
+            n_iter (int, optional): k-means迭代次数
+            seed (int, optional): 随机种子，保证构建结果可复现
+        """
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.seed = seed
+        
+        self.centroids = None
+        self.ids = np.empty(0, dtype=np.int64)
+        self.assignments = np.empty(0, dtype=np.int32)
+        self.trained_size = 0
+        
+        self._list_order = None
+        self._list_offsets = None
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    @property
+    def is_trained(self):
+        """索引是否已训练"""
+        return self.centroids is not None
+    
+    def build(self, ids, vectors):
+        """训练簇中心并把全部向量分配到簇
+        
+        Args:
+            ids (numpy.ndarray): 记录ID数组
+            vectors (numpy.ndarray): 已归一化的向量矩阵
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        n = len(ids)
+        if n == 0:
+            return
+        
+        n_lists = self.n_lists or max(1, int(np.sqrt(n)))
+        n_lists = min(n_lists, n)
+        
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(n, max(n_lists * 64, 10000))
+        sample_rows = np.sort(rng.choice(n, size=sample_size, replace=False))
+        sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+        
+        centroids = sample[rng.choice(sample_size, size=n_lists, replace=False)].copy()
+        for _ in range(self.n_iter):
+            labels = self._nearest(sample, centroids)
+            counts = np.bincount(labels, minlength=n_lists)
+            
+            # 按簇排序后分段求和，比np.add.at快得多
+            order = np.argsort(labels, kind='stable')
+            sums = np.zeros_like(centroids)
+            filled = np.flatnonzero(counts)
+            offsets = np.concatenate([[0], np.cumsum(counts)])[:-1]
+            sums[filled] = np.add.reduceat(sample[order], offsets[filled], axis=0)
+            
+            # 空簇重新随机选取中心
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                sums[empty] = sample[rng.choice(sample_size, size=len(empty), replace=False)]
+            
+            centroids = normalize_rows(sums)
+        
+        self.centroids = centroids
+        self.ids = ids.copy()
+        self.assignments = self._nearest(vectors, centroids)
+        self.trained_size = n
+        self._list_order = None
+    
+    def add(self, ids, vectors):
+        """增量插入向量，已存在的ID会被重新分配
+        
+        Args:
+            ids (numpy.ndarray): 记录ID数组
+            vectors (numpy.ndarray): 已归一化的向量矩阵
+        """
+        if not self.is_trained:
+            return
+        
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) == 0:
+            return
+        
+        self.remove(ids)
+        self.ids = np.concatenate([self.ids, ids])
+        self.assignments = np.concatenate([self.assignments, self._nearest(vectors, self.centroids)])
+        self._list_order = None
+    
+    def remove(self, ids):
+        """删除向量
+        
+        Args:
+            ids (numpy.ndarray): 记录ID数组
+        """
+        keep = ~np.isin(self.ids, np.asarray(ids, dtype=np.int64))
+        if keep.all():
+            return
+        
+        self.ids = self.ids[keep]
+        self.assignments = self.assignments[keep]
+        self._list_order = None
+    
+    def needs_rebuild(self, size, growth=2.0):
+        """集合规模相对训练时增长过多时，簇中心不再有代表性，需要重新构建
+        
+        Args:
+            size (int): 当前集合规模
+            growth (float, optional): 允许的增长倍数
+            
+        Returns:
+            bool: 是否需要重新构建
+        """
+        return not self.is_trained or size > self.trained_size * growth
+    
+    def candidates(self, query_vector, n_probe=None):
+        """找出查询向量最接近的若干簇中的全部记录ID
+        
+        Args:
+            query_vector (numpy.ndarray): 已归一化的查询向量
+            n_probe (int, optional): 扫描的簇数量，默认使用self.n_probe
+            
+        Returns:
+            numpy.ndarray: 候选记录ID数组
+        """
+        if not self.is_trained or len(self.ids) == 0:
+            return np.empty(0, dtype=np.int64)
+        
+        self._ensure_lists()
+        
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        centroid_scores = self.centroids @ query_vector
+        probe = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        
+        starts = self._list_offsets[probe]
+        ends = self._list_offsets[probe + 1]
+        rows = np.concatenate([self._list_order[start:end] for start, end in zip(starts, ends)])
+        return self.ids[rows]
+    
+    def _ensure_lists(self):
+        """按簇整理记录，使每个簇的成员在数组中连续"""
+        if self._list_order is not None:
+            return
+        
+        # 多个检索线程可能同时整理，先写偏移再写顺序，其他线程看到顺序时偏移一定已就绪
+        counts = np.bincount(self.assignments, minlength=len(self.centroids))
+        self._list_offsets = np.concatenate([[0], np.cumsum(counts)])
+        self._list_order = np.argsort(self.assignments, kind='stable')
+    
+    @staticmethod
+    def _nearest(vectors, centroids, chunk_size=8192):
+        """分块计算每个向量最接近的簇中心"""
+        labels = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), chunk_size):
+            chunk = np.asarray(vectors[start:start + chunk_size], dtype=np.float32)
+            labels[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        return labels
+    
+    def save(self, path):
+        """保存索引
+        
+        Args:
+            path (str): 索引文件路径(.npz)
+        """
+        if not self.is_trained:
+            return
+        
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            centroids=self.centroids,
+            ids=self.ids,
+            assignments=self.assignments,
+            params=np.array([self.n_iter, self.seed, self.trained_size], dtype=np.int64)
+        )
+        os.replace(tmp_path, path)
+    
+    def load(self, path):
+        """加载索引
+        
+        Args:
+            path (str): 索引文件路径(.npz)
+            
+        Returns:
+            bool: 是否加载成功
+        """
+        if not os.path.exists(path):
+            return False
+        
+        try:
+            with np.load(path) as data:
+                self.centroids = data["centroids"]
+                self.ids = data["ids"]
+                self.assignments = data["assignments"]
+                self.n_iter, self.seed, self.trained_size = data["params"].tolist()
+        except Exception as e:
+            print(f"加载近似最近邻索引时出错: {str(e)}")
+            self.centroids = None
+            return False
+        
+        self.n_lists = len(self.centroids)
+        self._list_order = None
+        return True
@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+自媒体博主自动化辅助平台 - 嵌入向量批量回填模块
+
+用法:
+    python -m app.core.rag.backfill papers --workers 4 --shard-size 5000
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import multiprocessing
+import numpy as np
+from app.core.rag import model_registry
+from app.core.rag.embedding_backends import create_backend
+from app.core.rag.embedding_cache import EmbeddingCache
+from app.core.rag.embedding_manager import EmbeddingManager, COLLECTION_SPECS, EMBEDDING_DIR, EMBEDDING_CACHE_PATH
+from app.data.database import session_scope
+
+# 工作进程中的嵌入后端和缓存连接，每个进程各自创建
+_worker_backend = None
+_worker_cache = None
+
+def _init_worker(backend_kind, model_name, threads):
+    """工作进程初始化：限制计算线程数并创建该进程自己的嵌入后端
+    
+    Args:
+        backend_kind (str): 嵌入后端类型
+        model_name (str): 本地嵌入模型名称
+        threads (int): 每个进程使用的计算线程数
+    """
+    global _worker_backend, _worker_cache
+    if threads:
+        # 必须在导入torch之前设置，避免多个进程争抢CPU核心
+        for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+            os.environ[var] = str(threads)
+    _worker_backend = create_backend(backend_kind, model_name)
+    os.makedirs(EMBEDDING_DIR, exist_ok=True)
+    _worker_cache = EmbeddingCache(EMBEDDING_CACHE_PATH)
+
+def _encode_shard(task):
+    """读取一个ID区间内的记录、编码并写入分片文件
+    
+    Args:
+        task (dict): 分片任务，包含collection、batch_size、
+            index、start_id、end_id和path
+            
+    Returns:
+        tuple: (分片序号, 记录数)
+    """
+    name = task["collection"]
+    model = COLLECTION_SPECS[name]["model"]
+    
+    with session_scope() as session:
+        query = session.query(*[getattr(model, field) for field in EmbeddingManager._query_fields(name)])
+        query = query.filter(model.id >= task["start_id"], model.id <= task["end_id"]).order_by(model.id)
+        
+        ids, texts, metadata = [], [], []
+        for row in query.yield_per(1000):
+            text = EmbeddingManager._document_text(name, row)
+            ids.append(row.id)
+            texts.append(text)
+            metadata.append(EmbeddingManager._document_metadata(name, row, text))
+    
+    if texts:
+        # 之前编码过的文本直接从共享缓存读取
+        vectors = _worker_cache.encode(
+            _worker_backend.name, texts, lambda missing: _worker_backend.encode(missing, task["batch_size"])
+        )
+    else:
+        vectors = np.empty((0, 0), dtype=np.float32)
+    
+    # 先写临时文件再重命名，分片文件存在即表示该分片已完成
+    tmp_path = f"{task['path']}.tmp.npz"
+    np.savez(
+        tmp_path,
+        ids=np.asarray(ids, dtype=np.int64),
+        vectors=vectors,
+        metadata=np.array(json.dumps(metadata, ensure_ascii=False))
+    )
+    os.replace(tmp_path, task["path"])
+    return task["index"], len(ids)
+
+class EmbeddingBackfill:
+    """嵌入向量批量回填类
+    
+    把集合对应的数据表按ID区间切分为分片，交给进程池并行编码，
+    每个工作进程持有自己的嵌入后端（本地模型或远程服务连接池），每个分片写入一个独立文件。
+    全部分片完成后合并进向量集合。
+    
+    分片计划和已完成的分片保存在 <embeddings>/backfill_<name>/ 中，
+    中途崩溃后重新运行会跳过已完成的分片。
+    """
+    
+    def __init__(self, name="papers", workers=None, shard_size=5000, batch_size=64,
+                 model_name=model_registry.DEFAULT_MODEL_NAME, threads=None, backend=None):
+        """初始化回填任务
+        
+        Args:
+            name (str, optional): 集合名称
+            workers (int, optional): 工作进程数，默认为CPU核心数
+            shard_size (int, optional): 每个分片的记录数
+            batch_size (int, optional): 每批编码的文本数量
+            model_name (str, optional): 本地嵌入模型名称
+            threads (int, optional): 每个工作进程的计算线程数，默认平分CPU核心
+            backend (str, optional): 嵌入后端类型，默认根据环境变量选择
+        """
+        if name not in COLLECTION_SPECS:
+            raise ValueError(f"未知的向量集合: {name}")
+        
+        cpu_count = os.cpu_count() or 1
+        self.name = name
+        self.workers = workers or cpu_count
+        self.shard_size = shard_size
+        self.batch_size = batch_size
+        self.model_name = model_name
+        self.threads = threads or max(1, cpu_count // self.workers)
+        self.backend_kind = backend
+        
+        probe = create_backend(backend, model_name)
+        self.backend_name = probe.name
+        probe.close()
+        
+        self.work_dir = os.path.join(EMBEDDING_DIR, f"backfill_{name}")
+        self.plan_path = os.path.join(self.work_dir, "plan.json")
+    
+    def _shard_path(self, index):
+        """分片文件路径"""
+        return os.path.join(self.work_dir, f"shard_{index:05d}.npz")
+    
+    def load_plan(self, restart=False):
+        """加载或创建分片计划
+        
+        已有计划与当前集合和嵌入后端一致时沿用，以便从中断处继续。
+        
+        Args:
+            restart (bool, optional): 是否丢弃之前的进度重新开始
+            
+        Returns:
+            dict: 分片计划
+        """
+        if not restart and os.path.exists(self.plan_path):
+            try:
+                with open(self.plan_path, 'r', encoding='utf-8') as f:
+                    plan = json.load(f)
+                if plan.get("collection") == self.name and plan.get("backend") == self.backend_name:
+                    return plan
+                print("已有回填计划与当前参数不一致，重新开始")
+            except Exception as e:
+                print(f"读取回填计划时出错: {str(e)}")
+        
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        os.makedirs(self.work_dir, exist_ok=True)
+        
+        # 按ID顺序流式读取，每shard_size条记录划为一个区间
+        model = COLLECTION_SPECS[self.name]["model"]
+        with session_scope() as session:
+            ids = [item_id for item_id, in session.query(model.id).order_by(model.id).yield_per(10000)]
+        
+        shards = [
+            [ids[start], ids[min(start + self.shard_size, len(ids)) - 1]]
+            for start in range(0, len(ids), self.shard_size)
+        ]
+        plan = {
+            "collection": self.name,
+            "backend": self.backend_name,
+            "total": len(ids),
+            "shards": shards
+        }
+        
+        tmp_path = f"{self.plan_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(plan, f)
+        os.replace(tmp_path, self.plan_path)
+        return plan
+    
+    def pending_tasks(self, plan):
+        """尚未完成的分片任务
+        
+        Args:
+            plan (dict): 分片计划
+            
+        Returns:
+            list: 分片任务列表
+        """
+        return [
+            {
+                "collection": self.name,
+                "batch_size": self.batch_size,
+                "index": index,
+                "start_id": start_id,
+                "end_id": end_id,
+                "path": self._shard_path(index)
+            }
+            for index, (start_id, end_id) in enumerate(plan["shards"])
+            if not os.path.exists(self._shard_path(index))
+        ]
+    
+    def run(self, merge=True, restart=False, keep_shards=False):
+        """执行回填
+        
+        Args:
+            merge (bool, optional): 全部分片完成后是否合并进向量集合
+            restart (bool, optional): 是否丢弃之前的进度重新开始
+            keep_shards (bool, optional): 合并后是否保留分片文件
+            
+        Returns:
+            dict: 回填统计，包含total、encoded、resumed，合并时另含catch_up
+        """
+        plan = self.load_plan(restart)
+        tasks = self.pending_tasks(plan)
+        shard_count = len(plan["shards"])
+        stats = {"total": plan["total"], "encoded": 0, "resumed": shard_count - len(tasks)}
+        
+        if stats["resumed"]:
+            print(f"跳过已完成的{stats['resumed']}/{shard_count}个分片")
+        
+        done = stats["resumed"]
+        for index, count in self._map(tasks):
+            done += 1
+            stats["encoded"] += count
+            print(f"分片{index}完成，共{count}条 ({done}/{shard_count})")
+        
+        if merge:
+            stats["catch_up"] = self.merge(plan)
+            if not keep_shards:
+                shutil.rmtree(self.work_dir, ignore_errors=True)
+        
+        return stats
+    
+    def _map(self, tasks):
+        """在进程池中执行分片任务，结果按完成顺序返回"""
+        if not tasks:
+            return
+        
+        if self.workers <= 1:
+            _init_worker(self.backend_kind, self.model_name, None)
+            for task in tasks:
+                yield _encode_shard(task)
+            return
+        
+        # spawn方式启动，工作进程不继承父进程的数据库连接和模型
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(
+            processes=min(self.workers, len(tasks)),
+            initializer=_init_worker,
+            initargs=(self.backend_kind, self.model_name, self.threads)
+        ) as pool:
+            for result in pool.imap_unordered(_encode_shard, tasks):
+                yield result
+    
+    def merge(self, plan):
+        """把全部分片合并进向量集合
+        
+        合并后再做一次增量更新，补上回填期间新增或修改的记录，
+        并建立倒排索引和段落索引。
+        
+        Args:
+            plan (dict): 分片计划
+            
+        Returns:
+            dict: 增量更新统计
+        """
+        ids, vectors, metadata = [], [], []
+        for index in range(len(plan["shards"])):
+            with np.load(self._shard_path(index)) as data:
+                if len(data["ids"]) == 0:
+                    continue
+                ids.append(data["ids"])
+                vectors.append(data["vectors"])
+                metadata.extend(json.loads(str(data["metadata"])))
+        
+        manager = EmbeddingManager(batch_size=self.batch_size, model_name=self.model_name, backend=self.backend_kind)
+        
+        if ids:
+            with manager._write_lock:
+                collection = getattr(manager, f"{self.name}_embeddings").copy()
+                collection.replace_all(np.concatenate(ids), np.concatenate(vectors), metadata)
+                manager._record_backend(collection)
+                manager._publish(f"{self.name}_embeddings", collection)
+            print(f"已合并{len(collection)}条向量到{self.name}集合")
+        
+        return manager._update_collection(self.name)
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="多进程批量回填嵌入向量，中断后重新运行会从断点继续")
+    parser.add_argument("collection", nargs="?", default="papers", choices=list(COLLECTION_SPECS), help="向量集合名称")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数，默认为CPU核心数")
+    parser.add_argument("--shard-size", type=int, default=5000, help="每个分片的记录数")
+    parser.add_argument("--batch-size", type=int, default=64, help="每批编码的文本数量")
+    parser.add_argument("--threads", type=int, default=None, help="每个工作进程的计算线程数")
+    parser.add_argument("--model", default=model_registry.DEFAULT_MODEL_NAME, help="本地嵌入模型名称")
+    parser.add_argument("--backend", choices=["local", "remote", "hashing"], default=None,
+                        help="嵌入后端，默认根据USE_QIANWEN_EMBEDDING环境变量选择")
+    parser.add_argument("--restart", action="store_true", help="丢弃之前的进度重新开始")
+    parser.add_argument("--no-merge", action="store_true", help="只编码分片，不合并进向量集合")
+    parser.add_argument("--keep-shards", action="store_true", help="合并后保留分片文件")
+    args = parser.parse_args(argv)
+    
+    backfill = EmbeddingBackfill(
+        args.collection,
+        workers=args.workers,
+        shard_size=args.shard_size,
+        batch_size=args.batch_size,
+        model_name=args.model,
+        threads=args.threads,
+        backend=args.backend
+    )
+    stats = backfill.run(merge=not args.no_merge, restart=args.restart, keep_shards=args.keep_shards)
+    print(f"回填完成: {stats}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+自媒体博主自动化辅助平台 - 文本分段模块
+"""
+
+# 优先在这些字符之后断开段落，依次为段落、句子、分句边界
+BREAK_CHARS = ("\n", "。！？!?；;", "，,、 ")
+
+def split_passages(text, max_chars=200, overlap=50, max_tokens=None, count_tokens=None):
+    """把长文本切分为相互重叠的段落
+    
+    嵌入模型的输入长度有限（本地MiniLM模型为128个token），长文档需要切分后分别编码。
+    每段不超过max_chars个字符，尽量在换行或句末断开，
+    相邻段落重叠overlap个字符左右，避免关键句被切断。
+    返回字符偏移而不是文本本身，索引中只需保存两个整数。
+    
+    字符数和token数的比例随语言变化很大，中文一个字通常就是一个token，
+    200个字加上标题会超过128个token，超出部分被模型直接截断。
+    传入max_tokens和count_tokens时按实际token数收缩窗口，
+    count_tokens应统计最终送入模型的完整文本（含标题和特殊token）。
+    
+    Args:
+        text (str): 原文
+        max_chars (int, optional): 每段最大字符数
+        overlap (int, optional): 相邻段落的重叠字符数
+        max_tokens (int, optional): 每段最大token数，为None时只按字符数切分
+        count_tokens (callable, optional): 接收段落文本、返回其token数的函数
+        
+    Returns:
+        list: (起始偏移, 结束偏移) 列表
+    """
+    text = text or ""
+    length = len(text)
+    if not text.strip():
+        return []
+    
+    passages = []
+    start = 0
+    while start < length:
+        end = min(start + max_chars, length)
+        if end < length:
+            end = _find_break(text, start, end, max_chars)
+        if max_tokens and count_tokens:
+            end = _fit_tokens(text, start, end, max_tokens, count_tokens)
+        
+        if text[start:end].strip():
+            passages.append((start, end))
+        if end >= length:
+            break
+        
+        # 下一段从重叠区域开始，并尽量对齐到分句边界；窗口被收缩时重叠也相应减少
+        next_start = max(end - min(overlap, (end - start) // 4), start + 1)
+        for index in range(next_start, end):
+            if text[index - 1] in "".join(BREAK_CHARS):
+                next_start = index
+                break
+        start = next_start
+    
+    return passages
+
+def _fit_tokens(text, start, end, max_tokens, count_tokens):
+    """收缩窗口直到token数不超过max_tokens
+    
+    按超出的比例估计新的窗口长度，再在其中寻找断点，通常一两次就能满足要求。
+    """
+    tokens = count_tokens(text[start:end])
+    while tokens > max_tokens and end - start > 1:
+        size = min(int((end - start) * max_tokens / tokens * 0.95), end - start - 1)
+        size = max(size, 1)
+        end = _find_break(text, start, start + size, size)
+        tokens = count_tokens(text[start:end])
+    return end
+
+def _find_break(text, start, end, max_chars):
+    """在窗口后半部分寻找合适的断点"""
+    lower = start + max_chars // 2
+    for chars in BREAK_CHARS:
+        for index in range(end, lower, -1):
+            if text[index - 1] in chars:
+                return index
+    return end
@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+自媒体博主自动化辅助平台 - 嵌入后端模块
+"""
+
+import os
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from app.core.rag import model_registry
+from app.core.rag.lexical_index import tokenize
+from app.core.rag.vector_search import normalize_rows
+
+class LocalModelBackend:
+    """本地SentenceTransformer模型后端，模型由进程内共享的注册表管理
+    
+    优化推理模式在加载时已校验与fp32模型的相似度排序一致，
+    两者生成的向量可以混用，因此后端名称不包含推理模式，切换模式不需要重建索引。
+    """
+    
+    def __init__(self, model_name=model_registry.DEFAULT_MODEL_NAME, inference=model_registry.DEFAULT_INFERENCE):
+        """初始化后端
+        
+        Args:
+            model_name (str, optional): 模型名称
+            inference (str, optional): 推理模式，"fp32"、"int8"、"onnx"或"onnx-int8"
+        """
+        self.model_name = model_name
+        self.inference = inference
+        self.name = f"local:{model_name}"
+    
+    @property
+    def dimension(self):
+        """向量维度"""
+        return model_registry.get_model(self.model_name, self.inference).get_sentence_embedding_dimension()
+    
+    @property
+    def max_tokens(self):
+        """模型输入的最大token数，超出部分会被截断"""
+        return model_registry.get_model(self.model_name, self.inference).max_seq_length
+    
+    def count_tokens(self, texts):
+        """统计文本经分词后的token数，包含模型添加的特殊token
+        
+        Args:
+            texts (list): 文本列表
+            
+        Returns:
+            list: 每个文本的token数
+        """
+        tokenizer = model_registry.get_model(self.model_name, self.inference).tokenizer
+        return [len(ids) for ids in tokenizer(list(texts), add_special_tokens=True, verbose=False)["input_ids"]]
+    
+    def encode(self, texts, batch_size=64):
+        """批量编码文本
+        
+        Args:
+            texts (list): 文本列表
+            batch_size (int, optional): 每批编码的文本数量
+            
+        Returns:
+            numpy.ndarray: 形状为(len(texts), dim)的float32矩阵
+        """
+        model = model_registry.get_model(self.model_name, self.inference)
+        return np.asarray(model.encode(list(texts), batch_size=batch_size), dtype=np.float32)
+    
+    def warm_up(self):
+        """在后台线程中预加载模型"""
+        model_registry.warm_up(self.model_name, self.inference)
+    
+    def close(self):
+        """本地模型由注册表共享，这里不释放"""
+
+class RemoteEmbeddingBackend:
+    """远程HTTP嵌入服务后端
+    
+    payload_format为"dashscope"时使用千问(DashScope)文本嵌入接口：
+    请求体为{"model", "input": {"texts": [...]}, "parameters"}，响应为{"output": {"embeddings": [...]}}；
+    为"openai"时使用OpenAI风格接口：请求体为{"model", "input": [...]}，
+    响应为{"data": [{"index", "embedding"}]}。文本按max_batch_size分批，每批一个请求，
+    多个请求在线程池中并发发送，并发数不超过max_concurrency；
+    所有请求共用一个requests.Session，底层连接保持长连接并在请求之间复用。
+    """
+    
+    def __init__(self, endpoint, api_key=None, model="text-embedding-v2", max_batch_size=25,
+                 max_concurrency=4, timeout=30, max_retries=3, payload_format="dashscope"):
+        """初始化后端
+        
+        Args:
+            endpoint (str): 嵌入服务地址
+            api_key (str, optional): API密钥
+            model (str, optional): 远程模型名称
+            max_batch_size (int, optional): 每个请求包含的最大文本数
+            max_concurrency (int, optional): 最大并发请求数
+            timeout (float, optional): 单个请求的超时秒数
+            max_retries (int, optional): 限流或服务端错误时的重试次数
+            payload_format (str, optional): 接口格式，"dashscope"或"openai"
+        """
+        if not endpoint:
+            raise ValueError("未配置嵌入服务地址")
+        if payload_format not in ("dashscope", "openai"):
+            raise ValueError(f"不支持的嵌入接口格式: {payload_format}")
+        
+        self.endpoint = endpoint
+        self.model = model
+        self.payload_format = payload_format
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.name = f"remote:{model}@{endpoint}"
+        # 远程模型的输入上限（千问为2048个token）远大于默认段落长度，不按token切分
+        self.max_tokens = None
+        self._dimension = None
+        
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["POST"])
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency, max_retries=retry)
+        
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Content-Type"] = "application/json"
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+        
+        self._executor = None
+        self._executor_lock = threading.Lock()
+    
+    @property
+    def dimension(self):
+        """向量维度，首次访问时通过一次请求确定"""
+        if self._dimension is None:
+            self.encode(["维度"])
+        return self._dimension
+    
+    def encode(self, texts, batch_size=None):
+        """批量编码文本
+        
+        Args:
+            texts (list): 文本列表
+            batch_size (int, optional): 每个请求的文本数，不超过max_batch_size
+            
+        Returns:
+            numpy.ndarray: 形状为(len(texts), dim)的float32矩阵
+        """
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, self._dimension or 0), dtype=np.float32)
+        
+        size = min(batch_size or self.max_batch_size, self.max_batch_size)
+        batches = [texts[start:start + size] for start in range(0, len(texts), size)]
+        
+        if len(batches) == 1:
+            results = [self._request(batches[0])]
+        else:
+            results = list(self._get_executor().map(self._request, batches))
+        
+        vectors = np.concatenate(results)
+        self._dimension = vectors.shape[1]
+        return vectors
+    
+    def _get_executor(self):
+        """获取发送请求的线程池"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+            return self._executor
+    
+    def _request(self, texts):
+        """发送一个批次的请求
+        
+        Args:
+            texts (list): 文本列表
+            
+        Returns:
+            numpy.ndarray: float32向量矩阵，顺序与texts一致
+        """
+        if self.payload_format == "dashscope":
+            payload = {
+                "model": self.model,
+                "input": {"texts": texts},
+                "parameters": {"text_type": "document"}
+            }
+        else:
+            payload = {"model": self.model, "input": texts}
+        response = self.session.post(self.endpoint, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        
+        if self.payload_format == "dashscope":
+            items = data["output"]["embeddings"]
+            index_key = "text_index"
+        else:
+            items = data["data"]
+            index_key = "index"
+        
+        vectors = [None] * len(texts)
+        for position, item in enumerate(items):
+            vectors[item.get(index_key, position)] = item["embedding"]
+        if any(vector is None for vector in vectors):
+            raise ValueError("嵌入服务返回的向量数量与请求不一致")
+        
+        return np.asarray(vectors, dtype=np.float32)
+    
+    def warm_up(self):
+        """远程服务无需预加载"""
+    
+    def close(self):
+        """关闭线程池和连接池"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        self.session.close()
+
+class HashingBackend:
+    """确定性哈希嵌入后端
+    
+    把词项哈希到固定维度并带符号累加，结果只取决于文本本身，
+    不依赖模型和网络，适合测试和开发环境。共享词项越多的文本越相似。
+    """
+    
+    def __init__(self, dimension=256):
+        """初始化后端
+        
+        Args:
+            dimension (int, optional): 向量维度
+        """
+        self.dimension = dimension
+        self.name = f"hashing:{dimension}"
+        self.max_tokens = None
+    
+    def encode(self, texts, batch_size=None):
+        """批量编码文本
+        
+        Args:
+            texts (list): 文本列表
+            batch_size (int, optional): 未使用，与其他后端保持一致
+            
+        Returns:
+            numpy.ndarray: 形状为(len(texts), dimension)的float32矩阵
+        """
+        texts = list(texts)
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                digest = int.from_bytes(hashlib.md5(token.encode('utf-8')).digest()[:8], 'little')
+                sign = 1.0 if digest >> 63 else -1.0
+                vectors[row, digest % self.dimension] += sign
+        
+        return normalize_rows(vectors)
+    
+    def warm_up(self):
+        """无需预加载"""
+    
+    def close(self):
+        """无需释放资源"""
+
+def create_backend(kind=None, model_name=model_registry.DEFAULT_MODEL_NAME, inference=None):
+    """创建嵌入后端
+    
+    kind为None时根据环境变量选择：USE_QIANWEN_EMBEDDING为true时使用
+    QIANWEN_EMBEDDING_ENDPOINT指定的远程服务，接口格式由QIANWEN_EMBEDDING_FORMAT指定，
+    默认为千问(DashScope)格式；否则使用本地模型。
+    inference为None时使用EMBEDDING_INFERENCE环境变量指定的本地推理模式。
+    
+    Args:
+        kind (str, optional): 后端类型，"local"、"remote"或"hashing"
+        model_name (str, optional): 本地模型名称
+        inference (str, optional): 本地模型的推理模式
+        
+    Returns:
+        嵌入后端对象
+    """
+    if kind is None:
+        kind = "remote" if os.getenv("USE_QIANWEN_EMBEDDING", "false").lower() == "true" else "local"
+    
+    if kind == "local":
+        inference = inference or os.getenv("EMBEDDING_INFERENCE", model_registry.DEFAULT_INFERENCE)
+        return LocalModelBackend(model_name, inference)
+    if kind == "remote":
+        return RemoteEmbeddingBackend(
+            os.getenv("QIANWEN_EMBEDDING_ENDPOINT"),
+            api_key=os.getenv("QIANWEN_API_KEY"),
+            model=os.getenv("QIANWEN_EMBEDDING_MODEL", "text-embedding-v2"),
+            payload_format=os.getenv("QIANWEN_EMBEDDING_FORMAT", "dashscope")
+        )
+    if kind == "hashing":
+        return HashingBackend()
+    raise ValueError(f"不支持的嵌入后端: {kind}")
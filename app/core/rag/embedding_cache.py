@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+自媒体博主自动化辅助平台 - 嵌入向量持久缓存模块
+"""
+
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from app.core.rag.query_cache import normalize_query
+
+class EmbeddingCache:
+    """按内容寻址的嵌入向量磁盘缓存类
+    
+    缓存键为 sha1(嵌入后端名称 + 规范化后的文本)，与文本来自哪个集合无关，
+    论文摘要、历史内容和查询文本共用同一份缓存。向量保存在SQLite文件中，
+    多个进程（如批量回填的工作进程）可以同时读写。
+    总大小超过max_bytes时按最近使用时间淘汰最旧的条目。
+    """
+    
+    # 单条SQL中IN列表的最大长度
+    QUERY_CHUNK_SIZE = 500
+    
+    def __init__(self, path, max_bytes=512 * 1024 * 1024):
+        """初始化缓存
+        
+        Args:
+            path (str): 缓存文件路径
+            max_bytes (int, optional): 缓存向量的最大总字节数
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        
+        self.hits = 0
+        self.misses = 0
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+    
+    @staticmethod
+    def make_key(model_id, text):
+        """计算缓存键
+        
+        Args:
+            model_id (str): 嵌入后端名称
+            text (str): 文本
+            
+        Returns:
+            str: 缓存键
+        """
+        return hashlib.sha1(f"{model_id}\0{normalize_query(text)}".encode('utf-8')).hexdigest()
+    
+    def get_many(self, model_id, texts):
+        """批量查找缓存的向量
+        
+        Args:
+            model_id (str): 嵌入后端名称
+            texts (list): 文本列表
+            
+        Returns:
+            list: 与texts一一对应的向量列表，未命中的位置为None
+        """
+        keys = [self.make_key(model_id, text) for text in texts]
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        
+        with self._lock:
+            for start in range(0, len(unique_keys), self.QUERY_CHUNK_SIZE):
+                chunk = unique_keys[start:start + self.QUERY_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update((key, np.frombuffer(blob, dtype=np.float32)) for key, blob in rows)
+            
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+            
+            results = [found.get(key) for key in keys]
+            hits = sum(vector is not None for vector in results)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        
+        return results
+    
+    def put_many(self, model_id, texts, vectors):
+        """批量写入向量
+        
+        Args:
+            model_id (str): 嵌入后端名称
+            texts (list): 文本列表
+            vectors (numpy.ndarray): 与texts一一对应的向量矩阵
+        """
+        if len(texts) == 0:
+            return
+        
+        now = time.time()
+        records = {}
+        for text, vector in zip(texts, vectors):
+            blob = np.ascontiguousarray(vector, dtype=np.float32).tobytes()
+            records[self.make_key(model_id, text)] = (blob, len(blob), now)
+        
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, size, last_used) VALUES (?, ?, ?, ?)",
+                [(key,) + record for key, record in records.items()]
+            )
+            self._conn.commit()
+            self._total_bytes += sum(size for _, size, _ in records.values())
+            
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+    
+    def _evict(self):
+        """淘汰最久未使用的条目，直到总大小降到上限的90%以下"""
+        # 其他进程也可能写入，淘汰前重新统计实际大小
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        target = int(self.max_bytes * 0.9)
+        if self._total_bytes <= self.max_bytes:
+            return
+        
+        freed = 0
+        stale_keys = []
+        for key, size in self._conn.execute("SELECT key, size FROM embeddings ORDER BY last_used"):
+            if self._total_bytes - freed <= target:
+                break
+            stale_keys.append((key,))
+            freed += size
+        
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", stale_keys)
+        self._conn.commit()
+        self._total_bytes -= freed
+    
+    def encode(self, model_id, texts, compute):
+        """批量获取向量，未命中的文本去重后一次性交给compute计算并写入缓存
+        
+        Args:
+            model_id (str): 嵌入后端名称
+            texts (list): 文本列表
+            compute (function): 接收文本列表、返回float32向量矩阵的函数
+            
+        Returns:
+            numpy.ndarray: 形状为(len(texts), dim)的float32矩阵
+        """
+        texts = list(texts)
+        vectors = self.get_many(model_id, texts)
+        
+        missing = {}
+        for index, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(normalize_query(texts[index]), []).append(index)
+        
+        if missing:
+            missing_texts = [texts[indices[0]] for indices in missing.values()]
+            computed = np.asarray(compute(missing_texts), dtype=np.float32)
+            self.put_many(model_id, missing_texts, computed)
+            for vector, indices in zip(computed, missing.values()):
+                for index in indices:
+                    vectors[index] = vector
+        
+        if not vectors:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack(vectors).astype(np.float32, copy=False)
+    
+    def stats(self):
+        """获取缓存统计
+        
+        Returns:
+            dict: 包含entries、bytes、hits、misses、hit_rate
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "entries": entries,
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+    
+    def clear(self):
+        """清空缓存和统计"""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._total_bytes = 0
+            self.hits = 0
+            self.misses = 0
+    
+    def close(self):
+        """关闭缓存文件"""
+        with self._lock:
+            self._conn.close()
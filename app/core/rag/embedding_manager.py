@@ -6,70 +6,160 @@
 """
 
 import os
-import json
+import hashlib
+import threading
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from app.data.database import PPTMethod, SpeechMethod, HistoryContent, Paper, get_session
+from app.core.rag.vector_store import VectorCollection
+from app.core.rag.vector_search import top_k_indices, mmr_select
+from app.core.rag.index_sync import IndexSyncWorker
+from app.core.rag.query_cache import QueryEmbeddingCache
+from app.core.rag.chunking import split_passages
+from app.core.rag.lexical_index import BM25Index
+from app.core.rag.metadata_filter import to_metadata_value
+from app.core.rag import model_registry
+from app.core.rag.embedding_backends import create_backend
+from app.core.rag.embedding_cache import EmbeddingCache
+from app.data.database import PPTMethod, SpeechMethod, HistoryContent, Paper, session_scope
+
+# 嵌入向量存储路径
+EMBEDDING_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))),
+    'app', 'data', 'embeddings'
+)
+
+# 嵌入向量磁盘缓存路径，由所有集合、查询和回填工作进程共用
+EMBEDDING_CACHE_PATH = os.path.join(EMBEDDING_DIR, 'embedding_cache.sqlite')
+
+# 段落ID = 文档ID * PASSAGE_ID_STRIDE + 段落序号
+PASSAGE_ID_STRIDE = 100000
+
+# MMR重排时候选数量为top_k的倍数
+MMR_FETCH_FACTOR = 4
+
+# 各向量集合对应的数据模型、参与嵌入的文本字段和随向量保存的元数据字段，
+# 设置了passage_field的集合另外为该字段建立段落级索引
+COLLECTION_SPECS = {
+    "ppt_methods": {
+        "model": PPTMethod,
+        "text_fields": ("title", "content"),
+        "metadata_fields": ("title",)
+    },
+    "speech_methods": {
+        "model": SpeechMethod,
+        "text_fields": ("title", "content"),
+        "metadata_fields": ("title",)
+    },
+    "history_contents": {
+        "model": HistoryContent,
+        "text_fields": ("title", "content"),
+        "metadata_fields": ("title", "content_type", "paper_id"),
+        "passage_field": "content",
+        "passage_metadata_fields": ("content_type",)
+    },
+    "papers": {
+        "model": Paper,
+        "text_fields": ("title", "abstract"),
+        "metadata_fields": ("title", "source", "published_date")
+    }
+}
 
 class EmbeddingManager:
-    """嵌入向量管理类"""
+    """嵌入向量管理类
+    
+    向量集合和倒排索引按版本发布：检索方在开始时取一次当前版本的引用，
+    之后只读不写，因此无需加锁；写入方（重建、增量更新、后台同步）互斥执行，
+    在副本上完成修改后用一次属性赋值替换当前版本。重建期间的检索继续使用旧版本，
+    延迟不受影响。
+    """
     
-    def __init__(self):
-        """初始化嵌入向量管理器"""
-        self.session = get_session()
-        self.model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+    def __init__(self, batch_size=64, query_cache_size=256, persist_query_cache=False,
+                 model_name=model_registry.DEFAULT_MODEL_NAME, warm_up=False,
+                 ann_min_size=20000, ann_n_probe=8, vector_storage="float32", lexical_weight=0.3,
+                 backend=None, embedding_cache_bytes=512 * 1024 * 1024, inference=None):
+        """初始化嵌入向量管理器
+        
+        Args:
+            batch_size (int, optional): 重建索引时每批编码的文本数量
+            query_cache_size (int, optional): 查询向量缓存的最大条目数
+            persist_query_cache (bool, optional): 是否将查询向量缓存保存到磁盘
+            model_name (str, optional): 本地嵌入模型名称
+            warm_up (bool, optional): 是否在后台线程中预加载模型
+            ann_min_size (int, optional): 论文集合达到该规模后使用近似最近邻检索
+            ann_n_probe (int, optional): 近似检索时扫描的簇数量，越大召回率越高
+            vector_storage (str, optional): 常驻内存的向量精度，"float32"、"float16"或"int8"，
+                压缩模式下检索结果会用float32向量精确重新打分
+            lexical_weight (float, optional): 混合检索中BM25得分的权重，为0时只使用向量相似度
+            backend (optional): 嵌入后端对象，或后端类型"local"、"remote"、"hashing"，
+                默认根据USE_QIANWEN_EMBEDDING环境变量选择
+            embedding_cache_bytes (int, optional): 嵌入向量磁盘缓存的最大字节数，为0时不使用缓存
+            inference (str, optional): 本地模型的推理模式，"fp32"、"int8"、"onnx"或"onnx-int8"，
+                默认读取EMBEDDING_INFERENCE环境变量；优化模式与fp32模型的排序偏差超出容差时自动退回fp32
+        """
+        self.model_name = model_name
+        if backend is None or isinstance(backend, str):
+            backend = create_backend(backend, model_name, inference)
+        self.backend = backend
+        self.batch_size = batch_size
+        self.vector_storage = vector_storage
+        self.lexical_weight = lexical_weight
+        self.index_sync = None
+        self._write_lock = threading.Lock()
         
         # 嵌入向量存储路径
-        self.embedding_dir = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))),
-            'app', 'data', 'embeddings'
-        )
+        self.embedding_dir = EMBEDDING_DIR
         
         # 创建存储目录
         os.makedirs(self.embedding_dir, exist_ok=True)
         
-        # 嵌入向量文件路径
-        self.ppt_methods_embedding_path = os.path.join(self.embedding_dir, 'ppt_methods_embeddings.json')
-        self.speech_methods_embedding_path = os.path.join(self.embedding_dir, 'speech_methods_embeddings.json')
-        self.history_contents_embedding_path = os.path.join(self.embedding_dir, 'history_contents_embeddings.json')
-        self.papers_embedding_path = os.path.join(self.embedding_dir, 'papers_embeddings.json')
+        # 按内容寻址的嵌入向量磁盘缓存，相同文本在任何集合和查询中只编码一次
+        self.embedding_cache = None
+        if embedding_cache_bytes:
+            self.embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH, max_bytes=embedding_cache_bytes)
+        
+        # 查询向量缓存，同一次生成中对同一标题的多次检索只编码一次
+        self.query_cache = QueryEmbeddingCache(
+            max_size=query_cache_size,
+            path=os.path.join(self.embedding_dir, 'query_cache.npz') if persist_query_cache else None
+        )
+        
+        # 向量集合，每个集合以float32矩阵加元数据文件的形式存储
+        self.ppt_methods_embeddings = self._load_collection('ppt_methods')
+        self.speech_methods_embeddings = self._load_collection('speech_methods')
+        self.history_contents_embeddings = self._load_collection('history_contents')
+        self.papers_embeddings = self._load_collection('papers')
+        
+        # 长文档的段落级索引
+        for name, spec in COLLECTION_SPECS.items():
+            if "passage_field" in spec:
+                setattr(self, f"{name}_passages", self._load_collection(f"{name}_passages"))
+        
+        # BM25倒排索引，弥补向量检索对"DALL-E 3"、"LoRA"这类精确术语不敏感的问题
+        for name in COLLECTION_SPECS:
+            setattr(self, f"{name}_lexical", BM25Index(self.embedding_dir, name))
+        
+        # 论文集合规模较大，启用IVF近似最近邻索引
+        self.papers_embeddings.enable_ann(min_size=ann_min_size, n_probe=ann_n_probe)
         
-        # 加载嵌入向量
-        self.ppt_methods_embeddings = self._load_embeddings(self.ppt_methods_embedding_path)
-        self.speech_methods_embeddings = self._load_embeddings(self.speech_methods_embedding_path)
-        self.history_contents_embeddings = self._load_embeddings(self.history_contents_embedding_path)
-        self.papers_embeddings = self._load_embeddings(self.papers_embedding_path)
+        if warm_up:
+            self.backend.warm_up()
     
-    def _load_embeddings(self, path):
-        """加载嵌入向量
+    def _load_collection(self, name):
+        """加载向量集合，首次加载时从旧版JSON文件迁移
         
         Args:
-            path (str): 嵌入向量文件路径
+            name (str): 集合名称
             
         Returns:
-            dict: 嵌入向量字典
+            VectorCollection: 向量集合
         """
-        if os.path.exists(path):
-            try:
-                with open(path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                print(f"加载嵌入向量时出错: {str(e)}")
+        collection = VectorCollection(self.embedding_dir, name, storage=self.vector_storage)
         
-        return {}
-    
-    def _save_embeddings(self, embeddings, path):
-        """保存嵌入向量
+        legacy_path = os.path.join(self.embedding_dir, f'{name}_embeddings.json')
+        if len(collection) == 0 and os.path.exists(legacy_path):
+            if collection.migrate_from_json(legacy_path):
+                print(f"已将{legacy_path}迁移为二进制向量存储")
         
-        Args:
-            embeddings (dict): 嵌入向量字典
-            path (str): 嵌入向量文件路径
-        """
-        try:
-            with open(path, 'w', encoding='utf-8') as f:
-                json.dump(embeddings, f, ensure_ascii=False)
-        except Exception as e:
-            print(f"保存嵌入向量时出错: {str(e)}")
+        return collection
     
     def _compute_embedding(self, text):
         """计算文本的嵌入向量
@@ -78,248 +168,854 @@ class EmbeddingManager:
             text (str): 文本
             
         Returns:
-            list: 嵌入向量
+            numpy.ndarray: float32嵌入向量
         """
-        embedding = self.model.encode(text)
-        return embedding.tolist()
+        return self._compute_embeddings([text])[0]
     
-    def _cosine_similarity(self, vec1, vec2):
-        """计算余弦相似度
+    def _compute_query_embedding(self, query):
+        """计算查询文本的嵌入向量，优先使用缓存
         
         Args:
-            vec1 (list): 向量1
-            vec2 (list): 向量2
+            query (str): 查询文本
             
         Returns:
-            float: 余弦相似度
+            numpy.ndarray: float32嵌入向量
         """
-        vec1 = np.array(vec1)
-        vec2 = np.array(vec2)
-        return np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
+        return self.query_cache.get_or_compute(self.backend.name, query, self._compute_embedding)
     
-    def update_ppt_methods_embeddings(self):
-        """更新PPT制作方法的嵌入向量"""
-        methods = self.session.query(PPTMethod).all()
-        embeddings = {}
+    def _compute_query_embeddings(self, queries):
+        """批量计算查询文本的嵌入向量，缓存未命中的查询一次性编码
         
-        for method in methods:
-            text = f"{method.title}\n{method.content}"
-            embeddings[str(method.id)] = {
-                "title": method.title,
-                "embedding": self._compute_embedding(text)
-            }
+        Args:
+            queries (list): 查询文本列表
+            
+        Returns:
+            numpy.ndarray: 形状为(len(queries), dim)的float32矩阵
+        """
+        vectors = [self.query_cache.get(self.backend.name, query) for query in queries]
+        missing = [index for index, vector in enumerate(vectors) if vector is None]
+        
+        if missing:
+            computed = self._compute_embeddings([queries[index] for index in missing])
+            for index, vector in zip(missing, computed):
+                self.query_cache.put(self.backend.name, queries[index], vector)
+                vectors[index] = vector
         
-        self.ppt_methods_embeddings = embeddings
-        self._save_embeddings(embeddings, self.ppt_methods_embedding_path)
+        return np.stack(vectors).astype(np.float32, copy=False)
     
-    def update_speech_methods_embeddings(self):
-        """更新演讲稿制作方法的嵌入向量"""
-        methods = self.session.query(SpeechMethod).all()
-        embeddings = {}
+    def _compute_embeddings(self, texts, batch_size=None):
+        """批量计算文本的嵌入向量
         
-        for method in methods:
-            text = f"{method.title}\n{method.content}"
-            embeddings[str(method.id)] = {
-                "title": method.title,
-                "embedding": self._compute_embedding(text)
-            }
+        Args:
+            texts (list): 文本列表
+            batch_size (int, optional): 每批编码的文本数量，默认使用self.batch_size
+            
+        Returns:
+            numpy.ndarray: 形状为(len(texts), dim)的float32矩阵
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        
+        batch_size = batch_size or self.batch_size
+        if self.embedding_cache is None:
+            return self.backend.encode(texts, batch_size)
+        return self.embedding_cache.encode(
+            self.backend.name, texts, lambda missing: self.backend.encode(missing, batch_size)
+        )
+    
+    @staticmethod
+    def _fingerprint(text):
+        """计算嵌入文本的指纹，用于判断记录是否需要重新编码
         
-        self.speech_methods_embeddings = embeddings
-        self._save_embeddings(embeddings, self.speech_methods_embedding_path)
-    
-    def update_history_contents_embeddings(self):
-        """更新历史内容的嵌入向量"""
-        contents = self.session.query(HistoryContent).all()
-        embeddings = {}
-        
-        for content in contents:
-            text = f"{content.title}\n{content.content}"
-            embeddings[str(content.id)] = {
-                "title": content.title,
-                "content_type": content.content_type,
-                "paper_id": content.paper_id,
-                "embedding": self._compute_embedding(text)
-            }
+        Args:
+            text (str): 嵌入文本
+            
+        Returns:
+            str: 文本指纹
+        """
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+    
+    @staticmethod
+    def _document_text(name, row):
+        """拼接记录中参与嵌入的文本
         
-        self.history_contents_embeddings = embeddings
-        self._save_embeddings(embeddings, self.history_contents_embedding_path)
+        Args:
+            name (str): 集合名称
+            row: 数据库记录
+            
+        Returns:
+            str: 嵌入文本
+        """
+        return "\n".join(f"{getattr(row, field)}" for field in COLLECTION_SPECS[name]["text_fields"])
     
-    def update_papers_embeddings(self):
-        """更新论文的嵌入向量"""
-        papers = self.session.query(Paper).all()
-        embeddings = {}
+    def _passage_limits(self, title):
+        """按嵌入后端的输入上限生成split_passages的token参数
         
-        for paper in papers:
-            text = f"{paper.title}\n{paper.abstract}"
-            embeddings[str(paper.id)] = {
-                "title": paper.title,
-                "embedding": self._compute_embedding(text)
-            }
+        段落编码时带有标题前缀，统计token时一并计入。
         
-        self.papers_embeddings = embeddings
-        self._save_embeddings(embeddings, self.papers_embedding_path)
+        Args:
+            title (str): 文档标题
+            
+        Returns:
+            dict: max_tokens和count_tokens参数，后端没有输入上限时为空
+        """
+        max_tokens = self.backend.max_tokens
+        if not max_tokens:
+            return {}
+        
+        prefix = f"{title}\n"
+        return dict(
+            max_tokens=max_tokens,
+            count_tokens=lambda passage: self.backend.count_tokens([prefix + passage])[0]
+        )
     
-    def update_all_embeddings(self):
-        """更新所有嵌入向量"""
-        self.update_ppt_methods_embeddings()
-        self.update_speech_methods_embeddings()
-        self.update_history_contents_embeddings()
-        self.update_papers_embeddings()
+    @staticmethod
+    def _document_metadata(name, row, text):
+        """提取随向量保存的元数据
+        
+        Args:
+            name (str): 集合名称
+            row: 数据库记录
+            text (str): 嵌入文本，用于计算指纹
+            
+        Returns:
+            dict: 元数据字典
+        """
+        metadata = {field: to_metadata_value(getattr(row, field)) for field in COLLECTION_SPECS[name]["metadata_fields"]}
+        metadata["fingerprint"] = EmbeddingManager._fingerprint(text)
+        return metadata
     
-    def search_ppt_methods(self, query, top_k=3):
-        """搜索PPT制作方法
+    @staticmethod
+    def _query_fields(name):
+        """读取集合记录时需要查询的列名
         
         Args:
-            query (str): 查询文本
-            top_k (int, optional): 返回结果数量
+            name (str): 集合名称
             
         Returns:
-            list: 相似度最高的PPT制作方法列表
+            list: 列名列表
         """
-        query_embedding = self._compute_embedding(query)
-        results = []
+        spec = COLLECTION_SPECS[name]
+        return ["id"] + list(dict.fromkeys(spec["text_fields"] + spec["metadata_fields"]))
+    
+    def _backend_changed(self, collection):
+        """集合是否由其他嵌入后端生成，不同后端的向量不能混用
         
-        for method_id, data in self.ppt_methods_embeddings.items():
-            similarity = self._cosine_similarity(query_embedding, data["embedding"])
-            results.append({
-                "id": int(method_id),
-                "title": data["title"],
-                "similarity": similarity
-            })
+        早期版本没有记录后端，此时按向量维度判断。
         
-        # 按相似度降序排序
-        results.sort(key=lambda x: x["similarity"], reverse=True)
+        Args:
+            collection (VectorCollection): 向量集合
+            
+        Returns:
+            bool: 是否需要用当前后端重新编码
+        """
+        if len(collection) == 0:
+            return False
         
-        # 获取相似度最高的方法
-        top_results = results[:top_k]
+        recorded = collection.info.get("backend")
+        if recorded is None:
+            return collection.dim != self.backend.dimension
+        return recorded != self.backend.name
+    
+    def _record_backend(self, collection):
+        """在集合信息中记录生成向量的后端和维度
         
-        # 获取完整的方法对象
-        method_ids = [result["id"] for result in top_results]
-        methods = self.session.query(PPTMethod).filter(PPTMethod.id.in_(method_ids)).all()
+        Args:
+            collection (VectorCollection): 向量集合
+            
+        Returns:
+            bool: 记录是否发生变化，需要保存
+        """
+        if len(collection) == 0:
+            return False
         
-        # 按相似度排序
-        methods_dict = {method.id: method for method in methods}
-        sorted_methods = [methods_dict[result["id"]] for result in top_results if result["id"] in methods_dict]
+        info = {"backend": self.backend.name, "dim": collection.dim}
+        if all(collection.info.get(key) == value for key, value in info.items()):
+            return False
         
-        return sorted_methods
+        collection.info.update(info)
+        return True
     
-    def search_speech_methods(self, query, top_k=3):
-        """搜索演讲稿制作方法
+    def _update_collection(self, name, incremental=True, batch_size=None, ids=None):
+        """重建集合的嵌入向量
+        
+        增量模式下只重新编码文本指纹发生变化的记录，仅元数据变化的记录复用原向量，
+        数据库中已删除的记录从集合中移除。
         
         Args:
-            query (str): 查询文本
-            top_k (int, optional): 返回结果数量
+            name (str): 集合名称
+            incremental (bool, optional): 是否增量更新，为False时重新编码全部记录
+            batch_size (int, optional): 每批编码的文本数量
+            ids (list, optional): 只处理这些ID对应的记录，此时总是增量更新
             
         Returns:
-            list: 相似度最高的演讲稿制作方法列表
+            dict: 更新统计，包含added、updated、removed、skipped
         """
-        query_embedding = self._compute_embedding(query)
-        results = []
+        with self._write_lock, session_scope() as session:
+            spec = COLLECTION_SPECS[name]
+            model = spec["model"]
+            collection = getattr(self, f"{name}_embeddings").copy()
+            lexical = getattr(self, f"{name}_lexical").copy()
+            
+            if self._backend_changed(collection):
+                print(f"向量集合{name}由{collection.info.get('backend')}生成，与当前嵌入后端不一致，重新编码全部记录")
+                incremental = False
+                ids = None
+            
+            query = session.query(*[getattr(model, field) for field in self._query_fields(name)])
+            if ids is not None:
+                incremental = True
+                query = query.filter(model.id.in_(ids))
+            query = query.yield_per(1000)
+            
+            known = {}
+            if incremental and len(collection):
+                fingerprints = collection.metadata.get("fingerprint", [None] * len(collection))
+                known = dict(zip(collection.ids.tolist(), fingerprints))
+                if ids is not None:
+                    known = {item_id: known[item_id] for item_id in ids if item_id in known}
+            
+            # 倒排索引缺失或与向量集合不一致时，顺带用本次读到的文本整体重建
+            rebuild_lexical = ids is None and (not incremental or lexical.doc_count != len(collection))
+            if rebuild_lexical:
+                lexical.clear()
+            
+            stats = {"added": 0, "updated": 0, "removed": 0, "skipped": 0}
+            seen_ids = set()
+            encode_ids, encode_texts, encode_metadata = [], [], []
+            reuse_ids, reuse_vectors, reuse_metadata = [], [], []
+            
+            for row in query:
+                seen_ids.add(row.id)
+                text = self._document_text(name, row)
+                metadata = self._document_metadata(name, row, text)
+                
+                if rebuild_lexical:
+                    lexical.add(row.id, text)
+                
+                if row.id in known and known[row.id] == metadata["fingerprint"]:
+                    existing = collection.get(row.id)
+                    if all(existing.get(field) == value for field, value in metadata.items()):
+                        stats["skipped"] += 1
+                    else:
+                        reuse_ids.append(row.id)
+                        reuse_vectors.append(existing["embedding"])
+                        reuse_metadata.append(metadata)
+                        stats["updated"] += 1
+                    continue
+                
+                encode_ids.append(row.id)
+                encode_texts.append(text)
+                encode_metadata.append(metadata)
+                stats["updated" if row.id in known else "added"] += 1
+                if not rebuild_lexical:
+                    lexical.add(row.id, text)
+            
+            vectors = self._compute_embeddings(encode_texts, batch_size)
+            
+            if not incremental:
+                collection.replace_all(encode_ids, vectors, encode_metadata)
+                self._record_backend(collection)
+                self._publish(f"{name}_embeddings", collection)
+            else:
+                removed_ids = [item_id for item_id in known if item_id not in seen_ids]
+                stats["removed"] = collection.remove(removed_ids)
+                for item_id in removed_ids:
+                    lexical.remove(item_id)
+                collection.upsert(reuse_ids, reuse_vectors, reuse_metadata)
+                collection.upsert(encode_ids, vectors, encode_metadata)
+                
+                backend_recorded = self._record_backend(collection)
+                if stats["added"] or stats["updated"] or stats["removed"] or backend_recorded:
+                    self._publish(f"{name}_embeddings", collection)
+            
+            if lexical.dirty:
+                lexical.save()
+                setattr(self, f"{name}_lexical", lexical)
+            
+            if "passage_field" in spec:
+                stats["passages"] = self._update_passages(name, session, incremental, batch_size, ids)
+            
+            return stats
+    
+    def _update_passages(self, name, session, incremental=True, batch_size=None, ids=None):
+        """更新集合的段落级索引
         
-        for method_id, data in self.speech_methods_embeddings.items():
-            similarity = self._cosine_similarity(query_embedding, data["embedding"])
-            results.append({
-                "id": int(method_id),
-                "title": data["title"],
-                "similarity": similarity
-            })
+        长文档被切分为相互重叠的段落分别编码，索引中只保存所属文档ID和字符偏移，
+        段落文本在检索时从原文截取。文档内容未变化时不重新编码。
         
-        # 按相似度降序排序
-        results.sort(key=lambda x: x["similarity"], reverse=True)
+        Args:
+            name (str): 集合名称
+            session (Session): 数据库会话
+            incremental (bool, optional): 是否增量更新
+            batch_size (int, optional): 每批编码的文本数量
+            ids (list, optional): 只处理这些文档ID
+            
+        Returns:
+            int: 重新编码的段落数量
+        """
+        spec = COLLECTION_SPECS[name]
+        model = spec["model"]
+        passages = getattr(self, f"{name}_passages").copy()
+        
+        if self._backend_changed(passages):
+            incremental = False
+            ids = None
+        
+        extra_fields = spec.get("passage_metadata_fields", ())
+        columns = [model.id, model.title, getattr(model, spec["passage_field"])]
+        columns += [getattr(model, field) for field in extra_fields]
+        query = session.query(*columns)
+        if ids is not None:
+            incremental = True
+            query = query.filter(model.id.in_(ids))
+        query = query.yield_per(1000)
+        
+        # 已索引文档的指纹
+        known = {}
+        if incremental and len(passages):
+            known = dict(zip(passages.metadata["doc_id"], passages.metadata["doc_fingerprint"]))
+            if ids is not None:
+                known = {doc_id: known[doc_id] for doc_id in ids if doc_id in known}
+        
+        seen_docs = set()
+        stale_docs = set()
+        encode_ids, encode_texts, encode_metadata = [], [], []
+        
+        for row in query:
+            seen_docs.add(row.id)
+            text = getattr(row, spec["passage_field"]) or ""
+            metadata = {field: to_metadata_value(getattr(row, field)) for field in extra_fields}
+            fingerprint = self._fingerprint("\n".join([row.title, text] + [f"{value}" for value in metadata.values()]))
+            
+            if known.get(row.id) == fingerprint:
+                continue
+            if row.id in known:
+                stale_docs.add(row.id)
+            
+            for index, (start, end) in enumerate(split_passages(text, **self._passage_limits(row.title))):
+                encode_ids.append(row.id * PASSAGE_ID_STRIDE + index)
+                encode_texts.append(f"{row.title}\n{text[start:end]}")
+                encode_metadata.append(dict(
+                    metadata, doc_id=row.id, doc_fingerprint=fingerprint, start=start, end=end
+                ))
+        
+        vectors = self._compute_embeddings(encode_texts, batch_size)
+        
+        if not incremental:
+            passages.replace_all(encode_ids, vectors, encode_metadata)
+            self._record_backend(passages)
+            self._publish(f"{name}_passages", passages)
+            return len(encode_ids)
+        
+        stale_docs.update(doc_id for doc_id in known if doc_id not in seen_docs)
+        if stale_docs:
+            doc_ids = np.asarray(passages.metadata["doc_id"], dtype=np.int64)
+            passages.remove(passages.ids[np.isin(doc_ids, list(stale_docs))])
+        passages.upsert(encode_ids, vectors, encode_metadata)
+        
+        backend_recorded = self._record_backend(passages)
+        if stale_docs or encode_ids or backend_recorded:
+            self._publish(f"{name}_passages", passages)
+        
+        return len(encode_ids)
+    
+    def _publish(self, attribute, collection):
+        """发布并保存新版本的向量集合
         
-        # 获取相似度最高的方法
-        top_results = results[:top_k]
+        发布前在写入线程中重建过期的近似索引，检索方拿到的版本不会再修改索引。
+        先发布内存中的新版本，使旧版本在最后一个检索方用完后释放其内存映射
+        （Windows下被映射的文件无法被替换），再在另一个副本上保存到磁盘，
+        保存完成后发布重新映射磁盘文件的版本。
         
-        # 获取完整的方法对象
-        method_ids = [result["id"] for result in top_results]
-        methods = self.session.query(SpeechMethod).filter(SpeechMethod.id.in_(method_ids)).all()
+        Args:
+            attribute (str): 集合属性名，如"papers_embeddings"
+            collection (VectorCollection): 写入方修改完成的集合副本
+        """
+        collection.build_ann()
+        setattr(self, attribute, collection)
+        persisted = collection.copy()
+        persisted.save()
+        setattr(self, attribute, persisted)
+    
+    def update_ppt_methods_embeddings(self, incremental=True, batch_size=None):
+        """更新PPT制作方法的嵌入向量
         
-        # 按相似度排序
-        methods_dict = {method.id: method for method in methods}
-        sorted_methods = [methods_dict[result["id"]] for result in top_results if result["id"] in methods_dict]
+        Args:
+            incremental (bool, optional): 是否只重新编码发生变化的记录
+            batch_size (int, optional): 每批编码的文本数量
+            
+        Returns:
+            dict: 更新统计
+        """
+        return self._update_collection("ppt_methods", incremental, batch_size)
+    
+    def update_speech_methods_embeddings(self, incremental=True, batch_size=None):
+        """更新演讲稿制作方法的嵌入向量
+        
+        Args:
+            incremental (bool, optional): 是否只重新编码发生变化的记录
+            batch_size (int, optional): 每批编码的文本数量
+            
+        Returns:
+            dict: 更新统计
+        """
+        return self._update_collection("speech_methods", incremental, batch_size)
+    
+    def update_history_contents_embeddings(self, incremental=True, batch_size=None):
+        """更新历史内容的嵌入向量
         
-        return sorted_methods
+        Args:
+            incremental (bool, optional): 是否只重新编码发生变化的记录
+            batch_size (int, optional): 每批编码的文本数量
+            
+        Returns:
+            dict: 更新统计
+        """
+        return self._update_collection("history_contents", incremental, batch_size)
     
-    def search_history_contents(self, query, content_type=None, top_k=3):
-        """搜索历史内容
+    def update_papers_embeddings(self, incremental=True, batch_size=None):
+        """更新论文的嵌入向量
         
         Args:
-            query (str): 查询文本
-            content_type (str, optional): 内容类型，如"PPT"或"演讲稿"
+            incremental (bool, optional): 是否只重新编码发生变化的记录
+            batch_size (int, optional): 每批编码的文本数量
+            
+        Returns:
+            dict: 更新统计
+        """
+        return self._update_collection("papers", incremental, batch_size)
+    
+    def refresh_items(self, name, ids):
+        """按ID刷新集合中的记录
+        
+        数据库中存在的记录按需重新编码，已删除的记录从集合中移除。
+        
+        Args:
+            name (str): 集合名称
+            ids (list): 记录ID列表
+            
+        Returns:
+            dict: 更新统计
+        """
+        return self._update_collection(name, ids=list(ids))
+    
+    def start_index_sync(self, delay=0.5):
+        """开始监听数据库变更，在后台自动更新向量集合
+        
+        Args:
+            delay (float, optional): 合并突发变更的等待秒数
+        """
+        if self.index_sync is None:
+            table_collections = {
+                spec["model"].__tablename__: name
+                for name, spec in COLLECTION_SPECS.items()
+            }
+            self.index_sync = IndexSyncWorker(self, table_collections, delay=delay)
+        self.index_sync.start()
+    
+    def stop_index_sync(self):
+        """停止监听数据库变更"""
+        if self.index_sync is not None:
+            self.index_sync.stop()
+    
+    def update_all_embeddings(self, incremental=True, batch_size=None):
+        """更新所有嵌入向量
+        
+        Args:
+            incremental (bool, optional): 是否只重新编码发生变化的记录
+            batch_size (int, optional): 每批编码的文本数量
+            
+        Returns:
+            dict: 各集合的更新统计
+        """
+        return {
+            name: self._update_collection(name, incremental, batch_size)
+            for name in COLLECTION_SPECS
+        }
+    
+    def _fetch_ordered(self, model, ids):
+        """按给定ID顺序获取完整的数据库对象
+        
+        Args:
+            model (class): 数据模型类
+            ids (list): 按相似度排序的ID列表
+            
+        Returns:
+            list: 按ID顺序排列的对象列表，数据库中已不存在的记录被跳过
+        """
+        if not ids:
+            return []
+        
+        with session_scope() as session:
+            rows = session.query(model).filter(model.id.in_(ids)).all()
+        rows_dict = {row.id: row for row in rows}
+        return [rows_dict[item_id] for item_id in ids if item_id in rows_dict]
+    
+    def _search_ids(self, name, query_embedding, top_k=3, content_type=None, exact=False,
+                    query=None, hybrid=True, prefilter=False, filters=None, mmr_lambda=None):
+        """在单个集合中检索，返回按相似度排序的ID
+        
+        混合检索时，BM25命中的候选与向量检索的候选合并后统一打分：
+        融合得分 = (1 - lexical_weight) * 余弦相似度 + lexical_weight * BM25得分 / 最高BM25得分。
+        
+        Args:
+            name (str): 集合名称
+            query_embedding (numpy.ndarray): 查询向量
             top_k (int, optional): 返回结果数量
+            content_type (str, optional): 只检索该内容类型的记录
+            exact (bool, optional): 是否强制精确检索，不使用近似索引
+            query (str, optional): 查询文本，提供时才能进行混合检索
+            hybrid (bool, optional): 是否融合BM25得分
+            prefilter (bool, optional): BM25命中足够多时只对这些候选计算向量相似度，
+                跳过全量向量扫描，速度更快但会漏掉没有共同词项的语义相关结果
+            filters (dict, optional): 元数据过滤条件，语法见metadata_filter.build_mask
+            mmr_lambda (float, optional): 设置时对更多候选做MMR重排，去掉彼此高度相似的结果，
+                取值0~1，越小结果越多样
+                
+        Returns:
+            list: 记录ID列表
+        """
+        collection = getattr(self, f"{name}_embeddings")
+        lexical = getattr(self, f"{name}_lexical")
+        
+        mask = collection.filter_mask(self._merge_filters(filters, content_type))
+        limit = top_k if mmr_lambda is None else top_k * MMR_FETCH_FACTOR
+        
+        if not hybrid or not query or not self.lexical_weight or lexical.doc_count == 0:
+            ids, scores = collection.search(query_embedding, limit, mask=mask, exact=exact)
+            return self._diversify(collection, ids, scores, top_k, mmr_lambda).tolist()
+        
+        lexical_ids, lexical_scores = self._lexical_candidates(collection, lexical, query, top_k, mask)
+        
+        if prefilter and len(lexical_ids) >= top_k:
+            candidates = lexical_ids
+        else:
+            dense_ids, _ = collection.search(query_embedding, max(top_k * 4, limit), mask=mask, exact=exact)
+            candidates = np.union1d(dense_ids, lexical_ids)
+        
+        return self._fuse(collection, query_embedding, candidates, lexical_ids, lexical_scores, top_k, mmr_lambda)
+    
+    @staticmethod
+    def _lexical_candidates(collection, lexical, query, top_k, mask=None):
+        """BM25检索，只保留向量集合中存在且通过过滤的记录
+        
+        Args:
+            collection (VectorCollection): 向量集合
+            lexical (BM25Index): 倒排索引
+            query (str): 查询文本
+            top_k (int): 最终返回的结果数量
+            mask (numpy.ndarray, optional): 过滤掩码
             
         Returns:
-            list: 相似度最高的历史内容列表
+            tuple: (ID数组, BM25得分数组)
         """
-        query_embedding = self._compute_embedding(query)
-        results = []
+        lexical_ids, lexical_scores = lexical.search(query, limit=max(top_k * 10, 50))
         
-        for content_id, data in self.history_contents_embeddings.items():
-            # 如果指定了内容类型，则只搜索该类型的内容
-            if content_type and data["content_type"] != content_type:
-                continue
+        # 倒排索引与向量集合短暂不一致时，忽略向量集合中不存在的记录
+        keep = np.isin(lexical_ids, collection.ids)
+        if mask is not None:
+            keep[keep] = mask[collection.rows_for(lexical_ids[keep])]
+        return lexical_ids[keep], lexical_scores[keep]
+    
+    def _fuse(self, collection, query_embedding, candidates, lexical_ids, lexical_scores, top_k, mmr_lambda=None):
+        """对候选统一计算融合得分并选出结果
+        
+        Args:
+            collection (VectorCollection): 向量集合
+            query_embedding (numpy.ndarray): 查询向量
+            candidates (numpy.ndarray): 候选ID数组
+            lexical_ids (numpy.ndarray): BM25命中的ID数组
+            lexical_scores (numpy.ndarray): 对应的BM25得分
+            top_k (int): 返回结果数量
+            mmr_lambda (float, optional): MMR重排的相关性权重
             
-            similarity = self._cosine_similarity(query_embedding, data["embedding"])
-            results.append({
-                "id": int(content_id),
-                "title": data["title"],
-                "content_type": data["content_type"],
-                "similarity": similarity
-            })
+        Returns:
+            list: 记录ID列表
+        """
+        if len(candidates) == 0:
+            return []
+        
+        limit = top_k if mmr_lambda is None else top_k * MMR_FETCH_FACTOR
+        bm25 = np.zeros(len(candidates), dtype=np.float32)
+        if len(lexical_ids):
+            order = np.argsort(lexical_ids)
+            positions = np.searchsorted(lexical_ids, candidates, sorter=order)
+            positions = order[np.minimum(positions, len(order) - 1)]
+            hit = lexical_ids[positions] == candidates
+            bm25[hit] = lexical_scores[positions[hit]] / lexical_scores.max()
+        
+        scores = (1 - self.lexical_weight) * collection.score_ids(query_embedding, candidates) \
+            + self.lexical_weight * bm25
+        best = top_k_indices(scores, limit)
+        return self._diversify(collection, candidates[best], scores[best], top_k, mmr_lambda).tolist()
+    
+    @staticmethod
+    def _diversify(collection, ids, scores, top_k, mmr_lambda=None):
+        """对按得分降序排列的候选做MMR重排
         
-        # 按相似度降序排序
-        results.sort(key=lambda x: x["similarity"], reverse=True)
+        Args:
+            collection (VectorCollection): 候选所在的向量集合
+            ids (numpy.ndarray): 候选ID数组
+            scores (numpy.ndarray): 候选的相关性得分
+            top_k (int): 返回数量
+            mmr_lambda (float, optional): 相关性权重，为None时直接截取前top_k个
+            
+        Returns:
+            numpy.ndarray: 选中的ID数组
+        """
+        if mmr_lambda is None or len(ids) <= 1:
+            return ids[:top_k]
         
-        # 获取相似度最高的内容
-        top_results = results[:top_k]
+        vectors = collection.vectors[collection.rows_for(ids)]
+        return ids[mmr_select(scores, vectors, top_k, mmr_lambda)]
+    
+    @staticmethod
+    def _merge_filters(filters, content_type=None):
+        """把content_type参数合并进过滤条件
         
-        # 获取完整的内容对象
-        content_ids = [result["id"] for result in top_results]
-        contents = self.session.query(HistoryContent).filter(HistoryContent.id.in_(content_ids)).all()
+        Args:
+            filters (dict): 过滤条件
+            content_type (str, optional): 内容类型
+            
+        Returns:
+            dict: 合并后的过滤条件
+        """
+        filters = dict(filters or {})
+        if content_type:
+            filters["content_type"] = content_type
+        return filters
+    
+    def _search_passages(self, name, query_embedding, top_k=3, content_type=None, exact=False, filters=None,
+                         mmr_lambda=None):
+        """在段落索引中检索，并把段落得分聚合为文档得分
         
-        # 按相似度排序
-        contents_dict = {content.id: content for content in contents}
-        sorted_contents = [contents_dict[result["id"]] for result in top_results if result["id"] in contents_dict]
+        每个文档取其最相关段落的得分，返回文档ID及该段落的字符偏移。
+        设置mmr_lambda时按各文档最佳段落的向量做MMR重排。
         
-        return sorted_contents
+        Args:
+            name (str): 集合名称
+            query_embedding (numpy.ndarray): 查询向量
+            top_k (int, optional): 返回的文档数量
+            content_type (str, optional): 只检索该内容类型的记录
+            exact (bool, optional): 是否强制精确检索
+            filters (dict, optional): 元数据过滤条件，只能使用段落索引保存的字段
+            mmr_lambda (float, optional): MMR重排的相关性权重，为None时不重排
+            
+        Returns:
+            list: (文档ID, 起始偏移, 结束偏移) 列表，按相似度降序排列
+        """
+        passages = getattr(self, f"{name}_passages")
+        mask = passages.filter_mask(self._merge_filters(filters, content_type))
+        limit = top_k if mmr_lambda is None else top_k * MMR_FETCH_FACTOR
+        
+        # 多取一些段落，保证聚合后仍有足够的不同文档
+        ids, scores = passages.search(query_embedding, limit * 8, mask=mask, exact=exact)
+        doc_ids = ids // PASSAGE_ID_STRIDE
+        
+        # 结果已按得分降序排列，每个文档第一次出现的段落即为其最佳段落
+        _, first = np.unique(doc_ids, return_index=True)
+        first = np.sort(first)[:limit]
+        
+        selected = self._diversify(passages, ids[first], scores[first], top_k, mmr_lambda)
+        rows = passages.rows_for(selected)
+        starts = passages.metadata["start"]
+        ends = passages.metadata["end"]
+        return [
+            (item_id // PASSAGE_ID_STRIDE, starts[row], ends[row])
+            for item_id, row in zip(selected.tolist(), rows)
+        ]
     
-    def search_papers(self, query, top_k=3):
-        """搜索论文
+    def retrieve(self, query, specs):
+        """用同一个查询一次检索多个集合
+        
+        查询只编码一次，每个集合各做一次矩阵检索，
+        再为每张表发出一次IN查询获取完整对象。
         
         Args:
             query (str): 查询文本
-            top_k (int, optional): 返回结果数量
+            specs (dict): 集合名称到检索参数的映射，参数包括top_k、content_type、filters、exact、
+                hybrid、prefilter、mmr_lambda和passages，
+                如 {"ppt_methods": {"top_k": 2}, "history_contents": {"top_k": 3, "content_type": "PPT"}}。
+                filters的语法见metadata_filter.build_mask，如
+                {"papers": {"filters": {"source": "arXiv", "published_date": {">=": since}}}}。
+                hybrid默认为True，即融合BM25与向量相似度；prefilter为True时只对BM25候选计算向量相似度。
+                mmr_lambda为0~1之间的数时对结果做MMR重排，减少内容相近的重复结果。
+                passages为True时在段落索引中检索，结果中额外包含"<集合名称>_passages"，
+                为文档ID到最相关段落文本的映射
+                
+        Returns:
+            dict: 集合名称到按相似度排序的对象列表的映射
+        """
+        query_embedding = self._compute_query_embedding(query)
+        results = {}
+        
+        for name, spec in specs.items():
+            spec = dict(spec)
+            model = COLLECTION_SPECS[name]["model"]
+            
+            if self._backend_changed(getattr(self, f"{name}_embeddings")):
+                print(f"向量集合{name}与当前嵌入后端不一致，请先更新嵌入向量")
+                results[name] = []
+                continue
+            
+            if not spec.pop("passages", False) or not len(getattr(self, f"{name}_passages", ())):
+                ids = self._search_ids(name, query_embedding, query=query, **spec)
+                results[name] = self._fetch_ordered(model, ids)
+                continue
+            
+            # 段落索引只做向量检索
+            spec.pop("hybrid", None)
+            spec.pop("prefilter", None)
+            hits = self._search_passages(name, query_embedding, **spec)
+            rows = self._fetch_ordered(model, [doc_id for doc_id, _, _ in hits])
+            
+            field = COLLECTION_SPECS[name]["passage_field"]
+            offsets = {doc_id: (start, end) for doc_id, start, end in hits}
+            results[name] = rows
+            results[f"{name}_passages"] = {
+                row.id: (getattr(row, field) or "")[offsets[row.id][0]:offsets[row.id][1]]
+                for row in rows
+            }
+        
+        return results
+    
+    def search_many(self, queries, collection, top_k=3, content_type=None, filters=None, hybrid=True):
+        """批量检索，用于一次为大量查询查找相关内容的批处理任务
+        
+        全部查询一次批量编码，再与集合做分块的矩阵-矩阵乘法得到各自的候选，
+        最后用一次IN查询取回全部对象。混合检索时每个查询的BM25候选
+        与向量候选按search_*相同的方式融合。不支持段落索引。
+        
+        Args:
+            queries (list): 查询文本列表
+            collection (str): 集合名称，如"papers"或"history_contents"
+            top_k (int, optional): 每个查询返回的结果数量
+            content_type (str, optional): 只检索该内容类型的记录
+            filters (dict, optional): 元数据过滤条件，对全部查询生效
+            hybrid (bool, optional): 是否融合BM25得分
             
         Returns:
-            list: 相似度最高的论文列表
+            list: 与queries一一对应的对象列表，每个列表按相似度降序排列
         """
-        query_embedding = self._compute_embedding(query)
-        results = []
+        queries = list(queries)
+        name = collection
+        collection = getattr(self, f"{name}_embeddings")
+        lexical = getattr(self, f"{name}_lexical")
+        model = COLLECTION_SPECS[name]["model"]
+        
+        if not queries:
+            return []
+        if self._backend_changed(collection):
+            print(f"向量集合{name}与当前嵌入后端不一致，请先更新嵌入向量")
+            return [[] for _ in queries]
         
-        for paper_id, data in self.papers_embeddings.items():
-            similarity = self._cosine_similarity(query_embedding, data["embedding"])
-            results.append({
-                "id": int(paper_id),
-                "title": data["title"],
-                "similarity": similarity
-            })
+        query_embeddings = self._compute_query_embeddings(queries)
+        mask = collection.filter_mask(self._merge_filters(filters, content_type))
         
-        # 按相似度降序排序
-        results.sort(key=lambda x: x["similarity"], reverse=True)
+        use_lexical = hybrid and self.lexical_weight and lexical.doc_count > 0
+        dense_ids, _ = collection.search_many(query_embeddings, top_k * 4 if use_lexical else top_k, mask=mask)
+        
+        results = []
+        for query, query_embedding, ids in zip(queries, query_embeddings, dense_ids):
+            if use_lexical:
+                lexical_ids, lexical_scores = self._lexical_candidates(collection, lexical, query, top_k, mask)
+                candidates = np.union1d(ids, lexical_ids)
+                results.append(self._fuse(collection, query_embedding, candidates, lexical_ids, lexical_scores, top_k))
+            else:
+                results.append(ids.tolist())
+        
+        # 所有查询的结果合并后分块取回，避免IN列表超过SQLite的参数数量上限
+        all_ids = sorted({item_id for ids in results for item_id in ids})
+        rows_dict = {}
+        with session_scope() as session:
+            for start in range(0, len(all_ids), 500):
+                chunk = all_ids[start:start + 500]
+                rows_dict.update((row.id, row) for row in session.query(model).filter(model.id.in_(chunk)))
+        return [[rows_dict[item_id] for item_id in ids if item_id in rows_dict] for ids in results]
+    
+    def search_ppt_methods(self, query, top_k=3, filters=None):
+        """搜索PPT制作方法
+        
+        Args:
+            query (str): 查询文本
+            top_k (int, optional): 返回结果数量
+            filters (dict, optional): 元数据过滤条件
+            
+        Returns:
+            list: 相似度最高的PPT制作方法列表
+        """
+        return self.retrieve(query, {"ppt_methods": {"top_k": top_k, "filters": filters}})["ppt_methods"]
+    
+    def search_speech_methods(self, query, top_k=3, filters=None):
+        """搜索演讲稿制作方法
         
-        # 获取相似度最高的论文
-        top_results = results[:top_k]
+        Args:
+            query (str): 查询文本
+            top_k (int, optional): 返回结果数量
+            filters (dict, optional): 元数据过滤条件
+            
+        Returns:
+            list: 相似度最高的演讲稿制作方法列表
+        """
+        return self.retrieve(query, {"speech_methods": {"top_k": top_k, "filters": filters}})["speech_methods"]
+    
+    def search_history_contents(self, query, content_type=None, top_k=3, passages=False, filters=None,
+                                mmr_lambda=None):
+        """搜索历史内容
         
-        # 获取完整的论文对象
-        paper_ids = [result["id"] for result in top_results]
-        papers = self.session.query(Paper).filter(Paper.id.in_(paper_ids)).all()
+        Args:
+            query (str): 查询文本
+            content_type (str, optional): 内容类型，如"PPT"或"演讲稿"
+            top_k (int, optional): 返回结果数量
+            passages (bool, optional): 是否按段落检索，长文档不再只由开头部分代表
+            filters (dict, optional): 元数据过滤条件，如 {"paper_id": [1, 2]}
+            mmr_lambda (float, optional): 设置时做MMR重排，避免返回多份风格几乎相同的内容，
+                取值0~1，越小结果越多样
+                
+        Returns:
+            list: 相似度最高的历史内容列表
+        """
+        spec = {
+            "top_k": top_k, "content_type": content_type, "passages": passages,
+            "filters": filters, "mmr_lambda": mmr_lambda
+        }
+        return self.retrieve(query, {"history_contents": spec})["history_contents"]
+    
+    def search_papers(self, query, top_k=3, exact=False, source=None, since=None, until=None, filters=None):
+        """搜索论文
         
-        # 按相似度排序
-        papers_dict = {paper.id: paper for paper in papers}
-        sorted_papers = [papers_dict[result["id"]] for result in top_results if result["id"] in papers_dict]
+        论文集合较大时使用近似最近邻索引，exact为True时强制精确检索。
         
-        return sorted_papers
+        Args:
+            query (str): 查询文本
+            top_k (int, optional): 返回结果数量
+            exact (bool, optional): 是否强制精确检索
+            source (str, optional): 只检索该来源的论文，如"arXiv"
+            since (datetime, optional): 只检索该时间及之后发表的论文
+            until (datetime, optional): 只检索该时间之前发表的论文
+            filters (dict, optional): 其他元数据过滤条件
+            
+        Returns:
+            list: 相似度最高的论文列表
+        """
+        filters = dict(filters or {})
+        if source:
+            filters["source"] = source
+        if since or until:
+            date_range = {}
+            if since:
+                date_range[">="] = since
+            if until:
+                date_range["<"] = until
+            filters["published_date"] = date_range
+        
+        spec = {"top_k": top_k, "exact": exact, "filters": filters}
+        return self.retrieve(query, {"papers": spec})["papers"]
     
     def __del__(self):
         """析构函数"""
-        self.session.close() 
\ No newline at end of file
+        self.stop_index_sync()
+        self.query_cache.save()
+        if self.embedding_cache is not None:
+            self.embedding_cache.close()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+自媒体博主自动化辅助平台 - 向量索引同步模块
+"""
+
+import time
+import threading
+from app.data.database import add_change_listener, remove_change_listener, session_scope
+
+class IndexSyncWorker:
+    """向量索引同步类
+    
+    监听数据库提交的变更，在后台线程中把受影响的记录增量写入向量集合。
+    短时间内的连续变更会被合并，同一条记录多次修改只处理一次。
+    """
+    
+    def __init__(self, embedding_manager, table_collections, delay=0.5, max_delay=5.0):
+        """初始化同步器
+        
+        Args:
+            embedding_manager (EmbeddingManager): 嵌入向量管理器
+            table_collections (dict): 表名到集合名称的映射
+            delay (float, optional): 最后一次变更后等待的秒数，用于合并突发变更
+            max_delay (float, optional): 变更持续到来时最长等待的秒数
+        """
+        self.embedding_manager = embedding_manager
+        self.table_collections = table_collections
+        self.delay = delay
+        self.max_delay = max_delay
+        
+        self._pending = {}
+        self._last_change = 0.0
+        self._first_change = 0.0
+        self._condition = threading.Condition()
+        self._apply_lock = threading.Lock()
+        self._running = False
+        self._thread = None
+    
+    def start(self):
+        """开始监听数据库变更"""
+        if self._running:
+            return
+        
+        self._running = True
+        add_change_listener(self.enqueue)
+        
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+    
+    def stop(self):
+        """停止监听，并处理完已排队的变更"""
+        if not self._running:
+            return
+        
+        remove_change_listener(self.enqueue)
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+    
+    def enqueue(self, changes):
+        """将数据库变更加入队列
+        
+        Args:
+            changes (list): (表名, 记录ID, 操作) 三元组列表
+        """
+        with self._condition:
+            now = time.monotonic()
+            if not self._pending:
+                self._first_change = now
+            self._last_change = now
+            
+            for table, item_id, _ in changes:
+                name = self.table_collections.get(table)
+                if name is not None:
+                    self._pending.setdefault(name, set()).add(item_id)
+            
+            self._condition.notify()
+    
+    def flush(self):
+        """立即处理所有排队的变更"""
+        with self._condition:
+            pending = self._pending
+            self._pending = {}
+        
+        self._apply(pending)
+    
+    def _run(self):
+        """后台线程函数"""
+        while True:
+            with self._condition:
+                while self._running and not self._pending:
+                    self._condition.wait()
+                
+                # 等待突发变更结束，但不超过max_delay
+                while self._running:
+                    now = time.monotonic()
+                    quiet_until = self._last_change + self.delay
+                    deadline = self._first_change + self.max_delay
+                    if now >= quiet_until or now >= deadline:
+                        break
+                    self._condition.wait(min(quiet_until, deadline) - now)
+                
+                pending = self._pending
+                self._pending = {}
+                running = self._running
+            
+            self._apply(pending)
+            
+            if not running:
+                break
+    
+    def _apply(self, pending):
+        """把变更应用到向量集合
+        
+        插入、更新和删除都归结为按ID刷新：数据库中仍存在的记录重新计算，
+        已不存在的记录从集合中移除。
+        
+        Args:
+            pending (dict): 集合名称到记录ID集合的映射
+        """
+        if not pending:
+            return
+        
+        with self._apply_lock:
+            try:
+                # 所有集合的刷新共用同步线程中的同一个会话
+                with session_scope():
+                    for name, ids in pending.items():
+                        self.embedding_manager.refresh_items(name, sorted(ids))
+            except Exception as e:
+                print(f"同步向量索引时出错: {str(e)}")
@@ -0,0 +1,402 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+自媒体博主自动化辅助平台 - 嵌入模型优化推理模块
+
+用法:
+    python -m app.core.rag.inference --modes fp32 int8 onnx --count 1000
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import numpy as np
+from app.core.rag import model_registry
+from app.core.rag.vector_search import normalize_rows
+
+# 推理模式：
+# fp32      - SentenceTransformer原始模型
+# int8      - torch动态量化，Linear层权重为int8，激活在运行时量化
+# onnx      - 导出为ONNX图，由ONNX Runtime执行
+# onnx-int8 - 导出后再用ONNX Runtime动态量化为int8
+INFERENCE_MODES = ("fp32", "int8", "onnx", "onnx-int8")
+
+# 导出的ONNX模型和校验结果的存放目录
+MODEL_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))),
+    'app', 'data', 'embeddings', 'models'
+)
+
+# 校验优化推理模式时使用的探针句子，覆盖中英文混合的论文主题
+PROBE_SENTENCES = [
+    "大语言模型的推理加速方法综述",
+    "LoRA低秩适配在大模型微调中的应用",
+    "DALL-E 3技术原理与图像生成",
+    "扩散模型如何从噪声中生成图像",
+    "Transformer中的自注意力机制详解",
+    "检索增强生成(RAG)提升问答准确率",
+    "多模态大模型同时理解图像和文本",
+    "强化学习从人类反馈中对齐语言模型",
+    "模型量化把权重从float32压缩为int8",
+    "知识蒸馏让小模型学习大模型的能力",
+    "如何制作一份结构清晰的论文讲解PPT",
+    "演讲稿开头用一个问题吸引听众注意",
+    "向量数据库的近似最近邻检索",
+    "BM25与稠密向量的混合检索",
+    "Mixture of Experts scales model capacity with sparse routing",
+    "Chain-of-thought prompting improves multi-step reasoning",
+    "Vision transformers split images into patches",
+    "Speculative decoding speeds up autoregressive generation",
+    "Contrastive learning aligns image and text embeddings",
+    "Low-rank adaptation reduces the number of trainable parameters",
+    "A survey of evaluation benchmarks for large language models",
+    "Graph neural networks for molecular property prediction",
+    "Instruction tuning makes models follow natural language commands",
+    "Efficient attention with linear complexity for long documents"
+]
+
+def _model_path(name, mode):
+    """导出模型的目录
+    
+    Args:
+        name (str): 模型名称
+        mode (str): 推理模式
+        
+    Returns:
+        str: 目录路径
+    """
+    return os.path.join(MODEL_DIR, f"{name.replace('/', '__')}.{mode}")
+
+class OnnxSentenceEncoder:
+    """由ONNX Runtime执行的句向量编码器
+    
+    导出目录中保存ONNX图、分词器和池化配置，加载时不需要原始的torch模型。
+    encode和get_sentence_embedding_dimension与SentenceTransformer的接口一致，
+    可以直接替换注册表中的模型。
+    """
+    
+    def __init__(self, path, threads=None):
+        """加载导出的模型
+        
+        Args:
+            path (str): 导出目录
+            threads (int, optional): ONNX Runtime的计算线程数，默认由其自行决定
+        """
+        import onnxruntime
+        from transformers import AutoTokenizer
+        
+        with open(os.path.join(path, 'pooling.json'), 'r', encoding='utf-8') as f:
+            self.config = json.load(f)
+        
+        self.tokenizer = AutoTokenizer.from_pretrained(path)
+        
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(path, 'model.onnx'), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [item.name for item in self.session.get_inputs()]
+    
+    def get_sentence_embedding_dimension(self):
+        """向量维度"""
+        return self.config["dimension"]
+    
+    @property
+    def max_seq_length(self):
+        """最大输入token数，与SentenceTransformer.max_seq_length一致"""
+        return self.config["max_seq_length"]
+    
+    def encode(self, sentences, batch_size=32, **kwargs):
+        """批量编码文本
+        
+        文本按长度排序后分批，同一批内的填充最少。
+        
+        Args:
+            sentences (str or list): 文本或文本列表
+            batch_size (int, optional): 每批编码的文本数量
+            
+        Returns:
+            numpy.ndarray: 单个文本时为一维向量，否则为(len(sentences), dim)的float32矩阵
+        """
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        sentences = list(sentences)
+        
+        vectors = np.empty((len(sentences), self.config["dimension"]), dtype=np.float32)
+        order = np.argsort([-len(text) for text in sentences], kind='stable')
+        
+        for start in range(0, len(sentences), batch_size):
+            batch = order[start:start + batch_size]
+            tokens = self.tokenizer(
+                [sentences[index] for index in batch],
+                padding=True,
+                truncation=True,
+                max_length=self.config["max_seq_length"],
+                return_tensors="np"
+            )
+            feeds = {name: tokens[name].astype(np.int64) for name in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            vectors[batch] = self._pool(hidden, tokens["attention_mask"])
+        
+        if self.config["normalize"]:
+            vectors = normalize_rows(vectors)
+        return vectors[0] if single else vectors
+    
+    def _pool(self, hidden, attention_mask):
+        """按原模型的池化方式把词向量汇总为句向量"""
+        if self.config["pooling"] == "cls":
+            return hidden[:, 0]
+        
+        mask = attention_mask[:, :, None].astype(np.float32)
+        if self.config["pooling"] == "max":
+            return np.where(mask > 0, hidden, -1e9).max(axis=1)
+        return (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+def export_onnx(name, mode="onnx"):
+    """把SentenceTransformer模型导出为ONNX
+    
+    只导出Transformer主干，池化和归一化在numpy中完成。
+    先在临时目录中导出，完成后重命名，中途失败不会留下不完整的模型。
+    
+    Args:
+        name (str): 模型名称
+        mode (str, optional): "onnx"或"onnx-int8"
+        
+    Returns:
+        str: 导出目录
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    
+    path = _model_path(name, mode)
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    
+    model = SentenceTransformer(name, device="cpu")
+    transformer, pooling = model[0], model[1]
+    
+    if pooling.pooling_mode_cls_token:
+        pooling_mode = "cls"
+    elif pooling.pooling_mode_max_tokens:
+        pooling_mode = "max"
+    elif pooling.pooling_mode_mean_tokens:
+        pooling_mode = "mean"
+    else:
+        raise ValueError(f"不支持的池化方式: {pooling.get_pooling_mode_str()}")
+    
+    class _Backbone(torch.nn.Module):
+        """只输出最后一层词向量的包装"""
+        
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+        
+        def forward(self, input_ids, attention_mask):
+            return self.auto_model(input_ids=input_ids, attention_mask=attention_mask)[0]
+    
+    dummy = transformer.tokenizer(["导出示例", "export sample"], padding=True, return_tensors="pt")
+    onnx_path = os.path.join(tmp_path, 'model.onnx')
+    with torch.no_grad():
+        torch.onnx.export(
+            _Backbone(transformer.auto_model).eval(),
+            (dummy["input_ids"], dummy["attention_mask"]),
+            onnx_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"}
+            },
+            opset_version=14,
+            do_constant_folding=True
+        )
+    
+    if mode == "onnx-int8":
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantized_path = os.path.join(tmp_path, 'model.int8.onnx')
+        quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QInt8)
+        os.replace(quantized_path, onnx_path)
+    
+    transformer.tokenizer.save_pretrained(tmp_path)
+    config = {
+        "pooling": pooling_mode,
+        "normalize": any(type(module).__name__ == "Normalize" for module in model),
+        "max_seq_length": transformer.max_seq_length,
+        "dimension": model.get_sentence_embedding_dimension()
+    }
+    with open(os.path.join(tmp_path, 'pooling.json'), 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+    
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return path
+
+def load_model(name, mode):
+    """加载指定推理模式的模型
+    
+    ONNX模式首次使用时自动导出，之后直接加载导出结果。
+    
+    Args:
+        name (str): 模型名称
+        mode (str): 推理模式
+        
+    Returns:
+        与SentenceTransformer接口一致的模型对象
+    """
+    if mode not in INFERENCE_MODES:
+        raise ValueError(f"不支持的推理模式: {mode}")
+    
+    from sentence_transformers import SentenceTransformer
+    if mode == "fp32":
+        return SentenceTransformer(name)
+    
+    if mode == "int8":
+        import torch
+        model = SentenceTransformer(name, device="cpu")
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    
+    path = _model_path(name, mode)
+    if not os.path.exists(os.path.join(path, 'pooling.json')):
+        print(f"正在把嵌入模型{name}导出为{mode}格式...")
+        export_onnx(name, mode)
+    return OnnxSentenceEncoder(path)
+
+def compare_rankings(reference, candidate, sentences=None, top_k=3):
+    """比较两个模型在同一组句子上的向量和相似度排序
+    
+    Args:
+        reference: 参照模型（fp32）
+        candidate: 待比较的模型
+        sentences (list, optional): 句子列表，默认使用PROBE_SENTENCES
+        top_k (int, optional): 比较每个句子最相似的前top_k个句子
+        
+    Returns:
+        dict: min_cosine为同一句子两种向量的最小余弦相似度，
+            top_k_overlap为各句子前top_k近邻集合的平均重合比例
+    """
+    sentences = list(sentences or PROBE_SENTENCES)
+    expected = normalize_rows(reference.encode(sentences))
+    actual = normalize_rows(candidate.encode(sentences))
+    
+    cosine = np.sum(expected * actual, axis=1)
+    
+    expected_similarity = expected @ expected.T
+    actual_similarity = actual @ actual.T
+    np.fill_diagonal(expected_similarity, -np.inf)
+    np.fill_diagonal(actual_similarity, -np.inf)
+    expected_top = np.argsort(-expected_similarity, axis=1)[:, :top_k]
+    actual_top = np.argsort(-actual_similarity, axis=1)[:, :top_k]
+    overlap = [len(set(a) & set(b)) / top_k for a, b in zip(expected_top.tolist(), actual_top.tolist())]
+    
+    return {
+        "min_cosine": float(cosine.min()),
+        "mean_cosine": float(cosine.mean()),
+        "top_k_overlap": float(np.mean(overlap))
+    }
+
+def verify(name, mode, model, min_cosine=0.98, min_overlap=0.9):
+    """检查优化推理模式的结果与fp32模型是否在容差范围内
+    
+    校验结果按模型和模式保存，之后的启动不再重复加载fp32模型。
+    
+    Args:
+        name (str): 模型名称
+        mode (str): 推理模式
+        model: 该模式下加载的模型
+        min_cosine (float, optional): 同一句子两种向量的最小余弦相似度
+        min_overlap (float, optional): 近邻排序的最小平均重合比例
+        
+    Returns:
+        bool: 是否通过校验
+    """
+    if mode == "fp32":
+        return True
+    
+    check_path = os.path.join(MODEL_DIR, 'inference_check.json')
+    checks = {}
+    if os.path.exists(check_path):
+        try:
+            with open(check_path, 'r', encoding='utf-8') as f:
+                checks = json.load(f)
+        except Exception as e:
+            print(f"读取推理模式校验结果时出错: {str(e)}")
+    
+    key = f"{name}|{mode}"
+    if key not in checks:
+        was_loaded = model_registry.is_loaded(name)
+        metrics = compare_rankings(model_registry.get_model(name), model)
+        if not was_loaded:
+            model_registry.release_model(name)
+        
+        metrics["passed"] = metrics["min_cosine"] >= min_cosine and metrics["top_k_overlap"] >= min_overlap
+        checks[key] = metrics
+        print(f"{mode}推理模式校验结果: {metrics}")
+        
+        os.makedirs(MODEL_DIR, exist_ok=True)
+        with open(check_path, 'w', encoding='utf-8') as f:
+            json.dump(checks, f, ensure_ascii=False, indent=2)
+    
+    return checks[key]["passed"]
+
+def benchmark(name, modes, count=1000, batch_size=64):
+    """比较各推理模式的编码速度，并报告与fp32模型的一致性
+    
+    Args:
+        name (str): 模型名称
+        modes (list): 推理模式列表
+        count (int, optional): 编码的句子数量
+        batch_size (int, optional): 每批编码的句子数量
+        
+    Returns:
+        dict: 推理模式到统计的映射，包含sentences_per_sec和与fp32比较的指标
+    """
+    sentences = [
+        f"{PROBE_SENTENCES[index % len(PROBE_SENTENCES)]}（第{index}篇）"
+        for index in range(count)
+    ]
+    reference = load_model(name, "fp32")
+    results = {}
+    
+    for mode in modes:
+        try:
+            model = reference if mode == "fp32" else load_model(name, mode)
+        except Exception as e:
+            print(f"加载{mode}推理模式时出错: {str(e)}")
+            continue
+        model.encode(sentences[:batch_size], batch_size=batch_size)
+        
+        start = time.perf_counter()
+        model.encode(sentences, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        
+        stats = {"sentences_per_sec": round(count / elapsed, 1)}
+        if mode != "fp32":
+            stats.update(compare_rankings(reference, model))
+        results[mode] = stats
+        print(f"{mode}: {stats}")
+    
+    return results
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="比较嵌入模型各推理模式的速度和结果一致性")
+    parser.add_argument("--model", default=model_registry.DEFAULT_MODEL_NAME, help="嵌入模型名称")
+    parser.add_argument("--modes", nargs="+", choices=INFERENCE_MODES, default=list(INFERENCE_MODES), help="推理模式")
+    parser.add_argument("--count", type=int, default=1000, help="编码的句子数量")
+    parser.add_argument("--batch-size", type=int, default=64, help="每批编码的句子数量")
+    args = parser.parse_args(argv)
+    
+    benchmark(args.model, args.modes, count=args.count, batch_size=args.batch_size)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
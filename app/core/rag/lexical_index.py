@@ -0,0 +1,405 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+自媒体博主自动化辅助平台 - 词法倒排索引模块
+"""
+
+import os
+import re
+import copy
+import math
+from collections import Counter
+import numpy as np
+from app.core.rag.vector_search import top_k_indices
+
+# 拉丁字母数字词（保留"dall-e"、"gpt-4"、"3.5"这类带连接符的词）与连续的中日韩字符
+TOKEN_PATTERN = re.compile(
+    r"[a-z0-9]+(?:[-.][a-z0-9]+)*|[぀-ヿ㐀-䶿一-鿿豈-﫿]+"
+)
+
+def tokenize(text):
+    """中英文混合分词
+    
+    拉丁文字按词切分并转为小写；中日韩文字不做分词，
+    而是切分为相邻两个字组成的二元组，单字片段保留为单字。
+    
+    Args:
+        text (str): 文本
+        
+    Returns:
+        list: 词项列表
+    """
+    tokens = []
+    for match in TOKEN_PATTERN.finditer((text or "").lower()):
+        token = match.group()
+        if token[0].isascii():
+            tokens.append(token)
+            # 带连接符的词同时索引各组成部分，"dall-e"也能被"dall"命中
+            if "-" in token:
+                tokens.extend(part for part in token.split("-") if part)
+        elif len(token) == 1:
+            tokens.append(token)
+        else:
+            tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+    return tokens
+
+class BM25Index:
+    """BM25倒排索引类
+    
+    基础部分的倒排表以CSR形式存放在 <name>.bm25.npz 中：每个词项的
+    文档ID和词频连续存放，通过offsets定位。之后新增或删除的文档记录在增量部分，
+    保存时只把增量部分写入 <name>.bm25.delta.npz，单条更新的写入量与索引规模无关；
+    增量涉及的文档数超过阈值后才合并进基础部分，重写整个索引。
+    增量文件记录它所基于的基础部分代数，与基础部分不匹配时被忽略。
+    """
+    
+    def __init__(self, directory, name, k1=1.2, b=0.75, merge_ratio=0.1, merge_min_docs=2000):
+        """初始化索引
+        
+        Args:
+            directory (str): 存储目录
+            name (str): 集合名称
+            k1 (float, optional): BM25词频饱和参数
+            b (float, optional): BM25文档长度归一化参数
+            merge_ratio (float, optional): 增量涉及的文档数超过文档总数的该比例时合并
+            merge_min_docs (int, optional): 增量涉及的文档数小于该值时不合并
+        """
+        self.path = os.path.join(directory, f"{name}.bm25.npz")
+        self.delta_path = os.path.join(directory, f"{name}.bm25.delta.npz")
+        self.k1 = k1
+        self.b = b
+        self.merge_ratio = merge_ratio
+        self.merge_min_docs = merge_min_docs
+        
+        # 磁盘上基础部分的代数，每次合并加一
+        self._generation = 0
+        
+        self.clear()
+        self.load()
+        self.dirty = False
+    
+    def clear(self):
+        """清空索引"""
+        # 基础部分（CSR）
+        self._terms = {}
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._post_docs = np.empty(0, dtype=np.int64)
+        self._post_tfs = np.empty(0, dtype=np.int32)
+        self._removed = set()
+        
+        # 增量部分
+        self._delta = {}
+        self._delta_terms = {}
+        
+        # 全部有效文档的长度
+        self._lengths = {}
+        self._total_length = 0
+        self.dirty = True
+    
+    def copy(self):
+        """创建可以独立修改的副本
+        
+        基础部分的数组只读，与原索引共享；增量部分和文档长度被复制。
+        写入方在副本上修改并保存后再替换原索引，检索方无需加锁。
+        
+        Returns:
+            BM25Index: 索引副本
+        """
+        clone = copy.copy(self)
+        clone._removed = set(self._removed)
+        clone._delta = {term: dict(postings) for term, postings in self._delta.items()}
+        clone._delta_terms = dict(self._delta_terms)
+        clone._lengths = dict(self._lengths)
+        return clone
+    
+    @property
+    def doc_count(self):
+        """索引中的文档数量"""
+        return len(self._lengths)
+    
+    def __contains__(self, doc_id):
+        return int(doc_id) in self._lengths
+    
+    def add(self, doc_id, text):
+        """添加或更新文档
+        
+        Args:
+            doc_id (int): 文档ID
+            text (str): 文档文本
+        """
+        doc_id = int(doc_id)
+        self.remove(doc_id)
+        
+        counts = Counter(tokenize(text))
+        
+        for term, tf in counts.items():
+            self._delta.setdefault(term, {})[doc_id] = tf
+        self._delta_terms[doc_id] = list(counts)
+        
+        length = sum(counts.values())
+        self._lengths[doc_id] = length
+        self._total_length += length
+        self.dirty = True
+    
+    def remove(self, doc_id):
+        """删除文档
+        
+        Args:
+            doc_id (int): 文档ID
+        """
+        doc_id = int(doc_id)
+        if doc_id not in self._lengths:
+            return
+        
+        self._total_length -= self._lengths.pop(doc_id)
+        terms = self._delta_terms.pop(doc_id, None)
+        if terms is None:
+            self._removed.add(doc_id)
+        else:
+            for term in terms:
+                postings = self._delta[term]
+                del postings[doc_id]
+                if not postings:
+                    del self._delta[term]
+        self.dirty = True
+    
+    def _postings(self, term):
+        """获取词项的倒排表
+        
+        Returns:
+            tuple: (文档ID数组, 词频数组)
+        """
+        docs = [np.empty(0, dtype=np.int64)]
+        tfs = [np.empty(0, dtype=np.int32)]
+        
+        index = self._terms.get(term)
+        if index is not None:
+            start, end = self._offsets[index], self._offsets[index + 1]
+            base_docs = self._post_docs[start:end]
+            base_tfs = self._post_tfs[start:end]
+            if self._removed:
+                keep = ~np.isin(base_docs, np.fromiter(self._removed, dtype=np.int64))
+                base_docs, base_tfs = base_docs[keep], base_tfs[keep]
+            docs.append(base_docs)
+            tfs.append(base_tfs)
+        
+        delta = self._delta.get(term)
+        if delta:
+            docs.append(np.fromiter(delta.keys(), dtype=np.int64, count=len(delta)))
+            tfs.append(np.fromiter(delta.values(), dtype=np.int32, count=len(delta)))
+        
+        return np.concatenate(docs), np.concatenate(tfs)
+    
+    def search(self, query, limit=100):
+        """BM25检索
+        
+        Args:
+            query (str): 查询文本
+            limit (int, optional): 返回结果数量
+            
+        Returns:
+            tuple: (文档ID数组, BM25得分数组)，按得分降序排列
+        """
+        n = self.doc_count
+        terms = set(tokenize(query))
+        if n == 0 or not terms:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        
+        avg_length = self._total_length / n if self._total_length else 1.0
+        all_docs = []
+        all_scores = []
+        
+        for term in terms:
+            docs, tfs = self._postings(term)
+            if len(docs) == 0:
+                continue
+            
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            lengths = np.fromiter((self._lengths[doc] for doc in docs.tolist()), dtype=np.float32, count=len(docs))
+            tfs = tfs.astype(np.float32)
+            norm = self.k1 * (1 - self.b + self.b * lengths / avg_length)
+            all_docs.append(docs)
+            all_scores.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+        
+        if not all_docs:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        
+        docs, inverse = np.unique(np.concatenate(all_docs), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores)).astype(np.float32)
+        
+        best = top_k_indices(scores, limit)
+        return docs[best], scores[best]
+    
+    def save(self):
+        """保存索引
+        
+        增量部分较小时只重写增量文件，写入量与增量大小成正比；
+        增量涉及的文档数超过阈值或基础部分尚未保存时，合并后重写整个索引。
+        """
+        if not self.dirty:
+            return
+        
+        changed = len(self._delta_terms) + len(self._removed)
+        if os.path.exists(self.path) and changed <= max(self.merge_min_docs, self.doc_count * self.merge_ratio):
+            self._save_delta()
+        else:
+            self._merge()
+    
+    def _save_delta(self):
+        """只保存增量部分"""
+        term_list = list(self._delta)
+        counts = [len(self._delta[term]) for term in term_list]
+        offsets = np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+        total = int(offsets[-1])
+        docs = np.fromiter(
+            (doc_id for term in term_list for doc_id in self._delta[term]), dtype=np.int64, count=total
+        )
+        tfs = np.fromiter(
+            (tf for term in term_list for tf in self._delta[term].values()), dtype=np.int32, count=total
+        )
+        doc_ids = np.fromiter(self._delta_terms.keys(), dtype=np.int64, count=len(self._delta_terms))
+        doc_lengths = np.fromiter(
+            (self._lengths[doc_id] for doc_id in self._delta_terms), dtype=np.int32, count=len(self._delta_terms)
+        )
+        
+        tmp_path = f"{self.delta_path}.tmp.npz"
+        try:
+            np.savez(
+                tmp_path,
+                base_generation=np.int64(self._generation),
+                terms=np.array(term_list, dtype=str),
+                offsets=offsets,
+                post_docs=docs,
+                post_tfs=tfs,
+                removed=np.fromiter(self._removed, dtype=np.int64, count=len(self._removed)),
+                doc_ids=doc_ids,
+                doc_lengths=doc_lengths
+            )
+            os.replace(tmp_path, self.delta_path)
+        except Exception as e:
+            print(f"保存倒排索引增量时出错: {str(e)}")
+            return
+        
+        self.dirty = False
+    
+    def _merge(self):
+        """把增量部分合并进基础部分并保存"""
+        # 基础部分中仍然有效的倒排项
+        term_list = [None] * len(self._terms)
+        for term, index in self._terms.items():
+            term_list[index] = term
+        term_index = np.repeat(np.arange(len(term_list), dtype=np.int64), np.diff(self._offsets))
+        docs = self._post_docs
+        tfs = self._post_tfs
+        if self._removed:
+            keep = ~np.isin(docs, np.fromiter(self._removed, dtype=np.int64))
+            term_index, docs, tfs = term_index[keep], docs[keep], tfs[keep]
+        
+        # 追加增量部分
+        terms = dict(self._terms)
+        delta_index, delta_docs, delta_tfs = [], [], []
+        for term, postings in self._delta.items():
+            if term not in terms:
+                terms[term] = len(term_list)
+                term_list.append(term)
+            delta_index.extend([terms[term]] * len(postings))
+            delta_docs.extend(postings.keys())
+            delta_tfs.extend(postings.values())
+        
+        term_index = np.concatenate([term_index, np.asarray(delta_index, dtype=np.int64)])
+        docs = np.concatenate([docs, np.asarray(delta_docs, dtype=np.int64)])
+        tfs = np.concatenate([tfs, np.asarray(delta_tfs, dtype=np.int32)])
+        
+        order = np.lexsort((docs, term_index))
+        term_index, docs, tfs = term_index[order], docs[order], tfs[order]
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(term_index, minlength=len(term_list)))])
+        
+        doc_ids = np.fromiter(self._lengths.keys(), dtype=np.int64, count=len(self._lengths))
+        doc_lengths = np.fromiter(self._lengths.values(), dtype=np.int32, count=len(self._lengths))
+        
+        generation = self._generation + 1
+        tmp_path = f"{self.path}.tmp.npz"
+        try:
+            np.savez(
+                tmp_path,
+                generation=np.int64(generation),
+                terms=np.array(term_list, dtype=str),
+                offsets=offsets,
+                post_docs=docs,
+                post_tfs=tfs,
+                doc_ids=doc_ids,
+                doc_lengths=doc_lengths
+            )
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"保存倒排索引时出错: {str(e)}")
+            return
+        
+        # 增量文件基于上一代基础部分，即使未能删除也会在加载时被忽略
+        try:
+            os.remove(self.delta_path)
+        except OSError:
+            pass
+        
+        self._generation = generation
+        self._terms = terms
+        self._offsets = offsets
+        self._post_docs = docs
+        self._post_tfs = tfs
+        self._removed = set()
+        self._delta = {}
+        self._delta_terms = {}
+        self.dirty = False
+    
+    def load(self):
+        """从磁盘加载索引"""
+        if not os.path.exists(self.path):
+            return
+        
+        try:
+            with np.load(self.path) as data:
+                self._generation = int(data["generation"]) if "generation" in data.files else 0
+                self._terms = {term: index for index, term in enumerate(data["terms"].tolist())}
+                self._offsets = data["offsets"]
+                self._post_docs = data["post_docs"]
+                self._post_tfs = data["post_tfs"]
+                self._lengths = dict(zip(data["doc_ids"].tolist(), data["doc_lengths"].tolist()))
+        except Exception as e:
+            print(f"加载倒排索引时出错: {str(e)}")
+            self.clear()
+            return
+        
+        self._load_delta()
+        self._total_length = sum(self._lengths.values())
+    
+    def _load_delta(self):
+        """加载增量文件，与基础部分的代数不一致时忽略"""
+        if not os.path.exists(self.delta_path):
+            return
+        
+        try:
+            with np.load(self.delta_path) as data:
+                if int(data["base_generation"]) != self._generation:
+                    return
+                terms = data["terms"].tolist()
+                offsets = data["offsets"].tolist()
+                docs = data["post_docs"].tolist()
+                tfs = data["post_tfs"].tolist()
+                removed = data["removed"].tolist()
+                lengths = dict(zip(data["doc_ids"].tolist(), data["doc_lengths"].tolist()))
+        except Exception as e:
+            print(f"加载倒排索引增量时出错: {str(e)}")
+            return
+        
+        self._delta_terms = {doc_id: [] for doc_id in lengths}
+        for term, start, end in zip(terms, offsets[:-1], offsets[1:]):
+            postings = dict(zip(docs[start:end], tfs[start:end]))
+            self._delta[term] = postings
+            for doc_id in postings:
+                self._delta_terms[doc_id].append(term)
+        
+        self._removed = set(removed)
+        for doc_id in removed:
+            self._lengths.pop(doc_id, None)
+        self._lengths.update(lengths)
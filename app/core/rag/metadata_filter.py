@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+自媒体博主自动化辅助平台 - 元数据过滤模块
+"""
+
+import datetime
+import operator
+import numpy as np
+
+# 过滤条件支持的比较运算符
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le
+}
+
+def to_metadata_value(value):
+    """把元数据值转换为可保存、可比较的形式
+    
+    日期时间转换为时间戳，使日期字段可以按范围过滤。
+    
+    Args:
+        value: 原始值
+        
+    Returns:
+        转换后的值
+    """
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time()).timestamp()
+    return value
+
+class MetadataColumn:
+    """按列存储的元数据数组
+    
+    数值列（包括转换为时间戳的日期）保存为float64数组，缺失值为NaN；
+    其他列按取值编码为int32数组加取值表，比较时只需对每个不同取值求值一次，
+    再按编码展开为整列的布尔掩码。
+    """
+    
+    def __init__(self, values):
+        """根据元数据列表构建列数组
+        
+        Args:
+            values (list): 某个字段的全部取值，与向量行一一对应
+        """
+        self.size = len(values)
+        self.numeric = all(
+            value is None or (isinstance(value, (int, float)) and not isinstance(value, bool))
+            for value in values
+        )
+        
+        if self.numeric:
+            self.values = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+            self.categories = None
+        else:
+            lookup = {}
+            self.values = np.fromiter(
+                (lookup.setdefault(value, len(lookup)) for value in values),
+                dtype=np.int32, count=len(values)
+            )
+            self.categories = list(lookup)
+    
+    def compare(self, op, value):
+        """计算比较条件的布尔掩码
+        
+        Args:
+            op (str): 比较运算符，见OPERATORS，另外支持"in"和"not in"
+            value: 比较值，"in"和"not in"时为取值列表
+            
+        Returns:
+            numpy.ndarray: 布尔数组
+        """
+        if op in ("in", "not in"):
+            mask = self._isin([to_metadata_value(item) for item in value])
+            return ~mask if op == "not in" else mask
+        
+        if op not in OPERATORS:
+            raise ValueError(f"不支持的过滤运算符: {op}")
+        compare = OPERATORS[op]
+        value = to_metadata_value(value)
+        
+        if self.numeric:
+            if not isinstance(value, (int, float)):
+                return np.full(self.size, op == "!=", dtype=bool)
+            return compare(self.values, value)
+        
+        # 对每个不同取值求值一次，再按编码展开
+        matches = np.zeros(len(self.categories), dtype=bool)
+        for code, category in enumerate(self.categories):
+            try:
+                matches[code] = category is not None and bool(compare(category, value))
+            except TypeError:
+                matches[code] = op == "!="
+        return self._expand(matches)
+    
+    def _isin(self, values):
+        """计算取值属于给定列表的布尔掩码"""
+        if self.numeric:
+            numbers = [item for item in values if isinstance(item, (int, float))]
+            return np.isin(self.values, np.asarray(numbers, dtype=np.float64))
+        
+        wanted = set(values)
+        matches = np.fromiter((category in wanted for category in self.categories), dtype=bool, count=len(self.categories))
+        return self._expand(matches)
+    
+    def _expand(self, matches):
+        """把每个取值的匹配结果展开为整列的布尔掩码"""
+        codes = np.flatnonzero(matches)
+        if len(codes) == 0:
+            return np.zeros(self.size, dtype=bool)
+        if len(codes) == 1:
+            # 只匹配一个取值时直接比较编码，比按编码查表快
+            return self.values == codes[0]
+        return matches[self.values]
+
+def build_mask(column_getter, filters, size):
+    """根据过滤条件构建布尔掩码
+    
+    过滤条件为字段名到条件的映射，多个字段之间为"且"的关系：
+    - 普通值表示等于，如 {"content_type": "PPT"}
+    - 列表、元组或集合表示属于其中之一，如 {"source": ["arXiv", "OpenReview"]}
+    - 字典表示运算符到比较值的映射，如 {"published_date": {">=": datetime}}
+    
+    Args:
+        column_getter (function): 接收字段名、返回MetadataColumn的函数
+        filters (dict): 过滤条件
+        size (int): 集合记录数
+        
+    Returns:
+        numpy.ndarray: 布尔数组，filters为空时返回None
+    """
+    if not filters:
+        return None
+    
+    masks = []
+    for field, condition in filters.items():
+        column = column_getter(field)
+        if isinstance(condition, dict):
+            masks.extend(column.compare(op, value) for op, value in condition.items())
+        elif isinstance(condition, (list, tuple, set, frozenset)):
+            masks.append(column.compare("in", condition))
+        else:
+            masks.append(column.compare("==", condition))
+    
+    if not masks:
+        return np.ones(size, dtype=bool)
+    
+    mask = masks[0]
+    for other in masks[1:]:
+        mask &= other
+    return mask
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+自媒体博主自动化辅助平台 - 嵌入模型注册模块
+"""
+
+import gc
+import threading
+
+# 默认嵌入模型
+DEFAULT_MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
+
+# 默认推理模式，可选值见inference.INFERENCE_MODES
+DEFAULT_INFERENCE = 'fp32'
+
+# 进程内共享的模型实例
+_models = {}
+_registry_lock = threading.Lock()
+_model_locks = {}
+
+def _model_lock(name):
+    """获取某个模型的加载锁，保证同一模型只加载一次"""
+    with _registry_lock:
+        if name not in _model_locks:
+            _model_locks[name] = threading.Lock()
+        return _model_locks[name]
+
+def _model_key(name, inference=DEFAULT_INFERENCE):
+    """注册表中模型的键，同一模型的不同推理模式分别缓存"""
+    return name if inference == 'fp32' else f"{name}#{inference}"
+
+def get_model(name=DEFAULT_MODEL_NAME, inference=DEFAULT_INFERENCE):
+    """获取共享的SentenceTransformer模型，首次调用时加载
+    
+    torch和sentence_transformers也在首次调用时才导入，
+    不使用检索功能的组件不会为此付出启动时间和内存。
+    
+    inference不是fp32时加载优化推理模式的模型，并检查其相似度排序与fp32模型
+    是否在容差范围内；加载失败或未通过检查时改用fp32模型。
+    
+    Args:
+        name (str, optional): 模型名称
+        inference (str, optional): 推理模式，"fp32"、"int8"、"onnx"或"onnx-int8"
+        
+    Returns:
+        SentenceTransformer: 模型实例，或接口相同的优化模型
+    """
+    key = _model_key(name, inference)
+    model = _models.get(key)
+    if model is not None:
+        return model
+    
+    with _model_lock(key):
+        model = _models.get(key)
+        if model is None:
+            model = _load_model(name, inference)
+            _models[key] = model
+        return model
+
+def _load_model(name, inference):
+    """加载指定推理模式的模型，失败时退回fp32模型"""
+    if inference == 'fp32':
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(name)
+    
+    from app.core.rag import inference as inference_modes
+    try:
+        model = inference_modes.load_model(name, inference)
+        if inference_modes.verify(name, inference, model):
+            return model
+        print(f"{inference}推理模式的相似度排序与fp32模型偏差超出容差，改用fp32模型")
+    except Exception as e:
+        print(f"加载{inference}推理模式时出错: {str(e)}，改用fp32模型")
+    return get_model(name)
+
+def warm_up(name=DEFAULT_MODEL_NAME, inference=DEFAULT_INFERENCE):
+    """在后台线程中预加载模型
+    
+    Args:
+        name (str, optional): 模型名称
+        inference (str, optional): 推理模式
+        
+    Returns:
+        threading.Thread: 加载线程
+    """
+    def _load():
+        try:
+            get_model(name, inference)
+        except Exception as e:
+            print(f"预加载嵌入模型时出错: {str(e)}")
+    
+    thread = threading.Thread(target=_load)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+def is_loaded(name=DEFAULT_MODEL_NAME, inference=DEFAULT_INFERENCE):
+    """模型是否已加载
+    
+    Args:
+        name (str, optional): 模型名称
+        inference (str, optional): 推理模式
+        
+    Returns:
+        bool: 是否已加载
+    """
+    return _model_key(name, inference) in _models
+
+def release_model(name=None):
+    """释放共享的模型以回收内存，下次使用时会重新加载
+    
+    Args:
+        name (str, optional): 模型名称，为None时释放全部模型，
+            否则释放该模型所有推理模式的实例
+            
+    Returns:
+        int: 释放的模型数量
+    """
+    names = list(_models) if name is None else [
+        key for key in list(_models) if key == name or key.startswith(f"{name}#")
+    ]
+    released = 0
+    
+    for model_name in names:
+        with _model_lock(model_name):
+            if _models.pop(model_name, None) is not None:
+                released += 1
+    
+    if released:
+        gc.collect()
+    return released
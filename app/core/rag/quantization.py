@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+自媒体博主自动化辅助平台 - 向量量化模块
+"""
+
+import numpy as np
+
+# 分块扫描时每块的行数，块转换为float32后仍能放进CPU缓存
+SCAN_CHUNK_SIZE = 2048
+
+class Float16Quantizer:
+    """float16量化类，内存占用为float32的一半"""
+    
+    name = "float16"
+    
+    def fit(self, vectors):
+        """float16无需训练参数"""
+    
+    def encode(self, vectors):
+        """把float32向量转换为压缩表示
+        
+        Args:
+            vectors (numpy.ndarray): float32向量矩阵
+            
+        Returns:
+            numpy.ndarray: float16矩阵
+        """
+        return np.asarray(vectors, dtype=np.float16)
+    
+    def scores(self, codes, query):
+        """在压缩表示上计算近似内积
+        
+        Args:
+            codes (numpy.ndarray): 压缩向量矩阵
+            query (numpy.ndarray): float32查询向量
+            
+        Returns:
+            numpy.ndarray: float32得分数组
+        """
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCAN_CHUNK_SIZE):
+            chunk = codes[start:start + SCAN_CHUNK_SIZE].astype(np.float32)
+            scores[start:start + len(chunk)] = chunk @ query
+        return scores
+    
+    def state(self):
+        """需要随压缩向量一起保存的参数"""
+        return {}
+    
+    def set_state(self, state):
+        """恢复保存的参数"""
+
+class Int8Quantizer:
+    """按维度缩放的int8量化类，内存占用为float32的四分之一
+    
+    每个维度使用各自的缩放系数 scale[d] = max(|x[:, d]|) / 127，
+    查询时把缩放系数乘到查询向量上，扫描时无需反量化整行。
+    """
+    
+    name = "int8"
+    
+    def __init__(self):
+        self.scale = None
+    
+    def fit(self, vectors):
+        """根据向量的取值范围计算每个维度的缩放系数
+        
+        Args:
+            vectors (numpy.ndarray): float32向量矩阵
+        """
+        if len(vectors) == 0:
+            return
+        
+        max_abs = np.zeros(vectors.shape[1], dtype=np.float32)
+        for start in range(0, len(vectors), SCAN_CHUNK_SIZE):
+            chunk = np.abs(np.asarray(vectors[start:start + SCAN_CHUNK_SIZE], dtype=np.float32))
+            max_abs = np.maximum(max_abs, chunk.max(axis=0))
+        
+        max_abs[max_abs == 0] = 1.0
+        self.scale = max_abs / 127.0
+    
+    def encode(self, vectors):
+        """把float32向量量化为int8，超出训练范围的值被截断
+        
+        Args:
+            vectors (numpy.ndarray): float32向量矩阵
+            
+        Returns:
+            numpy.ndarray: int8矩阵
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.scale is None:
+            self.fit(vectors)
+        if self.scale is None:
+            return np.empty(vectors.shape, dtype=np.int8)
+        
+        return np.clip(np.rint(vectors / self.scale), -127, 127).astype(np.int8)
+    
+    def scores(self, codes, query):
+        """在压缩表示上计算近似内积
+        
+        Args:
+            codes (numpy.ndarray): int8向量矩阵
+            query (numpy.ndarray): float32查询向量
+            
+        Returns:
+            numpy.ndarray: float32得分数组
+        """
+        scaled_query = (query * self.scale).astype(np.float32)
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCAN_CHUNK_SIZE):
+            chunk = codes[start:start + SCAN_CHUNK_SIZE].astype(np.float32)
+            scores[start:start + len(chunk)] = chunk @ scaled_query
+        return scores
+    
+    def state(self):
+        """需要随压缩向量一起保存的参数"""
+        return {"scale": self.scale} if self.scale is not None else {}
+    
+    def set_state(self, state):
+        """恢复保存的参数"""
+        if "scale" in state:
+            self.scale = np.asarray(state["scale"], dtype=np.float32)
+
+def make_quantizer(storage):
+    """根据存储模式创建量化器
+    
+    Args:
+        storage (str): 存储模式，"float32"、"float16"或"int8"
+        
+    Returns:
+        量化器对象，float32模式返回None
+    """
+    if storage in (None, "float32"):
+        return None
+    if storage == "float16":
+        return Float16Quantizer()
+    if storage == "int8":
+        return Int8Quantizer()
+    raise ValueError(f"不支持的向量存储模式: {storage}")
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+自媒体博主自动化辅助平台 - 查询向量缓存模块
+"""
+
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+
+def normalize_query(text):
+    """规范化查询文本，使仅空白或全半角不同的查询命中同一缓存项
+    
+    Args:
+        text (str): 查询文本
+        
+    Returns:
+        str: 规范化后的文本
+    """
+    text = unicodedata.normalize("NFKC", text or "")
+    return re.sub(r"\s+", " ", text).strip()
+
+class QueryEmbeddingCache:
+    """查询向量LRU缓存类
+    
+    缓存键为 (模型名称, 规范化后的查询文本)，容量满时淘汰最久未使用的项。
+    指定path时缓存会持久化到.npz文件，下次启动时恢复。
+    """
+    
+    def __init__(self, max_size=256, path=None, save_interval=32):
+        """初始化缓存
+        
+        Args:
+            max_size (int, optional): 最大缓存条目数
+            path (str, optional): 持久化文件路径，为None时只缓存在内存中
+            save_interval (int, optional): 每新增多少条目自动保存一次
+        """
+        self.max_size = max_size
+        self.path = path
+        self.save_interval = save_interval
+        
+        self.hits = 0
+        self.misses = 0
+        
+        self._entries = OrderedDict()
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        
+        self.load()
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def get(self, model_name, text):
+        """查找缓存的查询向量
+        
+        Args:
+            model_name (str): 模型名称
+            text (str): 查询文本
+            
+        Returns:
+            numpy.ndarray: 缓存的向量，未命中时返回None
+        """
+        key = (model_name, normalize_query(text))
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+    
+    def put(self, model_name, text, vector):
+        """写入查询向量
+        
+        Args:
+            model_name (str): 模型名称
+            text (str): 查询文本
+            vector (numpy.ndarray): 查询向量
+        """
+        key = (model_name, normalize_query(text))
+        vector = np.array(vector, dtype=np.float32)
+        vector.flags.writeable = False
+        
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._unsaved += 1
+            should_save = self.path and self._unsaved >= self.save_interval
+        
+        if should_save:
+            self.save()
+    
+    def get_or_compute(self, model_name, text, compute):
+        """查找缓存，未命中时计算并写入
+        
+        Args:
+            model_name (str): 模型名称
+            text (str): 查询文本
+            compute (function): 计算向量的函数，接收查询文本
+            
+        Returns:
+            numpy.ndarray: 查询向量
+        """
+        vector = self.get(model_name, text)
+        if vector is None:
+            vector = compute(text)
+            self.put(model_name, text, vector)
+        return vector
+    
+    def stats(self):
+        """获取缓存统计
+        
+        Returns:
+            dict: 包含size、hits、misses、hit_rate
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+    
+    def clear(self):
+        """清空缓存和统计"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self._unsaved = 0
+    
+    def load(self):
+        """从持久化文件加载缓存"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                models = data["models"].tolist()
+                texts = data["texts"].tolist()
+                vectors = data["vectors"]
+        except Exception as e:
+            print(f"加载查询向量缓存时出错: {str(e)}")
+            return
+        
+        with self._lock:
+            for model_name, text, vector in zip(models, texts, vectors):
+                vector = np.array(vector, dtype=np.float32)
+                vector.flags.writeable = False
+                self._entries[(model_name, text)] = vector
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def save(self):
+        """保存缓存到持久化文件"""
+        if not self.path:
+            return
+        
+        with self._lock:
+            entries = list(self._entries.items())
+            self._unsaved = 0
+        
+        if not entries:
+            return
+        
+        dims = {len(vector) for _, vector in entries}
+        if len(dims) > 1:
+            # 切换过模型时只保留与最新条目维度一致的向量
+            dim = len(entries[-1][1])
+            entries = [(key, vector) for key, vector in entries if len(vector) == dim]
+        
+        tmp_path = f"{self.path}.tmp.npz"
+        try:
+            np.savez(
+                tmp_path,
+                models=np.array([key[0] for key, _ in entries]),
+                texts=np.array([key[1] for key, _ in entries]),
+                vectors=np.stack([vector for _, vector in entries])
+            )
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"保存查询向量缓存时出错: {str(e)}")
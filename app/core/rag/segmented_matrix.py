@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+自媒体博主自动化辅助平台 - 分段向量矩阵模块
+"""
+
+import numpy as np
+
+class SegmentedMatrix:
+    """由基础矩阵和增量矩阵拼接而成的只读向量矩阵
+    
+    基础矩阵通常是以内存映射方式加载的快照，base_rows记录其中仍然有效的行，
+    被删除或更新的行不再出现在base_rows中；新增的行保存在堆上的小增量矩阵里。
+    逻辑上的第i行在i < len(base_rows)时是base[base_rows[i]]，否则是增量矩阵的对应行。
+    
+    增量更新时只生成新的base_rows和增量矩阵，基础矩阵保持内存映射，不会被复制到堆上。
+    支持按行下标、切片和布尔数组取行，与向量做矩阵乘法，以及np.asarray转换为普通矩阵。
+    """
+    
+    def __init__(self, base, base_rows, overlay):
+        """初始化矩阵
+        
+        Args:
+            base (numpy.ndarray): 基础矩阵
+            base_rows (numpy.ndarray): 基础矩阵中有效的行号，按逻辑顺序排列
+            overlay (numpy.ndarray): 增量矩阵，排在有效的基础行之后
+        """
+        self.base = base
+        self.base_rows = base_rows
+        self.overlay = overlay
+    
+    @classmethod
+    def compose(cls, matrix, rows, extra=None):
+        """选取已有矩阵中的若干行并追加新行，生成新的矩阵
+        
+        Args:
+            matrix: 已有矩阵，numpy数组或SegmentedMatrix
+            rows (numpy.ndarray): 保留的行号，按逻辑顺序排列
+            extra (numpy.ndarray, optional): 追加在末尾的新行
+            
+        Returns:
+            SegmentedMatrix: 新矩阵，基础矩阵与已有矩阵共享
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if extra is None:
+            extra = np.empty((0, matrix.shape[1]), dtype=np.float32)
+        
+        if not isinstance(matrix, cls):
+            return cls(matrix, rows, np.asarray(extra, dtype=np.float32))
+        
+        base_count = len(matrix.base_rows)
+        in_base = rows < base_count
+        if np.any(in_base[1:] > in_base[:-1]):
+            # 增量行排在了基础行之前，只有乱序选取时才会出现，合并为普通矩阵
+            merged = np.concatenate([matrix[rows], extra]).astype(np.float32, copy=False)
+            return cls(merged, np.arange(len(merged)), np.empty((0, matrix.shape[1]), dtype=np.float32))
+        
+        # 保留的基础行映射回基础矩阵，保留的增量行从增量矩阵中复制
+        overlay = np.concatenate([matrix.overlay[rows[~in_base] - base_count], extra]).astype(np.float32, copy=False)
+        return cls(matrix.base, matrix.base_rows[rows[in_base]], overlay)
+    
+    @property
+    def shape(self):
+        return (len(self.base_rows) + len(self.overlay), self.base.shape[1])
+    
+    @property
+    def ndim(self):
+        return 2
+    
+    @property
+    def dtype(self):
+        return np.dtype(np.float32)
+    
+    def __len__(self):
+        return len(self.base_rows) + len(self.overlay)
+    
+    def __getitem__(self, key):
+        """按行取值
+        
+        Args:
+            key: 行号、切片、行号数组或布尔数组
+            
+        Returns:
+            numpy.ndarray: 单行向量或行矩阵
+        """
+        base_count = len(self.base_rows)
+        if isinstance(key, (int, np.integer)):
+            row = int(key) + len(self) if key < 0 else int(key)
+            if row < base_count:
+                return np.asarray(self.base[self.base_rows[row]], dtype=np.float32)
+            return self.overlay[row - base_count]
+        
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            # 连续的基础行直接切片，不经过花式索引复制
+            if step == 1 and stop <= base_count and start < stop:
+                first, last = self.base_rows[start], self.base_rows[stop - 1]
+                if last - first == stop - start - 1:
+                    return self.base[first:last + 1]
+            rows = np.arange(start, stop, step)
+        else:
+            rows = np.asarray(key)
+            if rows.dtype == bool:
+                rows = np.flatnonzero(rows)
+        
+        rows = rows.astype(np.int64, copy=False)
+        in_base = rows < base_count
+        result = np.empty((len(rows), self.base.shape[1]), dtype=np.float32)
+        result[in_base] = self.base[self.base_rows[rows[in_base]]]
+        result[~in_base] = self.overlay[rows[~in_base] - base_count]
+        return result
+    
+    def __matmul__(self, other):
+        """与向量或矩阵相乘
+        
+        基础矩阵整体参与计算（含已失效的行），再按base_rows取出有效行的结果，
+        顺序扫描内存映射文件，比先取出有效行再计算更快。
+        """
+        base_scores = (self.base @ other)[self.base_rows]
+        if not len(self.overlay):
+            return base_scores
+        return np.concatenate([base_scores, self.overlay @ other])
+    
+    def __array__(self, dtype=None, copy=None):
+        """转换为普通矩阵，会复制全部有效行"""
+        result = np.concatenate([np.asarray(self.base[self.base_rows], dtype=np.float32), self.overlay])
+        return result if dtype is None else result.astype(dtype, copy=False)
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+自媒体博主自动化辅助平台 - 向量集合更新日志模块
+"""
+
+import os
+import json
+import zlib
+import struct
+import numpy as np
+
+# 文件头: 魔数、格式版本、日志代数
+HEADER = struct.Struct("<4sIQ")
+MAGIC = b"VLOG"
+VERSION = 1
+
+# 记录头: 负载长度、负载的CRC32校验和
+RECORD_HEADER = struct.Struct("<II")
+
+# 负载中JSON部分的长度前缀
+JSON_LENGTH = struct.Struct("<I")
+
+class UpdateLog:
+    """只追加的向量集合更新日志类
+    
+    每次增量更新只在日志末尾追加记录，不重写整个集合。
+    每条记录带有长度和CRC32校验和，启动重放时遇到不完整或校验失败的记录
+    （如写入中途断电）即停止，并把日志截断到最后一条完整记录。
+    
+    日志带有代数(generation)，与基础快照中记录的代数一致时才会被重放；
+    压缩时先写入新代数的基础快照，再原子替换为新代数的空日志，
+    因此两步之间崩溃也不会把旧日志重放到新快照上。
+    """
+    
+    def __init__(self, path):
+        """初始化日志
+        
+        Args:
+            path (str): 日志文件路径
+        """
+        self.path = path
+    
+    @property
+    def size(self):
+        """日志文件字节数"""
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+    
+    def _read_generation(self, f):
+        """读取并校验文件头
+        
+        Returns:
+            int: 日志代数，文件头无效时返回None
+        """
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return None
+        magic, version, generation = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            return None
+        return generation
+    
+    def append(self, generation, records):
+        """追加记录并同步到磁盘
+        
+        Args:
+            generation (int): 当前基础快照的代数
+            records (list): 记录列表，每条为 (操作字典, 向量矩阵或None)
+        """
+        if not records:
+            return
+        
+        if self.size < HEADER.size:
+            self.reset(generation)
+        
+        with open(self.path, 'ab') as f:
+            for entry, vectors in records:
+                payload = self._encode(entry, vectors)
+                f.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)))
+                f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def replay(self, generation):
+        """读取与基础快照代数一致的全部完整记录
+        
+        Args:
+            generation (int): 基础快照的代数
+            
+        Returns:
+            list: 记录列表，每条为 (操作字典, 向量矩阵或None)
+        """
+        if not os.path.exists(self.path):
+            return []
+        
+        records = []
+        with open(self.path, 'rb') as f:
+            if self._read_generation(f) != generation:
+                # 旧代数的日志内容已包含在基础快照中
+                return []
+            
+            valid_end = f.tell()
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if not header:
+                    break
+                if len(header) < RECORD_HEADER.size:
+                    print(f"更新日志{self.path}末尾的记录不完整，已忽略")
+                    break
+                
+                length, checksum = RECORD_HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    print(f"更新日志{self.path}中的记录校验失败，已忽略之后的内容")
+                    break
+                
+                try:
+                    records.append(self._decode(payload))
+                except Exception as e:
+                    print(f"解析更新日志记录时出错: {str(e)}")
+                    break
+                valid_end = f.tell()
+        
+        # 截掉损坏的尾部，之后追加的记录才能被正常读到
+        if valid_end < self.size:
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_end)
+                f.flush()
+                os.fsync(f.fileno())
+        
+        return records
+    
+    def reset(self, generation):
+        """用指定代数的空日志原子替换当前日志
+        
+        Args:
+            generation (int): 新的日志代数
+        """
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, generation))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+    
+    @staticmethod
+    def _encode(entry, vectors):
+        """把一条记录编码为 JSON长度 + JSON + float32向量字节"""
+        header = json.dumps(entry, ensure_ascii=False).encode('utf-8')
+        body = b"" if vectors is None else np.ascontiguousarray(vectors, dtype=np.float32).tobytes()
+        return JSON_LENGTH.pack(len(header)) + header + body
+    
+    @staticmethod
+    def _decode(payload):
+        """解码一条记录"""
+        (header_length,) = JSON_LENGTH.unpack_from(payload)
+        start = JSON_LENGTH.size
+        entry = json.loads(payload[start:start + header_length].decode('utf-8'))
+        
+        vectors = None
+        body = payload[start + header_length:]
+        if body:
+            vectors = np.frombuffer(body, dtype=np.float32).reshape(len(entry["ids"]), -1)
+        return entry, vectors
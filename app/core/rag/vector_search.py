@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+自媒体博主自动化辅助平台 - 向量检索模块
+"""
+
+import numpy as np
+
+def normalize_rows(matrix):
+    """按行归一化向量矩阵，使内积等于余弦相似度
+    
+    Args:
+        matrix (numpy.ndarray): 形状为(n, d)的向量矩阵
+        
+    Returns:
+        numpy.ndarray: 归一化后的float32矩阵
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.size == 0:
+        return matrix
+    
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def normalize_vector(vector):
+    """归一化单个向量
+    
+    Args:
+        vector (numpy.ndarray): 向量
+        
+    Returns:
+        numpy.ndarray: 归一化后的float32向量
+    """
+    vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+def top_k_indices(scores, k):
+    """部分排序选出得分最高的k个位置
+    
+    使用argpartition在O(n)内选出候选，只对这k个结果排序。
+    
+    Args:
+        scores (numpy.ndarray): 一维得分数组
+        k (int): 返回数量
+        
+    Returns:
+        numpy.ndarray: 按得分降序排列的下标数组
+    """
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(n)
+    
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+def mmr_select(relevance, vectors, k, lambda_mult=0.7):
+    """最大边际相关性(MMR)选择，在相关性与多样性之间折中
+    
+    每一步选择 lambda_mult * 相关性 - (1 - lambda_mult) * 与已选结果的最大相似度
+    最大的候选。每选出一个结果只需一次矩阵-向量乘法更新各候选的最大相似度，
+    不需要构造完整的两两相似度矩阵。
+    
+    Args:
+        relevance (numpy.ndarray): 候选的相关性得分
+        vectors (numpy.ndarray): 候选的归一化向量矩阵，与relevance一一对应
+        k (int): 返回数量
+        lambda_mult (float, optional): 相关性权重，为1时等价于按相关性排序，越小结果越多样
+        
+    Returns:
+        numpy.ndarray: 按选择顺序排列的下标数组
+    """
+    relevance = np.asarray(relevance, dtype=np.float32)
+    k = min(k, len(relevance))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    
+    vectors = np.asarray(vectors, dtype=np.float32)
+    selected = np.empty(k, dtype=np.int64)
+    selected[0] = np.argmax(relevance)
+    max_similarity = vectors @ vectors[selected[0]]
+    
+    for step in range(1, k):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[selected[:step]] = -np.inf
+        selected[step] = np.argmax(scores)
+        np.maximum(max_similarity, vectors @ vectors[selected[step]], out=max_similarity)
+    
+    return selected
@@ -0,0 +1,885 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+自媒体博主自动化辅助平台 - 向量存储模块
+"""
+
+import os
+import re
+import copy
+import json
+import numpy as np
+from app.core.rag.vector_search import normalize_rows, normalize_vector, top_k_indices
+from app.core.rag.ann_index import IVFIndex
+from app.core.rag.quantization import make_quantizer
+from app.core.rag.metadata_filter import MetadataColumn, build_mask
+from app.core.rag.update_log import UpdateLog
+from app.core.rag.segmented_matrix import SegmentedMatrix
+
+# 批量检索时每次与查询矩阵相乘的行数，限制得分矩阵占用的内存
+BATCH_SCAN_ROWS = 16384
+
+# 过滤后保留的行占比超过该值时，对整个矩阵打分再屏蔽被过滤的行，
+# 比把保留的行复制成新矩阵更快
+DENSE_MASK_RATIO = 0.25
+
+class VectorCollection:
+    """向量集合类
+    
+    每个集合的基础快照在磁盘上由以下文件组成，文件名带有快照代数<g>：
+    - <name>.g<g>.vectors.npy: float32连续矩阵，以内存映射方式只读加载
+    - <name>.g<g>.ids.npy: 与矩阵行一一对应的int64 ID数组
+    - <name>.manifest.json: 快照清单，记录代数、数据文件名和按列存储的元数据（如标题、内容类型）
+    
+    写入新快照时先写完全部数据文件，最后原子替换清单，清单就是快照的提交点：
+    中途崩溃时清单仍指向上一代完整的文件。加载时校验ID、向量和各元数据列的行数一致，
+    不一致时退回上一代快照（<name>.manifest.prev.json）。
+    
+    之后的增量更新（upsert/remove）在save时只追加到
+    只读追加的更新日志 <name>.log，加载时在基础快照上重放；日志超过阈值后
+    才压缩为新的基础快照，单条更新的写入量与集合规模无关。
+    重放和增量更新都不复制基础矩阵：被删除或更新的行只从有效行号中去掉，
+    新写入的行放在堆上的增量矩阵中（见SegmentedMatrix），基础矩阵始终保持内存映射。
+    
+    向量在写入时按行归一化，检索时一次矩阵-向量乘法即可得到全部余弦相似度。
+    元数据在首次被过滤时转换为列数组并缓存，过滤条件直接得到布尔掩码，
+    检索只对通过过滤的行打分。
+    
+    storage为"float16"或"int8"时，另外在内存中常驻一份压缩向量
+    (<name>.g<g>.<storage>.npz)，检索先扫描压缩向量选出候选，再用磁盘上
+    内存映射的float32向量对候选精确重新打分，float32矩阵只有被访问的行会被读入。
+    
+    修改集合的方法都通过给属性赋新数组实现，不在原地修改数组。并发检索时，
+    写入方在copy()得到的副本上修改，完成后把副本整体替换为当前版本，
+    检索方持有的旧版本始终保持不变，因此检索无需加锁。
+    """
+    
+    def __init__(self, directory, name, storage="float32", rescore_factor=4,
+                 compact_ratio=0.25, compact_min_bytes=4 * 1024 * 1024):
+        """初始化向量集合
+        
+        Args:
+            directory (str): 存储目录
+            name (str): 集合名称，如"papers"
+            storage (str, optional): 常驻内存的向量精度，"float32"、"float16"或"int8"
+            rescore_factor (int, optional): 压缩检索时候选数量为top_k的倍数
+            compact_ratio (float, optional): 更新日志超过基础快照大小的该比例时压缩
+            compact_min_bytes (int, optional): 更新日志小于该字节数时不压缩
+        """
+        self.directory = directory
+        self.name = name
+        self.storage = storage
+        self.rescore_factor = rescore_factor
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+        
+        self.manifest_path = os.path.join(directory, f"{name}.manifest.json")
+        self.previous_manifest_path = os.path.join(directory, f"{name}.manifest.prev.json")
+        self.ann_path = os.path.join(directory, f"{name}.ivf.npz")
+        self.log = UpdateLog(os.path.join(directory, f"{name}.log"))
+        
+        # 早期版本不带代数的快照文件，只在迁移时读取
+        self.legacy_paths = {
+            "vectors": os.path.join(directory, f"{name}.vectors.npy"),
+            "ids": os.path.join(directory, f"{name}.ids.npy"),
+            "meta": os.path.join(directory, f"{name}.meta.json"),
+            "codes": os.path.join(directory, f"{name}.{storage}.npz")
+        }
+        
+        # 当前基础快照的数据文件路径，没有可用快照时为空
+        self._snapshot_files = {}
+        
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, 0), dtype=np.float32)
+        self.metadata = {}
+        self.info = {}
+        self._positions = {}
+        self._sorted_ids = None
+        self._column_cache = {}
+        
+        # 尚未写入日志的增量操作，以及是否需要整体重写基础快照
+        self._pending_ops = []
+        self._needs_compaction = False
+        self._saved_info = {}
+        self._replaying = False
+        self._replayed_ids = np.empty(0, dtype=np.int64)
+        
+        # 压缩向量及其量化器，float32模式下不使用
+        self.quantizer = make_quantizer(storage)
+        self.codes = None
+        
+        # 近似最近邻索引，调用enable_ann后启用
+        self.ann = None
+        self.ann_min_size = 0
+        
+        self.load()
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def copy(self):
+        """创建可以独立修改的副本
+        
+        向量矩阵、ID数组等只读数组与原集合共享，只复制会被原地修改的容器，
+        因此开销与集合规模无关。
+        
+        Returns:
+            VectorCollection: 集合副本
+        """
+        clone = copy.copy(self)
+        clone.info = dict(self.info)
+        clone.metadata = dict(self.metadata)
+        clone._column_cache = dict(self._column_cache)
+        clone._pending_ops = list(self._pending_ops)
+        clone.quantizer = copy.copy(self.quantizer)
+        clone.ann = copy.copy(self.ann)
+        return clone
+    
+    def __contains__(self, item_id):
+        return int(item_id) in self._positions
+    
+    @property
+    def dim(self):
+        """向量维度"""
+        return self.vectors.shape[1] if self.vectors.ndim == 2 else 0
+    
+    def load(self):
+        """从磁盘加载集合，向量矩阵使用内存映射，不复制到堆上
+        
+        依次尝试当前快照、上一代快照和早期版本的快照文件，使用第一个完整一致的快照；
+        都不可用时集合为空，由下一次全量更新重建。
+        """
+        snapshot = self._read_snapshot(self.manifest_path)
+        fallback = snapshot is None and os.path.exists(self.manifest_path)
+        if snapshot is None:
+            snapshot = self._read_snapshot(self.previous_manifest_path)
+        if snapshot is None and not os.path.exists(self.manifest_path):
+            snapshot = self._read_legacy_snapshot()
+        
+        if snapshot is None:
+            self.ids = np.empty(0, dtype=np.int64)
+            self.vectors = np.empty((0, 0), dtype=np.float32)
+            self.metadata = {}
+            self.info = {}
+            self._snapshot_files = {}
+        else:
+            self.ids = snapshot["ids"]
+            self.vectors = snapshot["vectors"]
+            self.metadata = snapshot["fields"]
+            self.info = snapshot["info"]
+            self._snapshot_files = snapshot["files"]
+        
+        self._saved_info = dict(self.info)
+        self._pending_ops = []
+        # 退回上一代快照后，当前日志属于更新的代数，下次保存时必须写出新快照
+        self._needs_compaction = fallback
+        self._rebuild_positions()
+        
+        # 早期版本保存的向量未归一化，加载时一次性转换
+        if len(self.ids) and not self.info.get("normalized"):
+            self.vectors = normalize_rows(self.vectors)
+            self.info["normalized"] = True
+            self._load_codes()
+            self.save()
+            return
+        
+        self._load_codes()
+        if not fallback:
+            self._replay_log()
+    
+    def _read_snapshot(self, manifest_path):
+        """读取清单指向的基础快照
+        
+        Args:
+            manifest_path (str): 清单文件路径
+            
+        Returns:
+            dict: 包含ids、vectors、fields、info、files，清单缺失、文件损坏或行数不一致时返回None
+        """
+        if not os.path.exists(manifest_path):
+            return None
+        
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            files = {
+                kind: os.path.join(self.directory, filename)
+                for kind, filename in manifest["files"].items()
+            }
+            # 压缩格式改变后旧的压缩向量不再可用，按新格式重新量化
+            if manifest.get("storage") != self.storage:
+                files.pop("codes", None)
+            snapshot = {
+                "ids": np.load(files["ids"]),
+                "vectors": np.load(files["vectors"], mmap_mode='r'),
+                "fields": manifest.get("fields", {}),
+                "info": manifest.get("info", {}),
+                "files": files
+            }
+        except Exception as e:
+            print(f"加载向量集合{self.name}的快照{os.path.basename(manifest_path)}时出错: {str(e)}")
+            return None
+        
+        if not self._consistent(snapshot):
+            print(f"向量集合{self.name}的快照{os.path.basename(manifest_path)}中各文件的行数不一致，已忽略")
+            return None
+        return snapshot
+    
+    def _read_legacy_snapshot(self):
+        """读取早期版本不带代数的快照文件
+        
+        Returns:
+            dict: 格式同_read_snapshot，文件缺失或不一致时返回None
+        """
+        paths = self.legacy_paths
+        if not (os.path.exists(paths["vectors"]) and os.path.exists(paths["ids"])):
+            return None
+        
+        try:
+            snapshot = {
+                "ids": np.load(paths["ids"]),
+                "vectors": np.load(paths["vectors"], mmap_mode='r'),
+                "fields": {},
+                "info": {},
+                "files": {"vectors": paths["vectors"], "ids": paths["ids"], "codes": paths["codes"]}
+            }
+            if os.path.exists(paths["meta"]):
+                with open(paths["meta"], 'r', encoding='utf-8') as f:
+                    sidecar = json.load(f)
+                snapshot["fields"] = sidecar.get("fields", {})
+                snapshot["info"] = sidecar.get("info", {})
+        except Exception as e:
+            print(f"加载向量集合{self.name}时出错: {str(e)}")
+            return None
+        
+        if not self._consistent(snapshot):
+            print(f"向量集合{self.name}的快照文件行数不一致，已忽略")
+            return None
+        return snapshot
+    
+    @staticmethod
+    def _consistent(snapshot):
+        """检查快照中ID、向量和各元数据列的行数是否一致"""
+        count = len(snapshot["ids"])
+        vectors = snapshot["vectors"]
+        if vectors.ndim != 2 or len(vectors) != count:
+            return False
+        return all(len(values) == count for values in snapshot["fields"].values())
+    
+    def _replay_log(self):
+        """在基础快照上重放更新日志中的增量操作"""
+        records = self.log.replay(self.info.get("log_generation", 0))
+        if not records:
+            return
+        
+        replayed_ids = []
+        self._replaying = True
+        try:
+            for entry, vectors in records:
+                if entry["op"] == "upsert":
+                    columns = entry["metadata"]
+                    metadata = [
+                        {field: values[row] for field, values in columns.items()}
+                        for row in range(len(entry["ids"]))
+                    ]
+                    self.upsert(entry["ids"], vectors, metadata)
+                    replayed_ids.extend(entry["ids"])
+                elif entry["op"] == "remove":
+                    self.remove(entry["ids"])
+        finally:
+            self._replaying = False
+        
+        self._replayed_ids = np.asarray(replayed_ids, dtype=np.int64)
+    
+    def _load_codes(self):
+        """加载压缩向量，文件缺失或与集合不一致时重新量化"""
+        if self.quantizer is None or len(self.ids) == 0:
+            return
+        
+        codes_path = self._snapshot_files.get("codes")
+        if codes_path and os.path.exists(codes_path):
+            try:
+                with np.load(codes_path) as data:
+                    codes = data["codes"]
+                    self.quantizer.set_state({key: data[key] for key in data.files if key != "codes"})
+                if len(codes) == len(self.ids):
+                    self.codes = codes
+                    return
+            except Exception as e:
+                print(f"加载压缩向量{self.name}时出错: {str(e)}")
+        
+        self.quantizer.fit(self.vectors)
+        self.codes = self.quantizer.encode(self.vectors)
+    
+    def save(self):
+        """保存集合到磁盘
+        
+        只有增量操作时把操作追加到更新日志；集合被整体替换、集合信息变化
+        或日志超过阈值时压缩为新的基础快照。
+        """
+        if self._needs_compaction or self.info != self._saved_info or not self._snapshot_files:
+            self.compact()
+            return
+        
+        if not self._pending_ops:
+            return
+        
+        pending = self._pending_ops
+        self._pending_ops = []
+        try:
+            self.log.append(self.info.get("log_generation", 0), pending)
+        except Exception as e:
+            print(f"写入向量集合{self.name}的更新日志时出错: {str(e)}")
+            self._pending_ops = pending + self._pending_ops
+            return
+        
+        base_bytes = os.path.getsize(self._snapshot_files["vectors"])
+        if self.log.size > max(self.compact_min_bytes, base_bytes * self.compact_ratio):
+            self.compact()
+    
+    def compact(self):
+        """把当前内容写为新的基础快照并清空更新日志
+        
+        数据文件按新代数命名，全部写完后才原子替换清单，清单替换前的任何时刻崩溃，
+        加载时都仍使用上一代完整的快照。新快照的日志代数加一，
+        旧日志即使未能及时清空也不会再被重放。
+        """
+        vectors = np.array(self.vectors, dtype=np.float32, copy=True)
+        ids = np.array(self.ids, dtype=np.int64, copy=True)
+        self.vectors = vectors
+        
+        generation = self.info.get("log_generation", 0) + 1
+        info = dict(self.info, log_generation=generation)
+        files = {
+            "vectors": self._generation_file(generation, "vectors.npy"),
+            "ids": self._generation_file(generation, "ids.npy")
+        }
+        
+        try:
+            self._atomic_write(files["vectors"], lambda f: np.save(f, vectors))
+            self._atomic_write(files["ids"], lambda f: np.save(f, ids))
+            
+            if self.quantizer is not None and len(ids):
+                # 保存时按全部数据重新训练量化参数
+                self.quantizer.fit(vectors)
+                self.codes = self.quantizer.encode(vectors)
+                arrays = dict(self.quantizer.state(), codes=self.codes)
+                files["codes"] = self._generation_file(generation, f"{self.storage}.npz")
+                self._atomic_write(files["codes"], lambda f: np.savez(f, **arrays))
+            
+            if self.ann is not None:
+                self.build_ann()
+                self.ann.save(self.ann_path)
+            
+            manifest = {
+                "info": info,
+                "fields": self.metadata,
+                "files": {kind: os.path.basename(path) for kind, path in files.items()},
+                "storage": self.storage
+            }
+            
+            # 保留上一代清单，当前清单损坏时退回
+            if os.path.exists(self.manifest_path):
+                os.replace(self.manifest_path, self.previous_manifest_path)
+            self._atomic_write(
+                self.manifest_path,
+                lambda f: f.write(json.dumps(manifest, ensure_ascii=False).encode('utf-8'))
+            )
+            
+            self.log.reset(generation)
+        except Exception as e:
+            print(f"保存向量集合{self.name}时出错: {str(e)}")
+            return
+        
+        self._remove_stale_files()
+        self.load()
+    
+    def _generation_file(self, generation, suffix):
+        """某一代快照数据文件的路径"""
+        return os.path.join(self.directory, f"{self.name}.g{generation}.{suffix}")
+    
+    def _remove_stale_files(self):
+        """删除当前和上一代快照都不再引用的数据文件，以及早期版本的快照文件"""
+        referenced = set()
+        for manifest_path in (self.manifest_path, self.previous_manifest_path):
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    referenced.update(json.load(f)["files"].values())
+            except Exception:
+                continue
+        
+        pattern = re.compile(rf"^{re.escape(self.name)}\.g\d+\.")
+        stale = [
+            os.path.join(self.directory, filename)
+            for filename in os.listdir(self.directory)
+            if pattern.match(filename) and filename not in referenced
+        ]
+        stale += [path for path in self.legacy_paths.values() if os.path.exists(path)]
+        
+        for path in stale:
+            try:
+                os.remove(path)
+            except OSError:
+                # 仍被内存映射的文件（如Windows下旧版本正在检索）留到下次清理
+                pass
+    
+    def _atomic_write(self, path, writer):
+        """写入临时文件后重命名为目标文件
+        
+        Args:
+            path (str): 目标文件路径
+            writer (function): 接收文件对象的写入函数
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            writer(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    
+    def _rebuild_positions(self):
+        """重建ID到行号的映射"""
+        self._positions = {int(item_id): row for row, item_id in enumerate(self.ids.tolist())}
+        self._sorted_ids = None
+        self._column_cache = {}
+    
+    def rows_for(self, ids):
+        """批量把记录ID转换为行号
+        
+        Args:
+            ids (numpy.ndarray): 记录ID数组，必须都存在于集合中
+            
+        Returns:
+            numpy.ndarray: 行号数组
+        """
+        if self._sorted_ids is None:
+            order = np.argsort(self.ids, kind='stable')
+            self._sorted_ids = (self.ids[order], order)
+        
+        sorted_ids, order = self._sorted_ids
+        return order[np.searchsorted(sorted_ids, np.asarray(ids, dtype=np.int64))]
+    
+    def get(self, item_id):
+        """根据ID获取向量和元数据
+        
+        Args:
+            item_id (int): 记录ID
+            
+        Returns:
+            dict: 包含embedding和各元数据字段的字典，不存在时返回None
+        """
+        row = self._positions.get(int(item_id))
+        if row is None:
+            return None
+        
+        item = self.row_metadata(row)
+        item["embedding"] = self.vectors[row]
+        return item
+    
+    def row_metadata(self, row):
+        """获取某一行的元数据
+        
+        Args:
+            row (int): 行号
+            
+        Returns:
+            dict: 元数据字典
+        """
+        return {field: values[row] for field, values in self.metadata.items()}
+    
+    def replace_all(self, ids, vectors, metadata):
+        """用新数据整体替换集合内容
+        
+        Args:
+            ids (list): 记录ID列表
+            vectors (list): 向量列表，与ids一一对应
+            metadata (list): 元数据字典列表，与ids一一对应
+        """
+        self.ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        self.vectors = normalize_rows(self._as_matrix(vectors, len(self.ids)))
+        self.info["normalized"] = True
+        self.metadata = self._columns(metadata)
+        self._rebuild_positions()
+        self._pending_ops = []
+        self._needs_compaction = True
+        
+        if self.quantizer is not None:
+            self.quantizer.fit(self.vectors)
+            self.codes = self.quantizer.encode(self.vectors)
+        
+        if self.ann is not None:
+            self.ann = IVFIndex(n_lists=self.ann.n_lists, n_probe=self.ann.n_probe)
+    
+    def upsert(self, ids, vectors, metadata):
+        """插入或更新记录
+        
+        Args:
+            ids (list): 记录ID列表
+            vectors (list): 向量列表
+            metadata (list): 元数据字典列表
+        """
+        new_ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        if len(new_ids) == 0:
+            return
+        
+        new_vectors = normalize_rows(self._as_matrix(vectors, len(new_ids)))
+        new_columns = self._columns(metadata)
+        # 加载时已归一化全部已有向量，新向量也已归一化
+        self.info["normalized"] = True
+        
+        keep = ~np.isin(self.ids, new_ids)
+        keep_rows = np.flatnonzero(keep)
+        
+        fields = list(self.metadata) + [field for field in new_columns if field not in self.metadata]
+        columns = {}
+        for field in fields:
+            old_values = self.metadata.get(field, [None] * len(self.ids))
+            columns[field] = [old_values[row] for row in keep_rows] + \
+                new_columns.get(field, [None] * len(new_ids))
+        
+        if self.quantizer is not None:
+            new_codes = self.quantizer.encode(new_vectors)
+            self.codes = np.concatenate([self.codes[keep], new_codes]) if self.codes is not None else new_codes
+        
+        if len(self.ids) and self.dim:
+            # 基础矩阵保持内存映射，新向量放在增量部分
+            self.vectors = SegmentedMatrix.compose(self.vectors, keep_rows, new_vectors)
+        else:
+            self.vectors = new_vectors
+        self.ids = np.concatenate([self.ids[keep], new_ids])
+        self.metadata = columns
+        self._rebuild_positions()
+        
+        if not self._replaying:
+            entry = {"op": "upsert", "ids": new_ids.tolist(), "metadata": new_columns}
+            self._pending_ops.append((entry, new_vectors))
+        
+        if self.ann is not None:
+            self.ann.add(new_ids, new_vectors)
+    
+    def remove(self, ids):
+        """删除记录
+        
+        Args:
+            ids (list): 要删除的记录ID列表
+            
+        Returns:
+            int: 实际删除的记录数
+        """
+        ids = np.asarray(list(ids), dtype=np.int64)
+        keep = ~np.isin(self.ids, ids)
+        removed = int(len(self.ids) - keep.sum())
+        if removed == 0:
+            return 0
+        
+        keep_rows = np.flatnonzero(keep)
+        self.metadata = {
+            field: [values[row] for row in keep_rows]
+            for field, values in self.metadata.items()
+        }
+        self.vectors = SegmentedMatrix.compose(self.vectors, keep_rows)
+        if self.codes is not None:
+            self.codes = self.codes[keep]
+        self.ids = self.ids[keep]
+        self._rebuild_positions()
+        
+        if not self._replaying:
+            self._pending_ops.append(({"op": "remove", "ids": ids.tolist()}, None))
+        
+        if self.ann is not None:
+            self.ann.remove(ids)
+        return removed
+    
+    def enable_ann(self, min_size=20000, n_lists=None, n_probe=8):
+        """为集合启用IVF近似最近邻索引
+        
+        集合规模达到min_size后，无过滤条件的检索改用近似索引，
+        规模较小时仍使用精确检索。索引缺失或过期时在这里立即构建，
+        之后由写入方在发布新版本前调用build_ann维护。
+        
+        Args:
+            min_size (int, optional): 启用近似检索的最小记录数
+            n_lists (int, optional): 簇的数量，默认取sqrt(记录数)
+            n_probe (int, optional): 查询时扫描的簇数量
+        """
+        self.ann_min_size = min_size
+        self.ann = IVFIndex(n_lists=n_lists, n_probe=n_probe)
+        self.ann.n_probe = n_probe
+        if self.ann.load(self.ann_path):
+            # 索引文件对应基础快照，补上更新日志中重放的增量操作
+            self.ann.remove(self.ann.ids[~np.isin(self.ann.ids, self.ids)])
+            stale = np.union1d(self.ids[~np.isin(self.ids, self.ann.ids)], self._replayed_ids)
+            stale = stale[np.isin(stale, self.ids)]
+            if len(stale):
+                self.ann.add(stale, self.vectors[self.rows_for(stale)])
+        
+        if self.build_ann():
+            self.ann.save(self.ann_path)
+    
+    def build_ann(self):
+        """在集合足够大且索引缺失、过期或与集合不一致时重新构建索引
+        
+        训练k-means耗时较长，只应由写入方在发布新版本前调用；
+        检索时索引不可用则退回精确检索，不会在检索线程中训练或修改索引。
+        
+        Returns:
+            bool: 是否重新构建了索引
+        """
+        ann = self.ann
+        if ann is None or len(self.ids) < self.ann_min_size or self._ann_ready():
+            return False
+        
+        rebuilt = IVFIndex(n_lists=ann.n_lists, n_probe=ann.n_probe, n_iter=ann.n_iter, seed=ann.seed)
+        rebuilt.build(self.ids, self.vectors)
+        self.ann = rebuilt
+        return True
+    
+    def _ann_ready(self):
+        """近似索引是否已训练且与当前集合一致，可以直接用于检索"""
+        ann = self.ann
+        return (
+            ann is not None
+            and not ann.needs_rebuild(len(self.ids))
+            and len(ann) == len(self.ids)
+        )
+    
+    def search(self, query_vector, top_k=3, mask=None, exact=False):
+        """检索与查询向量最相似的记录
+        
+        Args:
+            query_vector (numpy.ndarray): 查询向量
+            top_k (int, optional): 返回结果数量
+            mask (numpy.ndarray, optional): 布尔数组，只在为True的行中检索
+            exact (bool, optional): 是否强制使用精确检索
+            
+        Returns:
+            tuple: (ID数组, 相似度数组)，按相似度降序排列
+        """
+        if len(self.ids) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        
+        query = normalize_vector(query_vector)
+        
+        rows = None
+        if not exact and len(self.ids) >= self.ann_min_size and self._ann_ready():
+            candidates = np.sort(self.rows_for(self.ann.candidates(query)))
+            if mask is None:
+                rows = candidates
+            elif np.count_nonzero(mask) > len(candidates):
+                # 过滤条件较宽时，在近似索引的候选中过滤比扫描全部通过过滤的行更快
+                filtered = candidates[mask[candidates]]
+                if len(filtered) >= top_k:
+                    rows = filtered
+        
+        if rows is None and mask is not None:
+            if np.count_nonzero(mask) < len(mask) * DENSE_MASK_RATIO:
+                rows = np.flatnonzero(mask)
+                mask = None
+        else:
+            mask = None
+        
+        if rows is not None and len(rows) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        
+        selected, scores = self._score(query, rows, top_k, mask)
+        return self.ids[selected], scores
+    
+    def search_many(self, query_vectors, top_k=3, mask=None):
+        """批量精确检索多个查询
+        
+        向量矩阵按行分块，每块与整个查询矩阵做一次矩阵乘法，
+        再用argpartition沿行合并出每个查询当前的top_k，
+        全部查询只需扫描一遍向量矩阵。
+        
+        Args:
+            query_vectors (numpy.ndarray): 形状为(q, dim)的查询矩阵
+            top_k (int, optional): 每个查询返回的结果数量
+            mask (numpy.ndarray, optional): 布尔数组，只在为True的行中检索
+            
+        Returns:
+            tuple: (ID矩阵, 相似度矩阵)，形状均为(q, k)，每行按相似度降序排列，
+                k为top_k与可检索行数中的较小值
+        """
+        queries = normalize_rows(np.asarray(query_vectors, dtype=np.float32).reshape(len(query_vectors), -1))
+        rows = None
+        if mask is not None and np.count_nonzero(mask) < len(mask) * DENSE_MASK_RATIO:
+            rows = np.flatnonzero(mask)
+            mask = None
+        n = len(self.ids) if rows is None else len(rows)
+        k = min(top_k, n if mask is None else np.count_nonzero(mask))
+        
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        if k <= 0 or len(queries) == 0:
+            return best_rows, best_scores
+        
+        for start in range(0, n, BATCH_SCAN_ROWS):
+            if rows is None:
+                block_rows = np.arange(start, min(start + BATCH_SCAN_ROWS, n))
+                block = self.vectors[start:start + BATCH_SCAN_ROWS]
+            else:
+                block_rows = rows[start:start + BATCH_SCAN_ROWS]
+                block = self.vectors[block_rows]
+            
+            block_scores = queries @ np.asarray(block, dtype=np.float32).T
+            if mask is not None:
+                block_scores[:, ~mask[start:start + BATCH_SCAN_ROWS]] = -np.inf
+            
+            scores = np.concatenate([best_scores, block_scores], axis=1)
+            candidates = np.concatenate(
+                [best_rows, np.broadcast_to(block_rows, (len(queries), len(block_rows)))], axis=1
+            )
+            if scores.shape[1] > k:
+                keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                candidates = np.take_along_axis(candidates, keep, axis=1)
+            best_rows, best_scores = candidates, scores
+        
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        return self.ids[best_rows], np.take_along_axis(best_scores, order, axis=1)
+    
+    def _score(self, query, rows, top_k, mask=None):
+        """对候选行打分并选出得分最高的top_k行
+        
+        Args:
+            query (numpy.ndarray): 归一化后的查询向量
+            rows (numpy.ndarray): 候选行号，为None时表示全部行
+            top_k (int): 返回结果数量
+            mask (numpy.ndarray, optional): rows为None时使用的布尔掩码，
+                对全部行打分后把为False的行的得分置为-inf
+                
+        Returns:
+            tuple: (行号数组, 相似度数组)，按相似度降序排列
+        """
+        if mask is not None:
+            top_k = min(top_k, np.count_nonzero(mask))
+        
+        if self.codes is None:
+            scores = self.vectors @ query if rows is None else self.vectors[rows] @ query
+            if mask is not None:
+                scores[~mask] = -np.inf
+            best = top_k_indices(scores, top_k)
+            return (best if rows is None else rows[best]), scores[best]
+        
+        # 先在压缩向量上选出候选，再用float32向量精确重新打分
+        codes = self.codes if rows is None else self.codes[rows]
+        approximate = self.quantizer.scores(codes, query)
+        shortlist_size = top_k * self.rescore_factor
+        if mask is not None:
+            approximate[~mask] = -np.inf
+            shortlist_size = min(shortlist_size, np.count_nonzero(mask))
+        shortlist = top_k_indices(approximate, shortlist_size)
+        shortlist = np.sort(shortlist if rows is None else rows[shortlist])
+        
+        scores = self.vectors[shortlist] @ query
+        best = top_k_indices(scores, top_k)
+        return shortlist[best], scores[best]
+    
+    def score_ids(self, query_vector, ids):
+        """用float32向量精确计算指定记录的相似度
+        
+        Args:
+            query_vector (numpy.ndarray): 查询向量
+            ids (numpy.ndarray): 记录ID数组，必须都存在于集合中
+            
+        Returns:
+            numpy.ndarray: 与ids一一对应的相似度数组
+        """
+        if len(ids) == 0:
+            return np.empty(0, dtype=np.float32)
+        
+        rows = self.rows_for(ids)
+        return self.vectors[rows] @ normalize_vector(query_vector)
+    
+    def column(self, field):
+        """获取元数据字段的列数组
+        
+        Args:
+            field (str): 元数据字段名
+            
+        Returns:
+            MetadataColumn: 列数组，集合内容变化前重复使用
+        """
+        column = self._column_cache.get(field)
+        if column is None:
+            column = MetadataColumn(self.metadata.get(field, [None] * len(self.ids)))
+            self._column_cache[field] = column
+        return column
+    
+    def filter_mask(self, filters):
+        """根据过滤条件构造布尔掩码
+        
+        Args:
+            filters (dict): 过滤条件，语法见metadata_filter.build_mask
+            
+        Returns:
+            numpy.ndarray: 布尔数组，filters为空时返回None
+        """
+        return build_mask(self.column, filters, len(self.ids))
+    
+    def metadata_mask(self, field, value):
+        """构造元数据字段等于指定值的布尔掩码
+        
+        Args:
+            field (str): 元数据字段名
+            value: 字段取值
+            
+        Returns:
+            numpy.ndarray: 布尔数组
+        """
+        return self.column(field).compare("==", value)
+    
+    def migrate_from_json(self, json_path):
+        """从旧版JSON嵌入向量文件迁移
+        
+        旧格式为 {id: {"title": ..., "embedding": [...], ...}}。
+        迁移成功后原文件被重命名为 .bak，因此只会执行一次。
+        
+        Args:
+            json_path (str): 旧版JSON文件路径
+            
+        Returns:
+            bool: 是否完成迁移
+        """
+        if not os.path.exists(json_path):
+            return False
+        
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+        except Exception as e:
+            print(f"读取旧版嵌入向量文件时出错: {str(e)}")
+            return False
+        
+        ids = []
+        vectors = []
+        metadata = []
+        for item_id, data in legacy.items():
+            data = dict(data)
+            vectors.append(data.pop("embedding"))
+            ids.append(int(item_id))
+            metadata.append(data)
+        
+        self.replace_all(ids, vectors, metadata)
+        self.save()
+        
+        os.replace(json_path, f"{json_path}.bak")
+        return True
+    
+    def _as_matrix(self, vectors, count):
+        """将向量列表转换为float32矩阵"""
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if count == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.ascontiguousarray(matrix.reshape(count, -1))
+    
+    def _columns(self, metadata):
+        """将元数据字典列表转换为按列存储的形式"""
+        fields = []
+        for item in metadata:
+            for field in item:
+                if field not in fields:
+                    fields.append(field)
+        return {field: [item.get(field) for item in metadata] for field in fields}
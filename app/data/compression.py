@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+自媒体博主自动化辅助平台 - 大文本字段压缩模块
+"""
+
+import os
+import zlib
+import argparse
+from sqlalchemy.types import TypeDecorator, Text
+
+# 压缩级别，6是zlib默认值，压缩率和速度比较均衡
+COMPRESSION_LEVEL = 6
+
+# 短于该字节数的文本压缩收益很小，保持明文
+MIN_COMPRESS_BYTES = 512
+
+# 迁移时每批处理的记录数
+MIGRATE_BATCH_SIZE = 500
+
+def compression_enabled():
+    """是否在写入时压缩，由COMPRESS_TEXT_COLUMNS环境变量控制，默认关闭
+    
+    Returns:
+        bool: 是否压缩
+    """
+    return os.getenv("COMPRESS_TEXT_COLUMNS", "false").lower() == "true"
+
+def compress_text(value, min_bytes=MIN_COMPRESS_BYTES):
+    """压缩文本
+    
+    Args:
+        value (str): 文本
+        min_bytes (int, optional): 参与压缩的最小字节数
+        
+    Returns:
+        压缩后的bytes；文本太短或压缩后没有变小时返回原文本
+    """
+    data = value.encode('utf-8')
+    if len(data) < min_bytes:
+        return value
+    compressed = zlib.compress(data, COMPRESSION_LEVEL)
+    return compressed if len(compressed) < len(data) else value
+
+def decompress_text(value):
+    """解压文本，明文原样返回
+    
+    同时注册为SQLite函数decompress_text，供全文索引触发器和SQL中的LIKE匹配使用
+    
+    Args:
+        value: 数据库中保存的值，压缩数据为bytes，明文为str
+        
+    Returns:
+        str: 文本
+    """
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+class CompressedText(TypeDecorator):
+    """透明压缩的文本字段类型
+    
+    开启压缩时较长的文本以zlib压缩后的BLOB保存，否则以明文保存；读取时根据存储类型自动还原，
+    因此同一列中可以同时存在压缩和未压缩的记录，开关压缩不需要立即迁移。
+    只在读取该字段时解压，列表查询用load_only排除该字段即可完全跳过解压。
+    SQL中需要原文的地方（如LIKE匹配）应使用decompress_text()函数包装该列。
+    """
+    
+    impl = Text
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        """写入前按需压缩"""
+        if value is None or not compression_enabled():
+            return value
+        return compress_text(value)
+    
+    def process_result_value(self, value, dialect):
+        """读取后解压"""
+        return decompress_text(value)
+
+def register_sqlite_functions(dbapi_connection):
+    """在SQLite连接上注册decompress_text函数
+    
+    Args:
+        dbapi_connection: sqlite3连接
+    """
+    dbapi_connection.create_function("decompress_text", 1, decompress_text, deterministic=True)
+
+def compressed_columns(metadata):
+    """列出使用CompressedText类型的全部列
+    
+    Args:
+        metadata (MetaData): 表结构元数据
+        
+    Returns:
+        list: (表名, 列名) 列表
+    """
+    return [
+        (table.name, column.name)
+        for table in metadata.sorted_tables
+        for column in table.columns
+        if isinstance(column.type, CompressedText)
+    ]
+
+def migrate(compress=True, vacuum=True):
+    """按目标格式重写已有记录
+    
+    逐批读取原始存储值，压缩（或解压为明文）后写回，只更新格式发生变化的记录。
+    写回会触发全文索引的更新触发器，因此迁移期间使用解压的触发器，索引内容保持为明文；
+    还原为明文后，若未开启压缩，再换回不依赖decompress_text()函数的触发器。
+    完成后合并全文索引中因重写产生的碎片段，否则被替换的旧数据会一直占用空间。
+    
+    Args:
+        compress (bool, optional): 为True时压缩，为False时全部还原为明文
+        vacuum (bool, optional): 完成后是否执行VACUUM回收空闲页，缩小数据库文件
+        
+    Returns:
+        dict: 各列更新的记录数
+    """
+    from app.data import database
+    from app.data.database import engine, Base, FULLTEXT_TABLES, init_fulltext_index
+    
+    if database.fulltext_available:
+        init_fulltext_index(decompress=True)
+    
+    stats = {}
+    for table, column in compressed_columns(Base.metadata):
+        updated = 0
+        last_id = 0
+        while True:
+            with engine.begin() as connection:
+                rows = connection.exec_driver_sql(
+                    f"SELECT id, {column} FROM {table} WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, MIGRATE_BATCH_SIZE)
+                ).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                
+                changes = []
+                for row_id, stored in rows:
+                    if stored is None:
+                        continue
+                    text = decompress_text(stored)
+                    target = compress_text(text) if compress else text
+                    if type(target) is not type(stored):
+                        changes.append((target, row_id))
+                
+                if changes:
+                    connection.exec_driver_sql(f"UPDATE {table} SET {column} = ? WHERE id = ?", changes)
+                    updated += len(changes)
+        
+        stats[f"{table}.{column}"] = updated
+        print(f"{table}.{column}: 更新{updated}条记录")
+    
+    if database.fulltext_available and not compress:
+        init_fulltext_index()
+    
+    if database.fulltext_available and any(stats.values()):
+        with engine.begin() as connection:
+            for fts_table in FULLTEXT_TABLES:
+                connection.exec_driver_sql(f"INSERT INTO {fts_table}({fts_table}) VALUES ('optimize')")
+    
+    if vacuum:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.exec_driver_sql("VACUUM")
+    
+    return stats
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="压缩或还原数据库中的大文本字段")
+    parser.add_argument("--decompress", action="store_true", help="把已压缩的记录还原为明文")
+    parser.add_argument("--no-vacuum", action="store_true", help="完成后不执行VACUUM")
+    args = parser.parse_args()
+    
+    if not args.decompress and not compression_enabled():
+        print("提示：未设置COMPRESS_TEXT_COLUMNS=true，之后新写入的记录仍以明文保存")
+    
+    # 以脚本运行时本模块名为__main__，通过包路径调用，保证与数据模型使用同一个CompressedText类
+    from app.data import compression
+    stats = compression.migrate(compress=not args.decompress, vacuum=not args.no_vacuum)
+    print(f"迁移完成: {stats}")
+
+if __name__ == "__main__":
+    main()
@@ -6,18 +6,55 @@
 """
 
 import os
+import re
 import sqlite3
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, ForeignKey
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, func, text, tuple_, Column, Integer, Float, String, Text, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, scoped_session, relationship
+from sqlalchemy.pool import QueuePool
+from app.data.compression import CompressedText, register_sqlite_functions, compression_enabled, compressed_columns
 import datetime
 
 # 获取数据库文件路径
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 
                       'app', 'data', 'media_creator.db')
 
+# SQLite连接参数
+# WAL模式下读写互不阻塞：后台爬虫写入时，生成器等其他线程仍能读取最近一次提交的数据
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",      # WAL模式下NORMAL不会损坏数据库，只在断电时可能丢失最后几个事务
+    "cache_size": -64000,         # 负数单位为KiB，即每个连接64MB页缓存
+    "temp_store": "MEMORY",
+    "mmap_size": 256 * 1024 * 1024,
+    "busy_timeout": 30000         # 写锁被占用时最多等待30秒，而不是立即报database is locked
+}
+
 # 创建SQLAlchemy引擎
-engine = create_engine(f'sqlite:///{DB_PATH}', echo=False)
+# 连接池中的连接会被不同线程轮流使用，因此关闭sqlite3的同线程检查；
+# 每个会话同一时刻只在一个线程中使用，连接本身不会被并发访问
+engine = create_engine(
+    f'sqlite:///{DB_PATH}',
+    echo=False,
+    poolclass=QueuePool,
+    pool_size=5,
+    max_overflow=10,
+    pool_timeout=30,
+    pool_pre_ping=True,
+    connect_args={"check_same_thread": False, "timeout": 30}
+)
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """为每个新建的连接设置SQLite参数，并注册全文索引触发器使用的解压函数"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+    register_sqlite_functions(dbapi_connection)
 
 # 创建基类
 Base = declarative_base()
@@ -26,15 +63,21 @@ Base = declarative_base()
 class Paper(Base):
     """论文数据模型"""
     __tablename__ = 'papers'
+    __table_args__ = (
+        # 外部唯一键：同一篇arXiv论文的同一版本只保存一行，其他来源的论文两列为空，不受约束
+        Index('uq_papers_arxiv_id_version', 'arxiv_id', 'arxiv_version', unique=True),
+    )
     
     id = Column(Integer, primary_key=True)
-    title = Column(String(255), nullable=False)
+    title = Column(String(255), nullable=False, index=True)
     authors = Column(String(255))
-    abstract = Column(Text)
-    url = Column(String(255))
+    abstract = Column(CompressedText)
+    url = Column(String(255), index=True)
     source = Column(String(50))
-    published_date = Column(DateTime)
-    crawled_date = Column(DateTime, default=datetime.datetime.now)
+    published_date = Column(DateTime, index=True)
+    crawled_date = Column(DateTime, default=datetime.datetime.now, index=True)
+    arxiv_id = Column(String(50))       # 不含版本号的arXiv编号，如2301.00001
+    arxiv_version = Column(Integer)     # arXiv版本号，如v2中的2
     
     def __repr__(self):
         return f"<Paper(title='{self.title}')>"
@@ -45,8 +88,8 @@ class PPTMethod(Base):
     __tablename__ = 'ppt_methods'
     
     id = Column(Integer, primary_key=True)
-    title = Column(String(255), nullable=False)
-    content = Column(Text, nullable=False)
+    title = Column(String(255), nullable=False, index=True, unique=True)
+    content = Column(CompressedText, nullable=False)
     created_date = Column(DateTime, default=datetime.datetime.now)
     updated_date = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
     
@@ -59,8 +102,8 @@ class SpeechMethod(Base):
     __tablename__ = 'speech_methods'
     
     id = Column(Integer, primary_key=True)
-    title = Column(String(255), nullable=False)
-    content = Column(Text, nullable=False)
+    title = Column(String(255), nullable=False, index=True, unique=True)
+    content = Column(CompressedText, nullable=False)
     created_date = Column(DateTime, default=datetime.datetime.now)
     updated_date = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
     
@@ -73,11 +116,11 @@ class HistoryContent(Base):
     __tablename__ = 'history_contents'
     
     id = Column(Integer, primary_key=True)
-    title = Column(String(255), nullable=False)
+    title = Column(String(255), nullable=False, index=True, unique=True)
     content_type = Column(String(50), nullable=False)  # PPT或演讲稿
-    content = Column(Text, nullable=False)
-    paper_id = Column(Integer, ForeignKey('papers.id'))
-    created_date = Column(DateTime, default=datetime.datetime.now)
+    content = Column(CompressedText, nullable=False)
+    paper_id = Column(Integer, ForeignKey('papers.id'), index=True)
+    created_date = Column(DateTime, default=datetime.datetime.now, index=True)
     
     # 关联论文
     paper = relationship("Paper", backref="history_contents")
@@ -85,20 +128,130 @@ class HistoryContent(Base):
     def __repr__(self):
         return f"<HistoryContent(title='{self.title}', type='{self.content_type}')>"
 
+# arXiv链接中的编号和版本号，兼容新式编号(2301.00001v2)和旧式编号(hep-th/9901001v1)
+ARXIV_URL_PATTERN = re.compile(r'arxiv\.org/(?:abs|pdf)/(.+?)(?:v(\d+))?(?:\.pdf)?$')
+
+def parse_arxiv_id(url):
+    """从arXiv链接中解析编号和版本号
+    
+    链接不含版本号时按版本1处理。(arxiv_id, arxiv_version)是唯一键，
+    SQLite唯一索引中的NULL互不相等，版本号为空的论文每次保存都会插入新行。
+    
+    Args:
+        url (str): arXiv摘要页或PDF链接
+        
+    Returns:
+        tuple: (arXiv编号, 版本号)，无法解析时为 (None, None)
+    """
+    match = ARXIV_URL_PATTERN.search(url or "")
+    if not match:
+        return None, None
+    arxiv_id, version = match.groups()
+    return arxiv_id, int(version) if version else 1
+
 # 创建数据库会话
-Session = sessionmaker(bind=engine)
+# 会话在每次操作结束时关闭，提交后不使对象过期，返回给调用方的对象在会话关闭后仍可读取已加载的字段
+Session = sessionmaker(bind=engine, expire_on_commit=False)
+
+# 线程局部会话注册表，同一线程中嵌套的session_scope共用一个会话
+ScopedSession = scoped_session(Session)
+
+# 数据变更监听器列表
+_change_listeners = []
+
+def add_change_listener(callback):
+    """注册数据变更监听器
+    
+    每次事务提交后，监听器会收到本次事务中插入、更新、删除的记录列表，
+    列表元素为 (表名, 记录ID, 操作) 三元组，操作为"insert"、"update"、"delete"，
+    通过record_changes()登记的INSERT ... ON CONFLICT写入为"upsert"。
+    监听器在提交事务的线程中被调用，应尽快返回。
+    通过Query.update()/Query.delete()执行的批量操作不会触发通知。
+    
+    Args:
+        callback (function): 监听器函数
+    """
+    if callback not in _change_listeners:
+        _change_listeners.append(callback)
+
+def remove_change_listener(callback):
+    """移除数据变更监听器
+    
+    Args:
+        callback (function): 监听器函数
+    """
+    if callback in _change_listeners:
+        _change_listeners.remove(callback)
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    """在flush后记录本次变更，提交时统一通知"""
+    if not _change_listeners:
+        return
+    
+    changes = session.info.setdefault("pending_changes", [])
+    for operation, objects in (("insert", session.new), ("update", session.dirty), ("delete", session.deleted)):
+        for obj in objects:
+            if not hasattr(obj, "__tablename__"):
+                continue
+            if operation == "update" and not session.is_modified(obj, include_collections=False):
+                continue
+            changes.append((obj.__tablename__, obj.id, operation))
+
+def record_changes(session, table, ids, operation="upsert"):
+    """登记通过Core语句执行、ORM无法感知的变更，在会话提交时一并通知监听器
+    
+    Args:
+        session (Session): 执行语句的数据库会话
+        table (str): 表名
+        ids (list): 记录ID列表
+        operation (str, optional): 操作类型
+    """
+    if not _change_listeners:
+        return
+    
+    changes = session.info.setdefault("pending_changes", [])
+    changes.extend((table, item_id, operation) for item_id in ids)
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_changes(session):
+    """事务提交后通知监听器"""
+    changes = session.info.pop("pending_changes", None)
+    if not changes:
+        return
+    
+    for callback in list(_change_listeners):
+        try:
+            callback(changes)
+        except Exception as e:
+            print(f"通知数据变更时出错: {str(e)}")
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    """事务回滚后丢弃未提交的变更"""
+    session.info.pop("pending_changes", None)
 
 def init_db():
     """初始化数据库"""
     # 创建数据库目录
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
     
-    # 创建表
+    # 创建表，新建的表已是当前结构，不需要再迁移
     Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    init_fulltext_index()
     
     # 添加一些初始数据
-    session = Session()
+    with session_scope() as session:
+        _add_sample_data(session)
+
+def _add_sample_data(session):
+    """数据库为空时添加示例数据
     
+    Args:
+        session (Session): 数据库会话
+    """
     # 检查是否已有数据
     if session.query(PPTMethod).count() == 0:
         # 添加PPT制作方法示例
@@ -176,15 +329,452 @@ def init_db():
         )
         
         session.add_all([history1, history2])
+
+@contextmanager
+def session_scope():
+    """以一次操作为单位使用数据库会话
+    
+    进入时获取当前线程的会话，正常退出时提交，出现异常时回滚并继续抛出，
+    最后关闭会话并把连接归还连接池。同一线程中嵌套使用时，内层直接复用外层的会话，
+    由最外层统一提交，因此多个步骤可以组成一个事务。
     
-    # 提交事务
-    session.commit()
-    session.close()
+    Yields:
+        Session: 数据库会话
+    """
+    if ScopedSession.registry.has():
+        yield ScopedSession()
+        return
+    
+    session = ScopedSession()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        ScopedSession.remove()
 
 def get_session():
-    """获取数据库会话"""
+    """获取独立的数据库会话，调用方负责关闭
+    
+    新代码应优先使用session_scope()
+    """
     return Session()
 
-# 初始化数据库
-if not os.path.exists(DB_PATH):
-    init_db() 
\ No newline at end of file
+# 数据库结构版本，已升级到的版本保存在PRAGMA user_version中
+SCHEMA_VERSION = 3
+
+# SQLAlchemy在SQLite中保存DateTime列使用的文本格式。SQLite按字符串比较时间，
+# 迁移中用SQL写入的时间必须使用同一格式，否则与分页游标比较时顺序错误
+SQLITE_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# 按标题唯一的表，迁移时合并同名记录
+UNIQUE_TITLE_TABLES = ("ppt_methods", "speech_methods", "history_contents")
+
+def setup_database():
+    """创建新数据库，或把已有数据库升级到当前版本
+    
+    只应在应用启动时调用一次。导入本模块不会修改数据库，
+    回填进程等其他入口直接使用已经升级的数据库。
+    """
+    if not os.path.exists(DB_PATH):
+        init_db()
+    else:
+        migrate_db()
+        init_fulltext_index()
+
+def migrate_db():
+    """把已有数据库升级到当前的结构版本
+    
+    每个版本的迁移只执行一次，执行后更新PRAGMA user_version。
+    迁移会删除重复记录，因此执行前先把整个数据库备份到 <数据库文件>.v<原版本>.bak，
+    被删除的每条记录也会打印出来。
+    """
+    # 补建缺失的表
+    Base.metadata.create_all(engine)
+    
+    with engine.connect() as connection:
+        version = connection.exec_driver_sql("PRAGMA user_version").scalar()
+    if version >= SCHEMA_VERSION:
+        return
+    
+    backup_path = _backup_db(f"{DB_PATH}.v{version}.bak")
+    print(f"数据库结构版本{version}低于{SCHEMA_VERSION}，开始升级，原数据库已备份到{backup_path}")
+    
+    with engine.begin() as connection:
+        if version < 1:
+            _migrate_to_v1(connection)
+        if version < 2:
+            _migrate_to_v2(connection)
+        if version < 3:
+            _migrate_to_v3(connection)
+        connection.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+def _backup_db(backup_path):
+    """使用SQLite在线备份把数据库完整复制到备份文件
+    
+    Args:
+        backup_path (str): 备份文件路径
+        
+    Returns:
+        str: 备份文件路径
+    """
+    connection = engine.raw_connection()
+    try:
+        target = sqlite3.connect(backup_path)
+        try:
+            connection.driver_connection.backup(target)
+        finally:
+            target.close()
+    finally:
+        connection.close()
+    return backup_path
+
+def _migrate_to_v1(connection):
+    """升级到版本1
+    
+    1. 为papers表补充arxiv_id、arxiv_version列，并从已有的arXiv链接中解析填充；
+    2. 合并重复记录：同一arXiv编号和版本的论文只保留最早的一行，历史内容改为关联保留的论文；
+       按标题唯一的表中同名记录只保留最早的一行，与按标题查找时读到的记录一致；
+    3. 补齐分页排序使用的时间列中的空值；
+    4. 创建模型中声明的全部索引，包括唯一索引。
+    
+    合并使用SQL直接删除，不会触发数据变更通知，向量集合在下次增量更新时移除这些记录。
+    
+    Args:
+        connection (Connection): 迁移所在事务的数据库连接
+    """
+    columns = {row[1] for row in connection.exec_driver_sql("PRAGMA table_info(papers)")}
+    for name, column_type in (("arxiv_id", "VARCHAR(50)"), ("arxiv_version", "INTEGER")):
+        if name not in columns:
+            connection.exec_driver_sql(f"ALTER TABLE papers ADD COLUMN {name} {column_type}")
+    
+    # 从链接中解析arXiv编号
+    rows = connection.exec_driver_sql(
+        "SELECT id, url FROM papers WHERE arxiv_id IS NULL AND url LIKE '%arxiv.org/%'"
+    ).fetchall()
+    updates = []
+    for paper_id, url in rows:
+        arxiv_id, version = parse_arxiv_id(url)
+        if arxiv_id:
+            updates.append((arxiv_id, version, paper_id))
+    if updates:
+        connection.exec_driver_sql("UPDATE papers SET arxiv_id = ?, arxiv_version = ? WHERE id = ?", updates)
+    
+    # 合并重复抓取的论文
+    duplicates = connection.exec_driver_sql(
+        "SELECT p.id, k.keep_id, p.title FROM papers p JOIN ("
+        "SELECT arxiv_id, arxiv_version, MIN(id) AS keep_id FROM papers "
+        "WHERE arxiv_id IS NOT NULL GROUP BY arxiv_id, arxiv_version HAVING COUNT(*) > 1"
+        ") k ON p.arxiv_id = k.arxiv_id AND p.arxiv_version IS k.arxiv_version AND p.id != k.keep_id"
+    ).fetchall()
+    _merge_duplicate_papers(connection, duplicates)
+    
+    # 分页游标列为空的记录无法参与比较，用最接近的时间补齐
+    now = datetime.datetime.now().strftime(SQLITE_DATETIME_FORMAT)
+    connection.exec_driver_sql(
+        "UPDATE papers SET crawled_date = COALESCE(published_date, ?) WHERE crawled_date IS NULL", (now,)
+    )
+    connection.exec_driver_sql(
+        "UPDATE history_contents SET created_date = ? WHERE created_date IS NULL", (now,)
+    )
+    
+    for table in UNIQUE_TITLE_TABLES:
+        removed = connection.exec_driver_sql(
+            f"SELECT id, title FROM {table} WHERE id NOT IN (SELECT MIN(id) FROM {table} GROUP BY title)"
+        ).fetchall()
+        if removed:
+            for row_id, title in removed:
+                print(f"删除{table}表中的同名记录{row_id}《{title}》")
+            connection.exec_driver_sql(f"DELETE FROM {table} WHERE id = ?", [(row_id,) for row_id, _ in removed])
+            print(f"已合并{table}表中{len(removed)}条同名记录")
+    
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+def _migrate_to_v2(connection):
+    """升级到版本2
+    
+    早期的版本1迁移用CURRENT_TIMESTAMP补齐时间，写入的是不带微秒的"YYYY-MM-DD HH:MM:SS"，
+    按字符串比较时总是小于同一时刻的分页游标，分页会停在第一页。这里补齐为SQLAlchemy的格式。
+    
+    Args:
+        connection (Connection): 迁移所在事务的数据库连接
+    """
+    for table, column in (("papers", "crawled_date"), ("history_contents", "created_date")):
+        connection.exec_driver_sql(
+            f"UPDATE {table} SET {column} = {column} || '.000000' WHERE length({column}) = 19"
+        )
+
+def _migrate_to_v3(connection):
+    """升级到版本3
+    
+    链接不含版本号的arXiv论文原先以空版本号保存，唯一索引不约束NULL，每次爬取都会重复插入。
+    现在这类论文按版本1保存，这里把已有记录的空版本号补为1，
+    补齐前先合并同一arXiv编号下空版本号和版本1的重复记录，只保留最早的一行。
+    
+    Args:
+        connection (Connection): 迁移所在事务的数据库连接
+    """
+    duplicates = connection.exec_driver_sql(
+        "SELECT p.id, k.keep_id, p.title FROM papers p JOIN ("
+        "SELECT arxiv_id, MIN(id) AS keep_id FROM papers "
+        "WHERE arxiv_id IS NOT NULL AND COALESCE(arxiv_version, 1) = 1 GROUP BY arxiv_id HAVING COUNT(*) > 1"
+        ") k ON p.arxiv_id = k.arxiv_id AND COALESCE(p.arxiv_version, 1) = 1 AND p.id != k.keep_id"
+    ).fetchall()
+    _merge_duplicate_papers(connection, duplicates)
+    
+    connection.exec_driver_sql(
+        "UPDATE papers SET arxiv_version = 1 WHERE arxiv_id IS NOT NULL AND arxiv_version IS NULL"
+    )
+
+def _merge_duplicate_papers(connection, duplicates):
+    """删除重复的论文记录，引用它们的历史内容改为关联保留的记录
+    
+    Args:
+        connection (Connection): 迁移所在事务的数据库连接
+        duplicates (list): (待删除的论文ID, 保留的论文ID, 标题) 列表
+    """
+    if not duplicates:
+        return
+    
+    for paper_id, keep_id, title in duplicates:
+        print(f"删除重复的论文记录{paper_id}《{title}》，保留记录{keep_id}")
+    connection.exec_driver_sql(
+        "UPDATE history_contents SET paper_id = ? WHERE paper_id = ?",
+        [(keep_id, paper_id) for paper_id, keep_id, _ in duplicates]
+    )
+    connection.exec_driver_sql("DELETE FROM papers WHERE id = ?", [(paper_id,) for paper_id, _, _ in duplicates])
+    print(f"已合并{len(duplicates)}条重复的论文记录")
+
+# 全文索引配置：FTS5虚拟表名称到 (源表, 索引列, 各列的bm25权重)
+# 使用trigram分词器，按连续三个字符建立索引，中文不需要额外分词即可做子串匹配
+FULLTEXT_TABLES = {
+    "papers_fts": ("papers", ("title", "abstract"), (10.0, 1.0)),
+    "history_contents_fts": ("history_contents", ("title", "content"), (10.0, 1.0))
+}
+
+# trigram分词器能检索的最短关键词长度，更短的关键词退回LIKE匹配
+FULLTEXT_MIN_KEYWORD_LENGTH = 3
+
+# 当前SQLite是否支持FTS5 trigram分词器，由init_fulltext_index()设置，导入时按已有数据库中的全文索引初始化
+fulltext_available = False
+
+def _fulltext_statements(fts_table, source_table, columns, decompress=False):
+    """生成创建全文索引虚拟表和同步触发器的SQL语句
+    
+    虚拟表使用外部内容模式，不重复保存原文，rowid与源表的id一致。
+    源表的插入、删除和索引列的更新由触发器同步到虚拟表，
+    因此任何途径写入数据库（包括其他进程）都不会使索引过期。
+    
+    Args:
+        fts_table (str): 虚拟表名称
+        source_table (str): 源表名称
+        columns (tuple): 索引列名称
+        decompress (bool, optional): 是否用decompress_text()还原写入索引的值，
+            使压缩保存的字段按原文建立索引；此时写入该表的连接都需要注册该函数
+            
+    Returns:
+        tuple: (建表语句, 触发器语句列表)，触发器语句列表中每项为 (触发器名称, 建触发器语句)
+    """
+    column_list = ", ".join(columns)
+    if decompress:
+        new_values = ", ".join(f"decompress_text(new.{column})" for column in columns)
+        old_values = ", ".join(f"decompress_text(old.{column})" for column in columns)
+    else:
+        new_values = ", ".join(f"new.{column}" for column in columns)
+        old_values = ", ".join(f"old.{column}" for column in columns)
+    
+    create_table = (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+        f"{column_list}, content='{source_table}', content_rowid='id', tokenize='trigram')"
+    )
+    insert_new = f"INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values});"
+    delete_old = f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});"
+    
+    triggers = [
+        (f"{fts_table}_ai", f"AFTER INSERT ON {source_table} BEGIN {insert_new} END"),
+        (f"{fts_table}_ad", f"AFTER DELETE ON {source_table} BEGIN {delete_old} END"),
+        (f"{fts_table}_au", f"AFTER UPDATE OF {column_list} ON {source_table} BEGIN {delete_old} {insert_new} END")
+    ]
+    return create_table, triggers
+
+def init_fulltext_index(decompress=None):
+    """创建全文索引和同步触发器
+    
+    可以重复调用；触发器每次都按当前定义重建，虚拟表首次创建时用源表中已有的数据填充索引。
+    SQLite不支持FTS5或trigram分词器时不创建任何对象，关键词检索退回LIKE匹配。
+    
+    只有开启了压缩或表中已有压缩保存的记录时，触发器才调用decompress_text()，
+    否则使用不依赖自定义函数的触发器，sqlite3命令行等其他连接也能正常写入。
+    
+    Args:
+        decompress (bool, optional): 是否使用解压的触发器，默认按上述条件自动判断
+    """
+    global fulltext_available
+    
+    compressed = {}
+    for table, column in compressed_columns(Base.metadata):
+        compressed.setdefault(table, []).append(column)
+    
+    try:
+        with engine.begin() as connection:
+            existing = {
+                name for name, in connection.exec_driver_sql(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'"
+                )
+            }
+            
+            for fts_table, (source_table, columns, _) in FULLTEXT_TABLES.items():
+                if source_table not in existing:
+                    continue
+                
+                table_decompress = decompress
+                if table_decompress is None:
+                    compressed_in_index = [column for column in columns if column in compressed.get(source_table, ())]
+                    table_decompress = bool(compressed_in_index) and (
+                        compression_enabled() or _has_compressed_rows(connection, source_table, compressed_in_index)
+                    )
+                
+                create_table, triggers = _fulltext_statements(fts_table, source_table, columns, table_decompress)
+                connection.exec_driver_sql(create_table)
+                for trigger_name, trigger in triggers:
+                    connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger_name}")
+                    connection.exec_driver_sql(f"CREATE TRIGGER {trigger_name} {trigger}")
+                
+                if fts_table not in existing:
+                    # 'rebuild'命令直接读取源表，会把压缩数据当作原文，因此手动解压后填充
+                    column_list = ", ".join(columns)
+                    values = ", ".join(f"decompress_text({column})" for column in columns)
+                    connection.exec_driver_sql(
+                        f"INSERT INTO {fts_table}(rowid, {column_list}) SELECT id, {values} FROM {source_table}"
+                    )
+        
+        fulltext_available = True
+    except Exception as e:
+        fulltext_available = False
+        print(f"创建全文索引时出错，关键词检索将使用LIKE匹配: {str(e)}")
+
+def _has_compressed_rows(connection, table, columns):
+    """表中是否有以压缩格式保存的记录
+    
+    Args:
+        connection (Connection): 数据库连接
+        table (str): 表名
+        columns (list): 使用CompressedText类型的列名
+        
+    Returns:
+        bool: 是否存在压缩数据
+    """
+    condition = " OR ".join(f"typeof({column}) = 'blob'" for column in columns)
+    return bool(connection.exec_driver_sql(f"SELECT EXISTS (SELECT 1 FROM {table} WHERE {condition})").scalar())
+
+def split_keywords(keywords):
+    """把逗号分隔的关键词拆分为列表
+    
+    Args:
+        keywords (str): 关键词，多个关键词用逗号分隔
+        
+    Returns:
+        list: 去除空白后的非空关键词列表
+    """
+    return [keyword.strip() for keyword in keywords.split(",") if keyword.strip()]
+
+def fulltext_filter(query, model, fts_table, keywords):
+    """为查询添加关键词筛选，并按相关度排序
+    
+    每个关键词都必须出现在任一索引列中。长度不小于3的关键词通过FTS5索引匹配，
+    结果按bm25相关度排序（标题命中的权重更高）；更短的关键词以及不支持FTS5时使用LIKE匹配。
+    
+    Args:
+        query (Query): 源表的查询
+        model (class): 源表的数据模型类
+        fts_table (str): 全文索引虚拟表名称
+        keywords (list): 关键词列表
+        
+    Returns:
+        tuple: (添加筛选后的查询, 相关度排序表达式或None)
+    """
+    _, columns, weights = FULLTEXT_TABLES[fts_table]
+    
+    phrases = []
+    for keyword in keywords:
+        if fulltext_available and len(keyword) >= FULLTEXT_MIN_KEYWORD_LENGTH:
+            # 关键词作为短语匹配，双引号转义后不会被解析为FTS5查询语法
+            phrases.append('"{}"'.format(keyword.replace('"', '""')))
+        else:
+            condition = None
+            for column in columns:
+                field = getattr(model, column)
+                if isinstance(field.type, CompressedText):
+                    field = func.decompress_text(field)
+                clause = field.like(f"%{keyword}%")
+                condition = clause if condition is None else condition | clause
+            query = query.filter(condition)
+    
+    if not phrases:
+        return query, None
+    
+    weight_list = ", ".join(str(weight) for weight in weights)
+    matches = text(
+        f"SELECT rowid AS id, bm25({fts_table}, {weight_list}) AS rank "
+        f"FROM {fts_table} WHERE {fts_table} MATCH :match"
+    ).bindparams(match=" AND ".join(phrases)).columns(id=Integer, rank=Float).subquery()
+    
+    query = query.join(matches, matches.c.id == model.id)
+    return query, matches.c.rank
+
+def keyset_page(query, order_columns, cursor=None, limit=50, descending=False):
+    """按游标分页查询
+    
+    以排序列的值而不是OFFSET定位下一页：条件 (列1, 列2) < 游标 可以直接利用索引跳到起点，
+    翻到第几页耗时都相同，翻页期间插入新记录也不会导致重复或遗漏。
+    排序列的组合必须唯一，通常以主键作为最后一列。
+    
+    Args:
+        query (Query): 查询
+        order_columns (list): 排序列
+        cursor (tuple, optional): 上一页返回的游标，为None时从第一页开始
+        limit (int, optional): 每页记录数
+        descending (bool, optional): 是否降序
+        
+    Returns:
+        tuple: (本页记录列表, 下一页的游标，没有下一页时为None)
+    """
+    key = tuple_(*order_columns)
+    if cursor is not None:
+        query = query.filter(key < tuple(cursor) if descending else key > tuple(cursor))
+    
+    query = query.order_by(*[column.desc() if descending else column for column in order_columns])
+    rows = query.limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = tuple(getattr(rows[-1], column.key) for column in order_columns)
+    return rows, next_cursor
+
+def _detect_fulltext():
+    """检查已有数据库中是否已创建全文索引，不修改数据库
+    
+    全文索引由应用启动时的setup_database()创建，其他进程导入本模块时据此决定关键词检索方式。
+    """
+    global fulltext_available
+    
+    if not os.path.exists(DB_PATH):
+        return
+    
+    try:
+        with engine.connect() as connection:
+            existing = {
+                name for name, in connection.exec_driver_sql(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'"
+                )
+            }
+        fulltext_available = all(fts_table in existing for fts_table in FULLTEXT_TABLES)
+    except Exception:
+        fulltext_available = False
+
+_detect_fulltext()
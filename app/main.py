@@ -17,10 +17,14 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # 导入GUI模块
 from app.gui.main_window import MainWindow
+from app.data.database import setup_database
 from PyQt5.QtWidgets import QApplication
 
 def main():
     """应用程序主入口函数"""
+    # 创建或升级数据库
+    setup_database()
+    
     # 创建QApplication实例
     app = QApplication(sys.argv)
     
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+测试公共夹具
+"""
+
+import pytest
+from sqlalchemy import create_engine, event
+from app.data import database
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """把数据库引擎和会话替换为临时数据库，测试结束后恢复
+    
+    Yields:
+        Engine: 临时数据库引擎
+    """
+    db_path = str(tmp_path / "test.db")
+    engine = create_engine(f"sqlite:///{db_path}")
+    event.listen(engine, "connect", database._set_sqlite_pragmas)
+    database.Base.metadata.create_all(engine)
+    
+    original_engine = database.engine
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(database, "DB_PATH", db_path)
+    database.Session.configure(bind=engine)
+    try:
+        yield engine
+    finally:
+        database.ScopedSession.remove()
+        database.Session.configure(bind=original_engine)
+        engine.dispose()
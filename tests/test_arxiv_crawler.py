@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+arXiv爬虫模块测试
+"""
+
+from app.core.crawler.arxiv_crawler import ArxivCrawler
+from app.data.database import Paper, parse_arxiv_id, session_scope
+
+def _crawled_papers(title):
+    papers = []
+    for url in ("http://arxiv.org/abs/2301.00001", "http://arxiv.org/abs/2301.00001v2", "https://example.com/paper"):
+        arxiv_id, arxiv_version = parse_arxiv_id(url)
+        papers.append(Paper(title=title, url=url, source="arXiv", arxiv_id=arxiv_id, arxiv_version=arxiv_version))
+    return papers
+
+def test_recrawled_papers_are_updated_not_duplicated(temp_db):
+    crawler = ArxivCrawler()
+    first = crawler._save_papers(_crawled_papers("初次抓取"))
+    second = crawler._save_papers(_crawled_papers("再次抓取")[:2])
+    
+    assert all(paper.id is not None for paper in first + second)
+    assert [paper.id for paper in second] == [paper.id for paper in first[:2]]
+    assert [paper.title for paper in second] == ["再次抓取", "再次抓取"]
+    
+    with session_scope() as session:
+        rows = session.query(Paper).order_by(Paper.id).all()
+        assert [(row.arxiv_id, row.arxiv_version, row.title) for row in rows] == [
+            (None, None, "初次抓取"), ("2301.00001", 1, "再次抓取"), ("2301.00001", 2, "再次抓取")
+        ]
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文本分段模块测试
+"""
+
+from app.core.rag.chunking import split_passages
+
+TITLE = "大语言模型推理加速综述\n"
+
+def count_tokens(passage):
+    # 模拟中文分词：标题和正文每个字一个token，另加首尾两个特殊token
+    return len(TITLE + passage) + 2
+
+def test_passages_fit_token_limit_with_title():
+    text = "".join(f"第{index}句介绍一种推理加速方法，并给出实验结果。" for index in range(40))
+    
+    passages = split_passages(text, max_tokens=128, count_tokens=count_tokens)
+    
+    assert all(count_tokens(text[start:end]) <= 128 for start, end in passages)
+    assert passages[0][0] == 0 and passages[-1][1] == len(text)
+    # 相邻段落首尾相接或重叠，没有遗漏的文本
+    assert all(following[0] <= previous[1] for previous, following in zip(passages, passages[1:]))
+    assert all(text[end - 1] in "。，" for _, end in passages[:-1])
+
+def test_passages_without_token_limit_use_max_chars():
+    text = "一" * 450
+    
+    passages = split_passages(text)
+    
+    assert all(end - start <= 200 for start, end in passages)
+    assert max(count_tokens(text[start:end]) for start, end in passages) > 128
+    assert split_passages("   ") == []
+    assert split_passages("短文本", max_tokens=128, count_tokens=count_tokens) == [(0, 3)]
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+数据库模块测试
+"""
+
+import datetime
+from app.data import database
+from app.data.database import Paper, keyset_page, session_scope
+from app.core.knowledge.knowledge_manager import KnowledgeManager
+
+def _insert_legacy_rows(engine):
+    """写入时间列为空的旧记录，并把数据库标记为未迁移"""
+    with engine.begin() as connection:
+        for i in range(8):
+            connection.exec_driver_sql(
+                "INSERT INTO history_contents (title, content_type, content) VALUES (?, 'PPT', '内容')", (f"旧内容{i}",)
+            )
+            connection.exec_driver_sql(
+                "INSERT INTO papers (title, source) VALUES (?, 'arXiv')", (f"旧论文{i}",)
+            )
+        connection.exec_driver_sql("PRAGMA user_version = 0")
+
+def _page_all(fetch, limit=3):
+    """逐页读取直到没有下一页，返回全部ID"""
+    ids, cursor = [], None
+    for _ in range(100):
+        rows, cursor = fetch(cursor, limit)
+        ids.extend(row.id for row in rows)
+        if cursor is None:
+            return ids
+    raise AssertionError("分页没有结束")
+
+def test_pages_terminate_after_migration(temp_db):
+    _insert_legacy_rows(temp_db)
+    manager = KnowledgeManager()
+    manager.add_history_content("新内容", "PPT", "内容")
+    
+    database.migrate_db()
+    
+    with temp_db.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA user_version").scalar() == database.SCHEMA_VERSION
+    
+    history_ids = _page_all(lambda cursor, limit: manager.list_history_contents(cursor=cursor, limit=limit))
+    assert sorted(history_ids) == list(range(1, 10))
+    assert len(set(history_ids)) == len(history_ids)
+    
+    def list_papers(cursor, limit):
+        with session_scope() as session:
+            return keyset_page(session.query(Paper), [Paper.crawled_date, Paper.id], cursor, limit, descending=True)
+    
+    paper_ids = _page_all(list_papers)
+    assert sorted(paper_ids) == list(range(1, 9))
+
+def test_migration_repairs_timestamps_without_microseconds(temp_db):
+    _insert_legacy_rows(temp_db)
+    with temp_db.begin() as connection:
+        connection.exec_driver_sql("UPDATE history_contents SET created_date = '2024-01-01 08:00:00'")
+        connection.exec_driver_sql("PRAGMA user_version = 1")
+    
+    database.migrate_db()
+    
+    manager = KnowledgeManager()
+    history_ids = _page_all(lambda cursor, limit: manager.list_history_contents(cursor=cursor, limit=limit))
+    assert sorted(history_ids) == list(range(1, 9))
+    assert manager.get_history_content_by_id(1).created_date == datetime.datetime(2024, 1, 1, 8)
+
+def test_migration_merges_papers_without_arxiv_version(temp_db):
+    with temp_db.begin() as connection:
+        for title, arxiv_id, version in (("旧论文", "2301.00001", None), ("重复抓取", "2301.00001", None),
+                                         ("版本1", "2301.00001", 1), ("版本2", "2301.00001", 2),
+                                         ("其他论文", "2301.00002", None), ("非arXiv", None, None)):
+            connection.exec_driver_sql(
+                "INSERT INTO papers (title, source, arxiv_id, arxiv_version) VALUES (?, 'arXiv', ?, ?)",
+                (title, arxiv_id, version)
+            )
+        connection.exec_driver_sql(
+            "INSERT INTO history_contents (title, content_type, content, paper_id) VALUES ('解读', 'PPT', '内容', 2)"
+        )
+        connection.exec_driver_sql("PRAGMA user_version = 2")
+    
+    database.migrate_db()
+    
+    with temp_db.connect() as connection:
+        rows = connection.exec_driver_sql("SELECT id, arxiv_id, arxiv_version FROM papers ORDER BY id").fetchall()
+        paper_id = connection.exec_driver_sql("SELECT paper_id FROM history_contents").scalar()
+    assert [tuple(row) for row in rows] == [
+        (1, "2301.00001", 1), (4, "2301.00001", 2), (5, "2301.00002", 1), (6, None, None)
+    ]
+    assert paper_id == 1
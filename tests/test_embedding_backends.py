@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+嵌入后端模块测试
+"""
+
+import json
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+import pytest
+import requests
+from app.core.rag.embedding_backends import RemoteEmbeddingBackend
+
+class EmbeddingServer:
+    """本地嵌入服务，按请求顺序依次使用预设的响应方式
+    
+    文本"t<i>"的向量为[i, 1]，便于检查返回顺序。
+    """
+    
+    def __init__(self):
+        self.requests = []
+        self.responses = []
+        self.format = "dashscope"
+        self.lock = threading.Lock()
+        
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with server.lock:
+                    server.requests.append(body)
+                    status = server.responses.pop(0) if server.responses else 200
+                self._reply(status, server.payload(server.texts(body), status))
+            
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(200 if status == "short" else status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def log_message(self, *args):
+                pass
+        
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/embeddings"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+    
+    def texts(self, body):
+        """按接口格式从请求体中取出文本"""
+        return body["input"]["texts"] if self.format == "dashscope" else body["input"]
+    
+    def payload(self, texts, status):
+        """构造响应，条目顺序被打乱，只能通过下标还原"""
+        if status not in (200, "short"):
+            return {"message": "error"}
+        
+        items = [(index, [float(text[1:]), 1.0]) for index, text in enumerate(texts)]
+        if status == "short":
+            items = items[:-1]
+        random.shuffle(items)
+        
+        if self.format == "dashscope":
+            return {"output": {"embeddings": [{"text_index": index, "embedding": vector} for index, vector in items]}}
+        return {"data": [{"index": index, "embedding": vector} for index, vector in items]}
+    
+    @property
+    def batches(self):
+        return [self.texts(body) for body in self.requests]
+
+@pytest.fixture
+def server():
+    embedding_server = EmbeddingServer()
+    embedding_server.thread.start()
+    yield embedding_server
+    embedding_server.httpd.shutdown()
+    embedding_server.httpd.server_close()
+
+@pytest.fixture
+def backend(server):
+    remote = RemoteEmbeddingBackend(server.url, api_key="key", max_batch_size=7, max_concurrency=3, max_retries=2)
+    yield remote
+    remote.close()
+
+def texts(count):
+    return [f"t{i}" for i in range(count)]
+
+@pytest.mark.parametrize("payload_format", ["dashscope", "openai"])
+def test_encode_splits_batches_and_keeps_order(server, backend, payload_format):
+    server.format = payload_format
+    backend.payload_format = payload_format
+    
+    vectors = backend.encode(texts(30))
+    
+    assert vectors.dtype == np.float32
+    assert vectors.shape == (30, 2)
+    assert vectors[:, 0].tolist() == list(range(30))
+    assert sorted(len(batch) for batch in server.batches) == [2, 7, 7, 7, 7]
+    assert sorted(text for batch in server.batches for text in batch) == sorted(texts(30))
+    assert backend.dimension == 2
+
+def test_encode_batch_size_is_capped(server, backend):
+    backend.encode(texts(12), batch_size=5)
+    assert sorted(len(batch) for batch in server.batches) == [2, 5, 5]
+    
+    server.requests.clear()
+    backend.encode(texts(12), batch_size=100)
+    assert sorted(len(batch) for batch in server.batches) == [5, 7]
+
+def test_request_payload(server, backend):
+    backend.encode(["t0"])
+    
+    assert server.requests == [{
+        "model": "text-embedding-v2",
+        "input": {"texts": ["t0"]},
+        "parameters": {"text_type": "document"}
+    }]
+
+def test_openai_request_payload(server, backend):
+    server.format = "openai"
+    backend.payload_format = "openai"
+    
+    vectors = backend.encode(["t3", "t5"])
+    
+    assert vectors[:, 0].tolist() == [3, 5]
+    assert server.requests == [{"model": "text-embedding-v2", "input": ["t3", "t5"]}]
+
+def test_rejects_unknown_payload_format(server):
+    with pytest.raises(ValueError):
+        RemoteEmbeddingBackend(server.url, payload_format="cohere")
+
+def test_encode_empty(server, backend):
+    assert backend.encode([]).shape == (0, 0)
+    assert server.requests == []
+
+def test_retries_server_errors(server, backend):
+    server.responses = [503]
+    
+    vectors = backend.encode(texts(3))
+    
+    assert vectors[:, 0].tolist() == [0, 1, 2]
+    assert len(server.requests) == 2
+
+def test_raises_when_retries_exhausted(server, backend):
+    server.responses = [503, 503, 503]
+    
+    with pytest.raises(requests.exceptions.RequestException):
+        backend.encode(texts(3))
+    assert len(server.requests) == 3
+
+def test_raises_on_client_error_without_retry(server, backend):
+    server.responses = [400]
+    
+    with pytest.raises(requests.exceptions.HTTPError):
+        backend.encode(texts(3))
+    assert len(server.requests) == 1
+
+def test_raises_when_response_is_missing_vectors(server, backend):
+    server.responses = ["short"]
+    
+    with pytest.raises(ValueError):
+        backend.encode(texts(3))
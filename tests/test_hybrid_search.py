@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+混合检索与MMR重排测试
+"""
+
+import re
+import numpy as np
+import pytest
+from app.core.rag import embedding_manager
+from app.core.rag.embedding_backends import HashingBackend
+from app.core.rag.embedding_manager import EmbeddingManager
+from app.core.rag.vector_search import mmr_select
+from app.core.knowledge.knowledge_manager import KnowledgeManager
+
+class TermBlindBackend(HashingBackend):
+    """忽略拉丁字母词项的哈希后端，模拟向量检索对"LoRA"这类术语不敏感"""
+    
+    def encode(self, texts, batch_size=None):
+        return super().encode([re.sub(r"[A-Za-z0-9-]+", " ", text) for text in texts], batch_size)
+
+@pytest.fixture
+def make_manager(temp_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_manager, "EMBEDDING_DIR", str(tmp_path / "embeddings"))
+    managers = []
+    
+    def make(backend, **kwargs):
+        manager = EmbeddingManager(backend=backend, embedding_cache_bytes=0, **kwargs)
+        managers.append(manager)
+        return manager
+    
+    yield make
+    for manager in managers:
+        manager.backend.close()
+
+def test_hybrid_search_finds_exact_terms(make_manager):
+    knowledge = KnowledgeManager()
+    knowledge.add_ppt_method("微调方法概览", "介绍大模型微调的常见流程，包括数据准备、超参数设置、训练监控和效果评估中的注意事项")
+    knowledge.add_ppt_method("参数高效技巧", "LoRA 只训练低秩矩阵")
+    knowledge.add_ppt_method("微调效果对比", "比较全量微调与冻结部分网络层两种做法在下游任务上的效果差异、显存占用和训练时间")
+    knowledge.add_ppt_method("图表配色", "学术报告的配色与字体选择")
+    
+    manager = make_manager(TermBlindBackend(), lexical_weight=0.5)
+    manager.update_ppt_methods_embeddings()
+    
+    hybrid = manager.search_ppt_methods("LoRA 微调", top_k=1)
+    dense = manager.retrieve("LoRA 微调", {"ppt_methods": {"top_k": 1, "hybrid": False}})["ppt_methods"]
+    
+    assert [method.title for method in hybrid] == ["参数高效技巧"]
+    assert [method.title for method in dense] != ["参数高效技巧"]
+
+def test_mmr_skips_near_duplicates():
+    relevance = np.array([0.9, 0.89, 0.8], dtype=np.float32)
+    vectors = np.array([[1.0, 0.0], [0.999, 0.045], [0.6, 0.8]], dtype=np.float32)
+    
+    assert mmr_select(relevance, vectors, 2, lambda_mult=1.0).tolist() == [0, 1]
+    assert mmr_select(relevance, vectors, 2, lambda_mult=0.5).tolist() == [0, 2]
+    assert mmr_select(relevance, vectors, 5, lambda_mult=0.5).tolist() == [0, 2, 1]
+
+def test_search_with_mmr_returns_diverse_results(make_manager):
+    knowledge = KnowledgeManager()
+    knowledge.add_ppt_method("扩散模型图像生成", "扩散模型 图像生成 方法综述")
+    knowledge.add_ppt_method("扩散模型图像生成进展", "扩散模型 图像生成 方法综述")
+    knowledge.add_ppt_method("扩散模型视频生成", "扩散模型 视频 时序建模")
+    
+    manager = make_manager(HashingBackend(), lexical_weight=0)
+    manager.update_ppt_methods_embeddings()
+    
+    def titles(mmr_lambda):
+        spec = {"top_k": 2, "mmr_lambda": mmr_lambda}
+        return [method.title for method in manager.retrieve("扩散模型图像生成", {"ppt_methods": spec})["ppt_methods"]]
+    
+    assert set(titles(None)) == {"扩散模型图像生成", "扩散模型图像生成进展"}
+    assert titles(0.3) == ["扩散模型图像生成", "扩散模型视频生成"]
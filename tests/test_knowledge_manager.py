@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+知识库管理模块测试
+"""
+
+from app.core.knowledge.knowledge_manager import KnowledgeManager
+
+def test_update_ppt_method_to_existing_title_returns_none(temp_db):
+    manager = KnowledgeManager()
+    first = manager.add_ppt_method("模板A", "内容A")
+    second = manager.add_ppt_method("模板B", "内容B")
+    
+    assert manager.update_ppt_method(second.id, "模板A", "新内容") is None
+    assert manager.get_ppt_method_by_id(second.id).title == "模板B"
+    assert manager.get_ppt_method_by_id(second.id).content == "内容B"
+    assert manager.get_ppt_method_by_id(first.id).content == "内容A"
+    
+    updated = manager.update_ppt_method(second.id, "模板C", "新内容")
+    assert updated.title == "模板C"
+    assert manager.get_ppt_method_by_title("模板C").content == "新内容"
+
+def test_update_speech_method_to_existing_title_returns_none(temp_db):
+    manager = KnowledgeManager()
+    manager.add_speech_method("开场", "内容A")
+    second = manager.add_speech_method("结尾", "内容B")
+    
+    assert manager.update_speech_method(second.id, "开场", "新内容") is None
+    assert manager.get_speech_method_by_id(second.id).title == "结尾"
+    assert manager.update_speech_method(second.id, "结尾", "新内容").content == "新内容"
+
+def test_update_history_content_to_existing_title_returns_none(temp_db):
+    manager = KnowledgeManager()
+    manager.add_history_content("论文解读", "PPT", "内容A")
+    second = manager.add_history_content("模型综述", "演讲稿", "内容B")
+    
+    assert manager.update_history_content(second.id, "论文解读", "PPT", "新内容") is None
+    assert manager.get_history_content_by_id(second.id).content == "内容B"
+
+def test_update_missing_record_returns_none(temp_db):
+    manager = KnowledgeManager()
+    
+    assert manager.update_ppt_method(12345, "标题", "内容") is None
+    assert manager.update_speech_method(12345, "标题", "内容") is None
+    assert manager.update_history_content(12345, "标题", "PPT", "内容") is None
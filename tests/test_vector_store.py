@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+向量存储模块测试
+"""
+
+import numpy as np
+import pytest
+from app.core.rag.vector_search import normalize_rows
+from app.core.rag.vector_store import VectorCollection
+
+def clustered_vectors(count, dim=32, clusters=40, seed=0):
+    """生成聚成若干簇的归一化向量，接近真实嵌入的分布"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    vectors = centers[rng.integers(0, clusters, count)] + 0.3 * rng.standard_normal((count, dim))
+    return normalize_rows(vectors.astype(np.float32))
+
+def make_collection(directory, vectors, storage="float32", name="items"):
+    directory.mkdir(exist_ok=True)
+    collection = VectorCollection(str(directory), name, storage=storage)
+    collection.replace_all(
+        np.arange(len(vectors)) + 1000, vectors, [{"group": i % 10} for i in range(len(vectors))]
+    )
+    collection.save()
+    return collection
+
+def test_ivf_recall_close_to_exact_search(tmp_path):
+    vectors = clustered_vectors(5000)
+    collection = make_collection(tmp_path, vectors)
+    collection.enable_ann(min_size=1000, n_probe=8)
+    assert collection._ann_ready()
+    
+    queries = clustered_vectors(50, seed=1)
+    hits = 0
+    for query in queries:
+        exact_ids, _ = collection.search(query, top_k=10, exact=True)
+        ann_ids, _ = collection.search(query, top_k=10)
+        hits += len(np.intersect1d(exact_ids, ann_ids))
+    
+    assert hits / (len(queries) * 10) >= 0.9
+
+@pytest.mark.parametrize("storage", ["float16", "int8"])
+def test_compressed_storage_rescoring_matches_float32(tmp_path, storage):
+    vectors = clustered_vectors(3000, dim=64)
+    exact = make_collection(tmp_path / "float32", vectors)
+    compressed = make_collection(tmp_path / storage, vectors, storage=storage)
+    
+    queries = clustered_vectors(30, dim=64, seed=1)
+    for query in queries:
+        exact_ids, exact_scores = exact.search(query, top_k=10)
+        ids, scores = compressed.search(query, top_k=10)
+        assert ids.tolist() == exact_ids.tolist()
+        # 重新打分使用float32向量，得分与精确检索完全一致
+        np.testing.assert_allclose(scores, exact_scores, rtol=1e-6)
+    
+    reloaded = VectorCollection(str(tmp_path / storage), "items", storage=storage)
+    assert reloaded.search(queries[0], top_k=10)[0].tolist() == exact.search(queries[0], top_k=10)[0].tolist()
+
+@pytest.mark.parametrize("storage", ["float32", "int8"])
+@pytest.mark.parametrize("filters", [{"group": 3}, {"group": {">=": 3}}], ids=["sparse", "dense"])
+def test_filtered_search_never_returns_masked_rows(tmp_path, storage, filters):
+    vectors = clustered_vectors(3000)
+    collection = make_collection(tmp_path, vectors, storage=storage)
+    collection.enable_ann(min_size=1000, n_probe=4)
+    mask = collection.filter_mask(filters)
+    allowed = set(collection.ids[mask].tolist())
+    
+    queries = clustered_vectors(20, seed=2)
+    for query in queries:
+        for exact in (True, False):
+            ids, _ = collection.search(query, top_k=10, mask=mask, exact=exact)
+            assert len(ids) == 10
+            assert set(ids.tolist()) <= allowed
+    
+    batch_ids, _ = collection.search_many(queries, top_k=10, mask=mask)
+    assert set(batch_ids.ravel().tolist()) <= allowed
+    
+    # 精确检索的结果等于只在通过过滤的行中暴力检索
+    rows = np.flatnonzero(mask)
+    for query, ids in zip(queries, batch_ids):
+        expected = collection.ids[rows[np.argsort(-(vectors[rows] @ query), kind='stable')[:10]]]
+        assert sorted(ids.tolist()) == sorted(expected.tolist())
+
+def test_incremental_updates_survive_reload(tmp_path):
+    vectors = clustered_vectors(500)
+    collection = make_collection(tmp_path, vectors)
+    
+    updated = clustered_vectors(20, seed=3)
+    collection.upsert([1005, 1006, 9001], updated[:3], [{"group": 1}] * 3)
+    collection.remove([1010, 9001])
+    collection.save()
+    
+    reloaded = VectorCollection(str(tmp_path), "items")
+    assert len(reloaded) == 499
+    assert 1010 not in reloaded and 9001 not in reloaded
+    np.testing.assert_allclose(reloaded.get(1005)["embedding"], updated[0], rtol=1e-6)
+    np.testing.assert_allclose(reloaded.get(1000)["embedding"], vectors[0], rtol=1e-6)
+    assert reloaded.search(updated[1], top_k=1)[0].tolist() == [1006]
+
+@pytest.mark.parametrize("damage", ["truncate", "corrupt"])
+def test_damaged_log_tail_is_ignored_on_load(tmp_path, damage):
+    vectors = clustered_vectors(200)
+    collection = make_collection(tmp_path, vectors)
+    first, second = clustered_vectors(2, seed=4)
+    
+    collection.upsert([5001], [first], [{"group": 1}])
+    collection.save()
+    intact_size = collection.log.size
+    collection.upsert([5002], [second], [{"group": 2}])
+    collection.save()
+    assert collection.log.size > intact_size
+    
+    # 模拟最后一条记录写入中途断电，或写入的内容损坏
+    with open(collection.log.path, 'r+b') as f:
+        if damage == "truncate":
+            f.truncate(collection.log.size - 7)
+        else:
+            f.seek(-3, 2)
+            f.write(b"\xff\xff\xff")
+    
+    reloaded = VectorCollection(str(tmp_path), "items")
+    assert len(reloaded) == 201
+    assert 5001 in reloaded and 5002 not in reloaded
+    np.testing.assert_allclose(reloaded.get(5001)["embedding"], first, rtol=1e-6)
+    assert reloaded.log.size == intact_size
+    
+    # 截掉损坏的尾部后，新追加的记录可以正常重放
+    reloaded.upsert([5003], [second], [{"group": 3}])
+    reloaded.save()
+    assert 5003 in VectorCollection(str(tmp_path), "items")